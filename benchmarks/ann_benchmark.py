@@ -0,0 +1,82 @@
+"""
+Recall@k versus latency of the IVF and IVF-PQ options of LocalHybridIndex against exact
+search, on a synthetic clustered corpus of unit-length vectors.
+
+Run from the repository root:
+    python -m benchmarks.ann_benchmark --chunks 200000 --dimension 1536 --nlist 1024
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.ann_index import IVFIndex
+from src.local_index import LocalHybridIndex
+
+
+def clustered_vectors(centres, count, spread, rng):
+    """Unit vectors drawn around topic centres, resembling clusters of related embeddings."""
+    vectors = centres[rng.integers(0, len(centres), count)]
+    vectors = vectors + spread * rng.standard_normal(vectors.shape, dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def build_index(vectors, ann, batch_size=10_000):
+    index = LocalHybridIndex(dimension=vectors.shape[1], ann=ann)
+    for start in range(0, len(vectors), batch_size):
+        index.upsert(
+            [{"id": str(row), "values": vectors[row]} for row in range(start, min(start + batch_size, len(vectors)))]
+        )
+    return index
+
+
+def evaluate(index, queries, truth, k):
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        matches = index.query(vector=query, top_k=k)["matches"]
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len({int(match["id"]) for match in matches} & set(expected.tolist()))
+    return hits / truth.size, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--spread", type=float, default=1.5, help="Noise around cluster centres; higher is harder")
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=96)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((args.clusters, args.dimension), dtype=np.float32)
+    vectors = clustered_vectors(centres, args.chunks, args.spread, rng)
+    queries = clustered_vectors(centres, args.queries, args.spread, rng)
+    truth = np.stack([np.argpartition(-(vectors @ query), args.k - 1)[: args.k] for query in queries])
+
+    print(f"{'index':<12}{'nprobe':>8}{'recall@' + str(args.k):>12}{'p50 ms':>10}{'p95 ms':>10}")
+    exact = build_index(vectors, None)
+    recall, p50, p95 = evaluate(exact, queries, truth, args.k)
+    print(f"{'exact':<12}{'-':>8}{recall:>12.3f}{p50:>10.2f}{p95:>10.2f}")
+    del exact
+
+    for name, pq_m in (("ivf", None), ("ivfpq", args.pq_m)):
+        ann = IVFIndex(args.dimension, nlist=args.nlist, pq_m=pq_m, min_train_size=min(args.chunks, 20_000))
+        started = time.perf_counter()
+        index = build_index(vectors, ann)
+        print(f"{name}: built in {time.perf_counter() - started:.1f}s")
+        for nprobe in (1, 4, 16, 64):
+            ann.nprobe = nprobe
+            recall, p50, p95 = evaluate(index, queries, truth, args.k)
+            print(f"{name:<12}{nprobe:>8}{recall:>12.3f}{p50:>10.2f}{p95:>10.2f}")
+        del index
+
+
+if __name__ == "__main__":
+    main()
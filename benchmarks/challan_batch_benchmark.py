@@ -0,0 +1,98 @@
+"""
+Drives the challan batch path against stub parser and LLM APIs that sleep for a typical
+latency and reject requests above their rate limit, the way LlamaParse and OpenAI
+answer with HTTP 429. Compares one thread per file (the old behaviour) with BatchEngine.
+
+Run from the repository root:
+    python -m benchmarks.challan_batch_benchmark --files 200 --workers 8
+"""
+
+import argparse
+import collections
+import random
+import threading
+import time
+
+from src.batch_engine import BatchEngine
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class StubAPI:
+    """Sleeps for latency_ms per call and fails calls beyond limit requests per second."""
+
+    def __init__(self, latency_ms, limit):
+        self.latency = latency_ms / 1000
+        self.limit = limit
+        self.calls = collections.deque()
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, payload):
+        with self.lock:
+            now = time.monotonic()
+            while self.calls and now - self.calls[0] > 1.0:
+                self.calls.popleft()
+            if len(self.calls) >= self.limit:
+                self.rejected += 1
+                raise RateLimitError("429 Too Many Requests")
+            self.calls.append(now)
+        time.sleep(self.latency * random.uniform(0.8, 1.2))
+        return f"processed {payload}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--parse-ms", type=float, default=300)
+    parser.add_argument("--llm-ms", type=float, default=500)
+    parser.add_argument("--parse-limit", type=int, default=10, help="parser requests per second")
+    parser.add_argument("--llm-limit", type=int, default=20, help="LLM requests per second")
+    args = parser.parse_args()
+    files = [f"challan-{i:04d}.pdf" for i in range(args.files)]
+
+    # One unbounded thread per file without rate limiting or retries
+    parse_api, llm_api = StubAPI(args.parse_ms, args.parse_limit), StubAPI(args.llm_ms, args.llm_limit)
+    rows, threads = [], []
+    started = time.perf_counter()
+    for name in files:
+        def process(name=name):
+            try:
+                rows.append(llm_api(parse_api(name)))
+            except RateLimitError:
+                pass
+        thread = threading.Thread(target=process)
+        threads.append(thread)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    print(f"thread per file: {len(rows)}/{len(files)} succeeded in {elapsed:.1f}s, "
+          f"{parse_api.rejected + llm_api.rejected} requests rejected")
+
+    parse_api, llm_api = StubAPI(args.parse_ms, args.parse_limit), StubAPI(args.llm_ms, args.llm_limit)
+    engine = BatchEngine(
+        max_workers=args.workers,
+        rate_limits={"llamaparse": args.parse_limit * 0.9, "openai": args.llm_limit * 0.9},
+        max_retries=5,
+        backoff_base=0.2,
+    )
+
+    def task(name):
+        return engine.call("openai", llm_api, engine.call("llamaparse", parse_api, name))
+
+    started = time.perf_counter()
+    results = engine.map(task, files)
+    elapsed = time.perf_counter() - started
+    succeeded = sum(result.ok for result in results)
+    assert [result.index for result in results] == list(range(len(files)))
+    print(f"BatchEngine    : {succeeded}/{len(files)} succeeded in {elapsed:.1f}s "
+          f"({succeeded / elapsed:.1f} files/s), {parse_api.rejected + llm_api.rejected} requests rejected, "
+          f"{engine.retries} retries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Compares request and prompt token counts of one chat completion per challan with
+BatchedChallanExtractor, using the bundled sample receipts as document text and a fake
+client that answers from the local extractor and drops a share of documents from batched
+replies to exercise the per-document retry.
+
+Run from the repository root:
+    python -m benchmarks.challan_batching_benchmark --documents 500 --budget-tokens 8000
+
+Pass --approx-tokens to count tokens as characters / 4 where the tiktoken encoding
+cannot be downloaded.
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import re
+from types import SimpleNamespace
+
+import tiktoken
+
+from src.challan_batching import BatchedChallanExtractor, BatchExtractionStats
+from src.challan_extractor import extract_challan_fields, pdf_text
+
+# Roughly the length of the single-document instructions in pages/Challan_Processing.py
+SINGLE_PROMPT_OVERHEAD = (
+    "Analyze the following text and present the extracted information in a markdown table without any "
+    "additional text or explanations: You are a helpful assistant that extracts specific information from "
+    "text. Extract the following fields if present: ITNS No., TAN, Name, Assessment Year, Financial Year, "
+    "Amount, CIN, Date of Deposit, and Challan No. Present the information in a markdown table format. If a "
+    "field is not found, include it in the table with the value 'Not found'. Use the following markdown table "
+    "format: | Field | Value | |-------|-------| | ITNS No. | [Value] | | TAN | [Value] | | Name | [Value] | "
+    "| Assessment Year | [Value] | | Financial Year | [Value] | | Amount (In Rs.) | [Value] | | CIN | [Value] | "
+    "| Date of Deposit | [Value] | | Challan No. | [Value] |"
+)
+DOCUMENT_HEADER = re.compile(r"^### Document (\S+)\n", re.MULTILINE)
+
+
+class FakeCompletions:
+    def __init__(self, count_tokens, drop_rate):
+        self.count_tokens = count_tokens
+        self.drop_rate = drop_rate
+        self.requests = 0
+        self.prompt_tokens = 0
+
+    def create(self, model, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        self.requests += 1
+        self.prompt_tokens += self.count_tokens(prompt)
+        parts = DOCUMENT_HEADER.split(prompt)[1:]
+        payload = {
+            doc_id: extract_challan_fields(text)[0]
+            for doc_id, text in zip(parts[::2], parts[1::2])
+            if random.random() >= self.drop_rate
+        }
+        message = SimpleNamespace(content=json.dumps(payload))
+        usage = SimpleNamespace(prompt_tokens=self.count_tokens(prompt))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--budget-tokens", type=int, default=8000)
+    parser.add_argument("--drop-rate", type=float, default=0.02, help="share of documents missing from batched replies")
+    parser.add_argument("--approx-tokens", action="store_true")
+    parser.add_argument("--pdf-dir", default=os.path.join("artifacts", "Test Challan pdfs"))
+    args = parser.parse_args()
+
+    if args.approx_tokens:
+        count_tokens = lambda text: len(text) // 4
+    else:
+        encoding = tiktoken.encoding_for_model("gpt-4o-mini")
+        count_tokens = lambda text: len(encoding.encode(text))
+
+    samples = []
+    for path in sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf"))):
+        with open(path, "rb") as file_obj:
+            samples.append(pdf_text(file_obj.read()))
+    documents = [(str(i), samples[i % len(samples)]) for i in range(args.documents)]
+
+    single_tokens = sum(count_tokens(f"{SINGLE_PROMPT_OVERHEAD}\n\n{text}") for _, text in documents)
+    print(f"one request per challan: {len(documents)} requests, {single_tokens} prompt tokens")
+
+    completions = FakeCompletions(count_tokens, args.drop_rate)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    def extract_single(text):
+        completions.requests += 1
+        completions.prompt_tokens += count_tokens(f"{SINGLE_PROMPT_OVERHEAD}\n\n{text}")
+        return extract_challan_fields(text)[0]
+
+    extractor = BatchedChallanExtractor(
+        client, extract_single, budget_tokens=args.budget_tokens, count_tokens=count_tokens
+    )
+    stats = BatchExtractionStats()
+    extracted = {}
+    batches = extractor.batches(documents)
+    for batch in batches:
+        results, errors = extractor.extract_batch(batch, stats)
+        assert not errors
+        extracted.update(results)
+    assert len(extracted) == len(documents)
+    print(
+        f"batched                : {completions.requests} requests ({len(batches)} batches, "
+        f"{stats.retried} documents retried alone), {completions.prompt_tokens} prompt tokens"
+    )
+    print(
+        f"reduction              : {len(documents) / completions.requests:.1f}x requests, "
+        f"{single_tokens / completions.prompt_tokens:.1f}x prompt tokens"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Times the local PyMuPDF + regex challan extractor on the bundled sample receipts and
+reports which files would need the LlamaParse + LLM fallback.
+
+Run from the repository root:
+    python -m benchmarks.challan_extraction_benchmark --repeat 50
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import time
+
+from src.challan_extractor import extract_challan_fields, pdf_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", default=os.path.join("artifacts", "Test Challan pdfs"))
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for path in sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf"))):
+        with open(path, "rb") as file_obj:
+            pdf_data = file_obj.read()
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            extracted_data, problems = extract_challan_fields(pdf_text(pdf_data))
+            timings.append(time.perf_counter() - started)
+        route = "local" if not problems else f"llm fallback (missing {', '.join(problems)})"
+        print(f"{os.path.basename(path)}: p50 {statistics.median(timings) * 1000:.1f} ms -> {route}")
+        for field, value in extracted_data.items():
+            print(f"    {field:<16} {value}")
+
+
+if __name__ == "__main__":
+    main()
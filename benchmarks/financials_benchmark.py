@@ -0,0 +1,105 @@
+"""
+Times the financial statement analytics on a synthetic workbook with millions of rows:
+revenue by period, customer and product, gross margin, expense breakdowns, current
+ratio and debt-to-equity. Runs on the sheets as pandas reads them and as WorkbookStore
+compacts them, then shows the cost of a cached lookup.
+
+Run from the repository root:
+    python -m benchmarks.financials_benchmark --sales-rows 2000000
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.financials import FinancialsCache, compute_financials
+from src.workbook_store import compact_frame
+
+
+def workbook(sales_rows: int, seed: int = 0):
+    """Sheets shaped like artifacts/Test Excel files/sample_financial_analysis_data.xlsx, with ISO date strings."""
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2021-01-01", "2024-12-31").strftime("%Y-%m-%d").to_numpy()
+    products = np.array([f"Product {name}" for name in "ABCDEFGH"])
+    other_rows = max(1, sales_rows // 2)
+    sale_amount = rng.uniform(100, 5000, sales_rows).round(2)
+    discount = (sale_amount * rng.uniform(0, 0.2, sales_rows)).round(2)
+    return {
+        "Sales Data": pd.DataFrame(
+            {
+                "Transaction ID": np.char.add("TR-", np.arange(sales_rows).astype(str)),
+                "Customer ID": np.char.add("CU-", rng.integers(0, 100000, sales_rows).astype(str)),
+                "Product Name": rng.choice(products, sales_rows),
+                "Date of Sale": rng.choice(days, sales_rows),
+                "Sale Amount": sale_amount,
+                "Discount": discount,
+                "Net Sale Amount": sale_amount - discount,
+            }
+        ),
+        "COGS": pd.DataFrame(
+            {
+                "Product Name": rng.choice(products, other_rows),
+                "Date": rng.choice(days, other_rows),
+                "COGS Amount": rng.uniform(50, 3000, other_rows).round(2),
+            }
+        ),
+        "Expenses": pd.DataFrame(
+            {
+                "Expense Type": rng.choice(["Salaries", "Rent", "Utilities", "Marketing", "Maintenance"], other_rows),
+                "Date": rng.choice(days, other_rows),
+                "Amount": rng.uniform(100, 10000, other_rows).round(2),
+            }
+        ),
+        "Balance Sheet Data": pd.DataFrame(
+            {
+                "Type": rng.choice(["Asset", "Liability", "Equity"], other_rows, p=[0.5, 0.3, 0.2]),
+                "Description": rng.choice(
+                    ["Cash", "Accounts Receivable", "Inventory", "Property", "Accounts Payable", "Long-term Loan", "Share Capital"],
+                    other_rows,
+                ),
+                "Value": rng.uniform(1000, 100000, other_rows).round(2),
+            }
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sales-rows", type=int, default=2_000_000)
+    parser.add_argument("--freq", default="M")
+    args = parser.parse_args()
+
+    sheets = workbook(args.sales_rows)
+    rows = sum(len(df) for df in sheets.values())
+    print(f"Workbook: {rows:,} rows across {len(sheets)} sheets")
+
+    report = compute_financials(sheets, args.freq)
+    print(f"as read by pandas           {report.seconds:7.2f}s")
+    compacted = {name: compact_frame(df) for name, df in sheets.items()}
+    report = compute_financials(compacted, args.freq)
+    print(f"compacted (WorkbookStore)   {report.seconds:7.2f}s")
+
+    directory = tempfile.mkdtemp()
+    try:
+        cache = FinancialsCache(directory)
+        cache.get_or_compute("benchmark", list(compacted), compacted.__getitem__, args.freq)
+        started = time.perf_counter()
+        FinancialsCache(directory).get_or_compute("benchmark", list(compacted), compacted.__getitem__, args.freq)
+        print(f"cached, from disk           {time.perf_counter() - started:7.4f}s")
+        started = time.perf_counter()
+        cache.get_or_compute("benchmark", list(compacted), compacted.__getitem__, args.freq)
+        print(f"cached, in memory           {time.perf_counter() - started:7.4f}s")
+    finally:
+        shutil.rmtree(directory)
+
+    print()
+    for name, value in report.metrics.items():
+        print(f"{name:<22} {value:>20,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Measures the cold import time of each Streamlit page: the module-level imports of the
+page are run in a fresh interpreter (without executing the page itself) and timed, and
+python -X importtime names the slowest packages. With --check the run fails when a page
+exceeds its budget in benchmarks/import_budget.json, so regressions show up in review.
+
+Run from the repository root:
+    python -m benchmarks.import_time_benchmark --runs 3 --check
+
+Budgets are wall-clock seconds on a developer laptop; re-baseline them with --update
+when the environment changes, not to absorb a new top-level import.
+"""
+
+import argparse
+import ast
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+PAGES = {
+    "Home": "Home.py",
+    "Challan_Processing": os.path.join("pages", "Challan_Processing.py"),
+    "Chat_With_Data": os.path.join("pages", "Chat_With_Data.py"),
+    "Excel_Processing_And_Analysis": os.path.join("pages", "Excel_Processing_And_Analysis.py"),
+    "NDA_Creation": os.path.join("pages", "NDA_Creation.py"),
+}
+BUDGET_PATH = os.path.join("benchmarks", "import_budget.json")
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def top_level_imports(path):
+    """Return the source of the import statements executed when the page module loads."""
+    with open(path, encoding="utf-8") as file_obj:
+        tree = ast.parse(file_obj.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure(source):
+    """Import the statements in a fresh interpreter. Returns seconds and the slowest top-level packages."""
+    script = f"import time\n_started = time.perf_counter()\n{source}\nprint(time.perf_counter() - _started)"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    slowest = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and len(match.group(3)) == 1:  # Top-level packages are indented by one space
+            slowest.append((int(match.group(2)) / 1e6, match.group(4)))
+    return float(result.stdout.strip().splitlines()[-1]), sorted(slowest, reverse=True)[:5]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--check", action="store_true", help="exit with an error when a page is over budget")
+    parser.add_argument("--update", action="store_true", help="write 1.5x the measured times as the new budget")
+    args = parser.parse_args()
+
+    budgets = {}
+    if os.path.exists(BUDGET_PATH):
+        with open(BUDGET_PATH, encoding="utf-8") as file_obj:
+            budgets = json.load(file_obj)
+
+    over_budget, measured = [], {}
+    for page, path in PAGES.items():
+        source = top_level_imports(path)
+        try:
+            runs = [measure(source) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{page:<30} import failed: {e}")
+            continue
+        seconds = statistics.median(run[0] for run in runs)
+        measured[page] = seconds
+        budget = budgets.get(page)
+        status = "" if budget is None else (" OVER BUDGET" if seconds > budget else f" (budget {budget:.2f}s)")
+        print(f"{page:<30} {seconds:6.2f}s{status}")
+        for cumulative, package in runs[-1][1]:
+            print(f"    {cumulative:6.2f}s {package}")
+        if budget is not None and seconds > budget:
+            over_budget.append(page)
+
+    if args.update:
+        with open(BUDGET_PATH, "w", encoding="utf-8") as file_obj:
+            json.dump({page: round(seconds * 1.5, 2) for page, seconds in measured.items()}, file_obj, indent=2)
+            file_obj.write("\n")
+    if args.check and over_budget:
+        sys.exit(f"Import time over budget: {', '.join(over_budget)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Measures upsert throughput and hybrid query latency of LocalHybridIndex on a synthetic corpus.
+
+Run from the repository root:
+    python -m benchmarks.local_index_benchmark --chunks 100000 --dimension 1536
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.local_index import LocalHybridIndex
+
+
+def synthetic_records(count, dimension, vocabulary, rng, start=0):
+    dense = rng.standard_normal((count, dimension), dtype=np.float32)
+    dense /= np.linalg.norm(dense, axis=1, keepdims=True)
+    records = []
+    for i in range(count):
+        tokens = np.unique(rng.zipf(1.3, 60) % vocabulary)
+        records.append(
+            {
+                "id": f"chunk-{start + i}",
+                "values": dense[i],
+                "sparse_values": {"indices": tokens.tolist(), "values": rng.random(len(tokens)).tolist()},
+                "metadata": {"text": f"chunk {start + i}"},
+            }
+        )
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    index = LocalHybridIndex(dimension=args.dimension)
+    started = time.perf_counter()
+    for start in range(0, args.chunks, 10_000):
+        count = min(10_000, args.chunks - start)
+        index.upsert(synthetic_records(count, args.dimension, args.vocabulary, rng, start))
+    upsert_seconds = time.perf_counter() - started
+    print(f"upsert : {args.chunks / upsert_seconds:10.0f} chunks/s (including synthetic data generation)")
+
+    latencies = []
+    for _ in range(args.queries):
+        query = rng.standard_normal(args.dimension).astype(np.float32)
+        tokens = np.unique(rng.zipf(1.3, 8) % args.vocabulary)
+        sparse = {"indices": tokens.tolist(), "values": (np.ones(len(tokens)) / len(tokens)).tolist()}
+        started = time.perf_counter()
+        index.query(vector=query * 0.5, sparse_vector=sparse, top_k=args.top_k, include_metadata=True)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    latencies = np.array(latencies)
+    print(
+        f"query  : p50 {np.percentile(latencies, 50):.2f} ms  p95 {np.percentile(latencies, 95):.2f} ms  "
+        f"over {args.chunks} chunks"
+    )
+
+
+if __name__ == "__main__":
+    main()
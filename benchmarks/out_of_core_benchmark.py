@@ -0,0 +1,135 @@
+"""
+Compares peak memory and time of processing a large sheet in memory against out of core.
+
+In memory is what the Excel page does for ordinary sheets: pd.read_excel, then column
+statistics and financial aggregations on the whole DataFrame. Out of core is what it does
+for sheets above WORKBOOK_MAX_ROWS_IN_MEMORY rows: the sheet is streamed row by row into
+Parquet with openpyxl, then previewed, profiled and aggregated one chunk at a time. Each
+method runs in a fresh process, so the peak resident set size (RSS) is its own.
+
+Run from the repository root (a generated workbook is cached under artifacts/cache):
+    python -m benchmarks.out_of_core_benchmark --rows 100000
+    python -m benchmarks.out_of_core_benchmark --file "artifacts/Test Excel files/sample_financial_data.xlsx"
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.workbook_load_benchmark import generate_workbook
+from src.financials import compute_financials
+from src.parquet_sheets import ParquetSheet, excel_sheet_to_parquet
+from src.profiling import ProfileConfig, frame_chunks, profile_chunks
+
+
+def peak_rss_mib() -> float:
+    if os.path.exists("/proc/self/status"):
+        # VmHWM belongs to this process image, while ru_maxrss on Linux keeps the peak of the parent from before exec
+        with open("/proc/self/status") as file_obj:
+            for line in file_obj:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    # ru_maxrss is in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**20
+
+
+def in_memory(path: str, sheet_name: str) -> dict:
+    timings = {}
+    started = time.perf_counter()
+    df = pd.read_excel(path, sheet_name=sheet_name)
+    timings["read"] = time.perf_counter() - started
+    df.head(5)
+    started = time.perf_counter()
+    profile_chunks(frame_chunks(df, len(df) or 1), ProfileConfig(mode="minimal", workers=1))
+    timings["stats"] = time.perf_counter() - started
+    started = time.perf_counter()
+    compute_financials({"Sales Data": df})
+    timings["financials"] = time.perf_counter() - started
+    return timings
+
+
+def out_of_core(path: str, sheet_name: str, chunk_rows: int) -> dict:
+    timings = {}
+    directory = tempfile.mkdtemp()
+    try:
+        started = time.perf_counter()
+        parquet_path = os.path.join(directory, "sheet.parquet")
+        excel_sheet_to_parquet(path, sheet_name, parquet_path, chunk_rows=chunk_rows)
+        sheet = ParquetSheet(parquet_path, batch_rows=chunk_rows)
+        timings["read"] = time.perf_counter() - started
+        sheet.head(5)
+        started = time.perf_counter()
+        profile_chunks(sheet.chunks, ProfileConfig(mode="minimal", chunk_rows=chunk_rows, workers=1))
+        timings["stats"] = time.perf_counter() - started
+        started = time.perf_counter()
+        compute_financials({"Sales Data": sheet})
+        timings["financials"] = time.perf_counter() - started
+    finally:
+        shutil.rmtree(directory)
+    return timings
+
+
+def run_method(method: str, path: str, sheet_name: str, chunk_rows: int) -> dict:
+    """Runs one method in a new interpreter and returns its timings and peak RSS."""
+    output = subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks.out_of_core_benchmark",
+            "--file", path, "--sheet", sheet_name, "--chunk-rows", str(chunk_rows), "--method", method,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--file", default=None, help="an existing workbook instead of a generated one")
+    parser.add_argument("--sheet", default=None, help="the sheet to process, the first one by default")
+    parser.add_argument("--chunk-rows", type=int, default=10_000, help="rows held in memory at a time out of core")
+    parser.add_argument("--method", choices=("in_memory", "out_of_core"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.method:
+        # Child process: run one method and report on the last line of stdout
+        baseline = peak_rss_mib()
+        if args.method == "in_memory":
+            timings = in_memory(args.file, args.sheet)
+        else:
+            timings = out_of_core(args.file, args.sheet, args.chunk_rows)
+        print(json.dumps({"timings": timings, "peak_mib": peak_rss_mib(), "baseline_mib": baseline}))
+        return
+
+    path = args.file
+    if path is None:
+        path = os.path.join("artifacts", "cache", f"benchmark-workbook-{args.rows}.xlsx")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            started = time.perf_counter()
+            generate_workbook(path, args.rows)
+            print(f"Generated {path} in {time.perf_counter() - started:.1f}s")
+    sheet_name = args.sheet or pd.ExcelFile(path).sheet_names[0]
+    print(f"Workbook: {path} ({os.path.getsize(path) / 2**20:.1f} MiB), sheet '{sheet_name}'\n")
+
+    print(f"{'':<14}{'read':>9}{'stats':>9}{'financials':>12}{'peak RSS':>12}{'above imports':>15}")
+    for method in ("in_memory", "out_of_core"):
+        result = run_method(method, path, sheet_name, args.chunk_rows)
+        timings = result["timings"]
+        print(
+            f"{method:<14}{timings['read']:>8.2f}s{timings['stats']:>8.2f}s{timings['financials']:>11.2f}s"
+            f"{result['peak_mib']:>8.0f} MiB{result['peak_mib'] - result['baseline_mib']:>11.0f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Compares the original PDF ingestion of the Chat With Data page with the streaming one on
+a generated annual report of 1,000 pages.
+
+The original writes the upload to a temporary file, loads it with PyMuPDFLoader, joins
+all pages into one string, splits it, and only then embeds and upserts the chunks. The
+streaming path extracts page ranges from the in-memory bytes on a process pool, splits
+each page by section, and embeds and upserts chunks while later pages are still being
+extracted. Embeddings and the index are simulated with a fixed latency per request, as in
+benchmarks/upsert_benchmark.py. Each method runs in a fresh process for its peak RSS.
+
+Run from the repository root (the generated PDF is cached under artifacts/cache):
+    python -m benchmarks.pdf_ingestion_benchmark --pages 1000 --workers 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.out_of_core_benchmark import peak_rss_mib
+from benchmarks.upsert_benchmark import FakeEmbeddings, FakeSparseEncoder, InMemoryIndex
+from src.documents import default_splitter, pdf_chunk_stream
+from src.ingestion import BatchUpserter, IngestionManifest
+
+PARAGRAPH = (
+    "Revenue from operations grew by {growth} percent year on year, driven by higher volumes in the "
+    "{segment} segment and improved realisations. Operating margin for the period stood at {margin} "
+    "percent after accounting for input cost inflation, employee benefit expenses and depreciation on "
+    "the new capacity commissioned during the year. The Board reviewed the capital allocation policy "
+    "and recommends a final dividend, subject to the approval of shareholders at the annual meeting. "
+)
+SEGMENTS = ["Retail", "Wholesale", "Digital", "Manufacturing", "Services"]
+
+
+def generate_report(path: str, pages: int):
+    """A report with a chapter heading every 25 pages, section headings and dense body text on every page."""
+    import pymupdf
+
+    document = pymupdf.open()
+    for number in range(pages):
+        page = document.new_page()
+        y = 72
+        if number % 25 == 0:
+            page.insert_text((72, y), f"Chapter {number // 25 + 1}: Management Discussion", fontsize=18, fontname="hebo")
+            y += 36
+        for section in range(3):
+            page.insert_text((72, y), f"{number + 1}.{section + 1} {SEGMENTS[(number + section) % 5]} Performance", fontsize=13, fontname="hebo")
+            y += 22
+            text = PARAGRAPH.format(growth=number % 17, segment=SEGMENTS[section], margin=10 + number % 9)
+            rect = pymupdf.Rect(72, y, page.rect.width - 72, y + 190)
+            page.insert_textbox(rect, text * 2, fontsize=10, fontname="helv")
+            y += 200
+    document.save(path, garbage=3, deflate=True)
+    document.close()
+
+
+class TimedIndex(InMemoryIndex):
+    """Records when the first vectors reach the index."""
+
+    first_upsert = None
+
+    def upsert(self, vectors):
+        if self.first_upsert is None:
+            self.first_upsert = time.perf_counter()
+        super().upsert(vectors)
+
+
+def legacy_chunks(pdf_data: bytes, splitter):
+    """The original DataProcessing.process_pdf."""
+    from langchain_community.document_loaders import PyMuPDFLoader
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+        tmp_file.write(pdf_data)
+        tmp_file_path = tmp_file.name
+    try:
+        data = PyMuPDFLoader(tmp_file_path).load()
+    finally:
+        os.unlink(tmp_file_path)
+    content = "".join(doc.page_content for doc in data)
+    return [chunk.page_content for chunk in splitter.create_documents([content])]
+
+
+def run(method: str, path: str, workers: int, latency_ms: float, embed_latency_ms: float) -> dict:
+    with open(path, "rb") as file_obj:
+        pdf_data = file_obj.read()
+    index = TimedIndex(latency_ms)
+    upserter = BatchUpserter(index, FakeEmbeddings(latency_ms=embed_latency_ms), FakeSparseEncoder())
+    manifest = IngestionManifest(os.path.join(tempfile.mkdtemp(), "manifest.json"))
+    splitter = default_splitter()
+
+    started = time.perf_counter()
+    if method == "legacy":
+        chunks = legacy_chunks(pdf_data, splitter)
+        extracted = time.perf_counter() - started
+        report = upserter.sync_source("pdf:report.pdf", chunks, manifest)
+    else:
+        extracted = None
+        report = upserter.sync_stream("pdf:report.pdf", pdf_chunk_stream(pdf_data, splitter, workers), manifest)
+    return {
+        "chunks": report.chunks,
+        "extracted": extracted,
+        "first_vector": index.first_upsert - started,
+        "total": time.perf_counter() - started,
+        "peak_mib": peak_rss_mib(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--file", default=None, help="an existing PDF instead of a generated one")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--latency-ms", type=float, default=25.0, help="Simulated round trip per upsert request")
+    parser.add_argument("--embed-latency-ms", type=float, default=200.0, help="Simulated latency per embeddings call")
+    parser.add_argument("--method", choices=("legacy", "streaming"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.method:
+        # Child process: run one method and report on the last line of stdout
+        print(json.dumps(run(args.method, args.file, args.workers, args.latency_ms, args.embed_latency_ms)))
+        return
+
+    path = args.file
+    if path is None:
+        path = os.path.join("artifacts", "cache", f"benchmark-report-{args.pages}.pdf")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            started = time.perf_counter()
+            generate_report(path, args.pages)
+            print(f"Generated {path} in {time.perf_counter() - started:.1f}s")
+    print(f"PDF: {path} ({os.path.getsize(path) / 2**20:.1f} MiB), {args.workers} extraction workers\n")
+
+    print(f"{'':<11}{'chunks':>8}{'extracted':>11}{'first vector':>14}{'total':>9}{'peak RSS':>12}")
+    for method in ("legacy", "streaming"):
+        command = [
+            sys.executable, "-m", "benchmarks.pdf_ingestion_benchmark", "--file", path, "--method", method,
+            "--workers", str(args.workers), "--latency-ms", str(args.latency_ms),
+            "--embed-latency-ms", str(args.embed_latency_ms),
+        ]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        extracted = "-" if result["extracted"] is None else f"{result['extracted']:.2f}s"
+        print(
+            f"{method:<11}{result['chunks']:>8}{extracted:>11}{result['first_vector']:>13.2f}s"
+            f"{result['total']:>8.2f}s{result['peak_mib']:>8.0f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
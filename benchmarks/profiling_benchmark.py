@@ -0,0 +1,89 @@
+"""
+Profiles a synthetic ledger sheet with the minimal engine and compares it with the
+equivalent in-memory pandas passes (describe, value_counts, corr), reporting time and
+the peak memory allocated on top of the sheet itself. Also checks how close the means
+of a stratified sample come to the true means and to the reported margin of error.
+
+Run from the repository root:
+    python -m benchmarks.profiling_benchmark --rows 2000000 --workers 4
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from src.profiling import ProfileConfig, frame_chunks, profile_chunks, stratified_sample
+
+
+def ledger(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    amount = rng.lognormal(8, 1.2, rows)
+    df = pd.DataFrame(
+        {
+            "Date": pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 4 * 365, rows), unit="D"),
+            "Account": rng.choice(["Sales", "COGS", "Rent", "Payroll", "Travel", "Interest"], rows, p=[0.4, 0.3, 0.1, 0.1, 0.09, 0.01]),
+            "Customer": np.char.add("C", rng.integers(0, 50000, rows).astype(str)),
+            "Amount": amount,
+            "Tax": amount * 0.18 + rng.normal(0, 5, rows),
+            "Quantity": rng.integers(1, 100, rows).astype(float),
+        }
+    )
+    df.loc[rng.random(rows) < 0.05, "Quantity"] = np.nan
+    return df
+
+
+def measure(func):
+    """Time a run, then repeat it under tracemalloc for the peak, since tracing slows allocations down."""
+    started = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def pandas_profile(df: pd.DataFrame):
+    numeric = df.select_dtypes(include="number")
+    return (
+        df.describe(include="all"),
+        {column: df[column].value_counts().head(10) for column in df.columns if column not in numeric},
+        numeric.corr(),
+        {column: np.histogram(numeric[column].dropna(), bins=20) for column in numeric},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    parser.add_argument("--sample-rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    df = ledger(args.rows)
+    print(f"Sheet: {args.rows:,} rows, {df.memory_usage(deep=True).sum() / 2**20:,.0f} MiB in memory")
+
+    _, seconds, peak = measure(lambda: pandas_profile(df))
+    print(f"pandas in-memory passes   {seconds:7.2f}s  peak {peak:8.1f} MiB")
+    config = ProfileConfig(mode="minimal", chunk_rows=args.chunk_rows, workers=args.workers)
+    result, seconds, peak = measure(lambda: profile_chunks(frame_chunks(df, args.chunk_rows), config))
+    print(f"minimal engine            {seconds:7.2f}s  peak {peak:8.1f} MiB  ({args.workers} workers)")
+
+    numeric = df.select_dtypes(include="number")
+    exact = numeric.corr().to_numpy()
+    print(f"max correlation difference vs pandas: {np.nanmax(np.abs(result.correlations.to_numpy() - exact)):.2e}")
+
+    (_, sampling), seconds, _ = measure(lambda: stratified_sample(df, args.sample_rows, "Account"))
+    errors = sampling.errors.assign(true_mean=numeric.mean())
+    errors["within_margin"] = (errors.estimated_mean - errors.true_mean).abs() <= errors.margin_95
+    print(f"\nStratified sample of {sampling.sample_rows:,} rows ({sampling.strata} strata) in {seconds:.2f}s")
+    print(errors.round(4).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Compares the p50 and p95 latency of the old sequential query path (rewrite, then
+retrieve, then rerank) with QueryPipeline, using stub stages that sleep for typical stage
+latencies. The cross-encoder cost grows with the number of candidates scored, and the
+raw and rewritten queries of a question share some of their chunks.
+
+Run from the repository root:
+    python -m benchmarks.query_pipeline_benchmark --rewrite-ms 900 --retrieve-ms 250 --rerank-ms 150
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.query_pipeline import QueryPipeline
+
+QUERIES = [
+    "revenue kitna hai is saal ka",
+    "q3 margin",
+    "What was the total revenue reported for the third quarter of 2023?",
+    "expenses ka breakdown batao",
+    "How does the debt to equity ratio compare with last year?",
+    "gst challan details",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rewrite-ms", type=float, default=900)
+    parser.add_argument("--retrieve-ms", type=float, default=250)
+    parser.add_argument("--rerank-ms", type=float, default=150, help="per top_k candidates scored")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--shared", type=int, default=2, help="chunks retrieved by both the raw and the rewritten query")
+    parser.add_argument("--runs", type=int, default=30)
+    args = parser.parse_args()
+
+    def jittered(ms):
+        time.sleep(ms / 1000 * random.uniform(0.8, 1.2))
+
+    def rewrite(query):
+        jittered(args.rewrite_ms)
+        return f"Improved: {query}"
+
+    def retrieve(query):
+        jittered(args.retrieve_ms)
+        topic = query.removeprefix("Improved: ")
+        # The rewritten query ranks the shared chunks first, the raw query ranks them last
+        own = [f"{query}-{i}" for i in range(args.top_k - args.shared)]
+        shared = [f"{topic}-shared-{i}" for i in range(args.shared)]
+        ids = shared + own if query != topic else own + shared
+        return [Document(page_content=f"chunk {chunk_id}", metadata={"chunk_id": chunk_id}) for chunk_id in ids]
+
+    def score(documents, query):
+        jittered(args.rerank_ms * len(documents) / args.top_k)
+        return [random.random() for _ in documents]
+
+    def percentiles(seconds):
+        return f"p50 {statistics.median(seconds) * 1000:6.0f} ms   p95 {np.percentile(seconds, 95) * 1000:6.0f} ms"
+
+    sequential, pipelined = [], []
+    pipeline = QueryPipeline(rewrite=rewrite, retrieve=retrieve, score=score, max_candidates=args.top_k)
+    for run in range(args.runs):
+        query = QUERIES[run % len(QUERIES)]
+        started = time.perf_counter()
+        final_query = rewrite(query)
+        score(retrieve(final_query), final_query)
+        sequential.append(time.perf_counter() - started)
+
+        result = pipeline.run(query)
+        pipelined.append(result.timings["total"])
+        if result.rewritten:
+            stages = result.timings
+
+    print(f"sequential : {percentiles(sequential)}")
+    print(f"pipeline   : {percentiles(pipelined)}")
+    print("last rewritten query stages: " + ", ".join(f"{k} {v * 1000:.0f} ms" for k, v in stages.items()))
+
+
+if __name__ == "__main__":
+    main()
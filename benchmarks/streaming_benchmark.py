@@ -0,0 +1,128 @@
+"""
+Runs CompletionStream against a local fake OpenAI-compatible server that streams canned
+chunks with a configurable first-token delay and inter-token interval, and reports the
+measured time to first token and tokens per second next to the blocking call.
+
+Run from the repository root:
+    python -m benchmarks.streaming_benchmark --tokens 200 --first-token-ms 400 --token-ms 15
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+from src.streaming import CompletionStream
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Serves POST /v1/chat/completions, streamed (SSE) or not, from a canned token list."""
+
+    def __init__(self, tokens, first_token_delay, token_interval):
+        super().__init__(("127.0.0.1", 0), FakeCompletionHandler)
+        self.tokens = tokens
+        self.first_token_delay = first_token_delay
+        self.token_interval = token_interval
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class FakeCompletionHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _chunk(self, delta, finish_reason=None, usage=None):
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "fake",
+            "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            "usage": usage,
+        }
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        time.sleep(server.first_token_delay)
+
+        if not request.get("stream"):
+            for _ in server.tokens[1:]:
+                time.sleep(server.token_interval)
+            body = json.dumps(
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": "fake",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(server.tokens)},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": len(server.tokens), "total_tokens": 1 + len(server.tokens)},
+                }
+            ).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        self.wfile.write(f"data: {json.dumps(self._chunk({'role': 'assistant', 'content': ''}))}\n\n".encode("utf-8"))
+        for i, token in enumerate(server.tokens):
+            if i:
+                time.sleep(server.token_interval)
+            self.wfile.write(f"data: {json.dumps(self._chunk({'content': token}))}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        events = [self._chunk({}, finish_reason="stop")]
+        if (request.get("stream_options") or {}).get("include_usage"):
+            usage = {"prompt_tokens": 1, "completion_tokens": len(server.tokens), "total_tokens": 1 + len(server.tokens)}
+            events.append(self._chunk({}, usage=usage))
+        for event in events:
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--first-token-ms", type=float, default=400)
+    parser.add_argument("--token-ms", type=float, default=15)
+    args = parser.parse_args()
+
+    tokens = [f"token{i} " for i in range(args.tokens)]
+    server = FakeOpenAIServer(tokens, args.first_token_ms / 1000, args.token_ms / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = OpenAI(api_key="fake", base_url=server.base_url)
+    request = dict(model="fake", messages=[{"role": "user", "content": "hi"}])
+
+    started = time.perf_counter()
+    client.chat.completions.create(**request)
+    print(f"blocking : full response after {time.perf_counter() - started:.2f}s")
+
+    stream = CompletionStream(client, **request)
+    received = sum(1 for _ in stream)
+    assert stream.text == "".join(tokens).strip() and received == len(tokens)
+    print(
+        f"streaming: first token after {stream.stats.time_to_first_token:.2f}s, "
+        f"{stream.stats.tokens_per_second:.1f} tokens/s, "
+        f"{stream.stats.completion_tokens} tokens reported by the server"
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Compares the legacy per-chunk upsert loop with BatchUpserter against an in-memory
+index stand-in that simulates the network round trip of a Pinecone request.
+
+Run from the repository root:
+    python -m benchmarks.upsert_benchmark --chunks 2000 --latency-ms 25
+"""
+
+import argparse
+import hashlib
+import threading
+import time
+
+from src.ingestion import BatchUpserter
+
+
+class InMemoryIndex:
+    """Pinecone index stand-in that stores records in a dict and sleeps per request."""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.records = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors):
+        time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            for vector in vectors:
+                if isinstance(vector, tuple):
+                    vector = {"id": vector[0], "values": vector[1], "metadata": vector[2]}
+                self.records[vector["id"]] = vector
+
+    def fetch(self, ids):
+        time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            return {"vectors": {i: self.records[i] for i in ids if i in self.records}}
+
+    def delete(self, ids):
+        time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            for vector_id in ids:
+                self.records.pop(vector_id, None)
+
+
+class FakeEmbeddings:
+    """Deterministic embeddings with a fixed per-call latency, mimicking one API request."""
+
+    def __init__(self, dimension: int = 1536, latency_ms: float = 0):
+        self.dimension = dimension
+        self.latency = latency_ms / 1000
+
+    def _embed(self, text):
+        seed = hashlib.sha256(text.encode("utf-8")).digest()
+        return [seed[i % len(seed)] / 255 for i in range(self.dimension)]
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+
+class FakeSparseEncoder:
+    """Hashes whitespace tokens into sparse vectors without requiring NLTK data."""
+
+    def encode_documents(self, texts):
+        encoded = []
+        for text in texts:
+            indices = sorted({hash(token) & 0xFFFFFFFF for token in text.lower().split()})
+            encoded.append({"indices": indices, "values": [1.0] * len(indices)})
+        return encoded
+
+
+def legacy_upsert(index, embedding_model, corpus):
+    """The original DataProcessing.upsert_chunks_to_pinecone loop."""
+    embeddings = embedding_model.embed_documents(corpus)
+    for i, chunk in enumerate(corpus):
+        index.upsert(vectors=[(f"doc-{i}", embeddings[i], {"text": chunk})])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=25.0, help="Simulated round trip per upsert request")
+    parser.add_argument("--embed-latency-ms", type=float, default=200.0, help="Simulated latency per embeddings call")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    corpus = [f"Chunk {i}: revenue grew by {i % 97} percent in quarter {i % 4 + 1}. " * 12 for i in range(args.chunks)]
+    embedding_model = FakeEmbeddings(latency_ms=args.embed_latency_ms)
+
+    index = InMemoryIndex(args.latency_ms)
+    started = time.perf_counter()
+    legacy_upsert(index, embedding_model, corpus)
+    legacy_seconds = time.perf_counter() - started
+    print(
+        f"legacy loop : {legacy_seconds:8.2f}s  {args.chunks / legacy_seconds:9.1f} chunks/s  "
+        f"{index.requests} requests"
+    )
+
+    index = InMemoryIndex(args.latency_ms)
+    upserter = BatchUpserter(index, embedding_model, FakeSparseEncoder(), max_workers=args.workers)
+    report = upserter.upsert([f"doc-{i}" for i in range(len(corpus))], corpus)
+    print(
+        f"batched     : {report.seconds:8.2f}s  {report.chunks_per_second:9.1f} chunks/s  "
+        f"{report.requests} requests"
+    )
+    print(f"speedup     : {legacy_seconds / report.seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compares peak memory and time of chunking a large exported WhatsApp group chat the
+original way, decoding the whole export, cleaning every line into a list, joining it and
+splitting the result, against whatsapp_chunk_stream, which parses the open file line by
+line and yields conversation chunks as it goes. Each method runs in a fresh process for
+its peak RSS.
+
+Run from the repository root (the generated export is cached under artifacts/cache):
+    python -m benchmarks.whatsapp_ingestion_benchmark --messages 1000000
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.out_of_core_benchmark import peak_rss_mib
+from src.documents import default_splitter, whatsapp_chunk_stream
+
+# The timestamp pattern of the original process_whatsapp
+LEGACY_TIMESTAMP_PATTERN = re.compile(r"(?<=^\d{2}/\d{2}/\d{2}), \d{1,2}:\d{2}(?:\u202f)?(?:am|pm) -")
+PHRASES = [
+    "Did the invoice for the March order go out?",
+    "Payment received, will update the ledger tonight",
+    "GST filing is due on the 20th, please share the purchase register",
+    "Can someone send the bank statement for last quarter",
+    "<Media omitted>",
+    "Reminder: team lunch on Friday",
+    "The vendor has revised the quote, new total is 4,52,000",
+]
+
+
+def generate_export(path: str, messages: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    minutes = np.cumsum(rng.exponential(20, messages)).astype(np.int64)
+    stamps = np.datetime64("2019-01-01T08:00") + minutes.astype("timedelta64[m]")
+    senders = rng.integers(0, 40, messages)
+    phrases = rng.integers(0, len(PHRASES), messages)
+    with open(path, "w", encoding="utf-8") as file_obj:
+        for stamp, sender, phrase in zip(stamps.tolist(), senders.tolist(), phrases.tolist()):
+            hour = stamp.hour % 12 or 12
+            meridiem = "am" if stamp.hour < 12 else "pm"
+            file_obj.write(
+                f"{stamp:%d/%m/%y}, {hour}:{stamp:%M} {meridiem} - Member {sender}: {PHRASES[phrase]}\n"
+            )
+
+
+def legacy_chunks(path: str, splitter):
+    """The original process_whatsapp on an upload."""
+    with open(path, "rb") as file_obj:
+        text = file_obj.read().decode("utf-8")
+    processed_lines = [
+        LEGACY_TIMESTAMP_PATTERN.sub("", line).strip()
+        for line in text.splitlines()
+        if "<Media omitted>" not in line and line.strip()
+    ]
+    complete_text = "\n".join(processed_lines)
+    return [chunk.page_content for chunk in splitter.create_documents([complete_text])]
+
+
+def run(method: str, path: str) -> dict:
+    splitter = default_splitter()
+    started = time.perf_counter()
+    first = None
+    if method == "legacy":
+        chunks = len(legacy_chunks(path, splitter))
+        first = time.perf_counter() - started
+    else:
+        chunks = 0
+        with open(path, encoding="utf-8-sig") as file_obj:
+            for _ in whatsapp_chunk_stream(file_obj, splitter):
+                # Each chunk would be handed to the embedding batch here and then released
+                chunks += 1
+                if first is None:
+                    first = time.perf_counter() - started
+    return {"chunks": chunks, "first": first, "total": time.perf_counter() - started, "peak_mib": peak_rss_mib()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--file", default=None, help="an existing export instead of a generated one")
+    parser.add_argument("--method", choices=("legacy", "streaming"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.method:
+        # Child process: run one method and report on the last line of stdout
+        print(json.dumps(run(args.method, args.file)))
+        return
+
+    path = args.file
+    if path is None:
+        path = os.path.join("artifacts", "cache", f"benchmark-chat-{args.messages}.txt")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            started = time.perf_counter()
+            generate_export(path, args.messages)
+            print(f"Generated {path} in {time.perf_counter() - started:.1f}s")
+    print(f"Export: {path} ({os.path.getsize(path) / 2**20:.0f} MiB)\n")
+
+    print(f"{'':<11}{'chunks':>9}{'first chunk':>13}{'total':>9}{'peak RSS':>12}")
+    for method in ("legacy", "streaming"):
+        command = [sys.executable, "-m", "benchmarks.whatsapp_ingestion_benchmark", "--file", path, "--method", method]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        print(
+            f"{method:<11}{result['chunks']:>9}{result['first']:>12.2f}s{result['total']:>8.2f}s"
+            f"{result['peak_mib']:>8.0f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Compares how the Excel page loads a sheet on every rerun before and after the
+workbook cache: pd.ExcelFile plus pd.read_excel on each rerun, against WorkbookStore
+parsing the sheet once into compacted Parquet and serving reruns from memory or disk.
+Reports time per rerun, the peak Python heap allocated while loading (tracemalloc, which
+does not see Arrow's own buffers), and the in-memory size of the resulting DataFrame.
+
+Run from the repository root (a generated workbook is cached under artifacts/cache):
+    python -m benchmarks.workbook_load_benchmark --rows 100000 --reruns 5
+    python -m benchmarks.workbook_load_benchmark --file "artifacts/Test Excel files/sample_financial_data.xlsx"
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from src.workbook_store import WorkbookStore
+
+
+def generate_workbook(path: str, rows: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "Date": pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 730, rows), unit="D"),
+            "Invoice": np.arange(100000, 100000 + rows),
+            "Customer": np.char.add("Customer ", rng.integers(0, 2000, rows).astype(str)),
+            "Product": rng.choice(["Widget", "Gadget", "Service", "Licence", "Support"], rows),
+            "Region": rng.choice(["North", "South", "East", "West"], rows),
+            "Quantity": rng.integers(1, 500, rows),
+            "Unit Price": rng.uniform(5, 500, rows).round(2),
+            "Revenue": rng.uniform(100, 100000, rows).round(2),
+        }
+    )
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        df.to_excel(writer, sheet_name="Sales Data", index=False)
+
+
+def measure(func):
+    """Time a run, then repeat it under tracemalloc for the peak, since tracing slows allocations down."""
+    started = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def frame_mib(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--file", default=None, help="an existing workbook instead of a generated one")
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    path = args.file
+    if path is None:
+        path = os.path.join("artifacts", "cache", f"benchmark-workbook-{args.rows}.xlsx")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            started = time.perf_counter()
+            generate_workbook(path, args.rows)
+            print(f"Generated {path} in {time.perf_counter() - started:.1f}s")
+    with open(path, "rb") as file_obj:
+        data = file_obj.read()
+    print(f"Workbook: {path}, {len(data) / 2**20:.1f} MiB")
+
+    def legacy_rerun():
+        excel_file = pd.ExcelFile(path)
+        return pd.read_excel(path, sheet_name=excel_file.sheet_names[0])
+
+    df, seconds, peak = measure(legacy_rerun)
+    print(f"\nread_excel on every rerun   {seconds:7.2f}s per rerun  peak {peak:7.1f} MiB  frame {frame_mib(df):6.1f} MiB")
+    print(f"    {args.reruns} reruns: {seconds * args.reruns:.1f}s")
+
+    directory = tempfile.mkdtemp()
+    try:
+
+        def first_load():
+            # Start from an empty cache, so both runs of measure parse the workbook
+            shutil.rmtree(directory, ignore_errors=True)
+            workbook = WorkbookStore(directory).open(data)
+            return workbook.sheet(workbook.sheet_names[0])
+
+        df, first, peak = measure(first_load)
+        print(f"WorkbookStore first load    {first:7.2f}s            peak {peak:7.1f} MiB  frame {frame_mib(df):6.1f} MiB")
+
+        def parquet_load():
+            workbook = WorkbookStore(directory).open(data)
+            return workbook.sheet(workbook.sheet_names[0])
+
+        _, disk, peak = measure(parquet_load)
+        print(f"  from Parquet (new server) {disk:7.2f}s            peak {peak:7.1f} MiB")
+        store = WorkbookStore(directory)
+        workbook = store.open(data)
+        workbook.sheet(workbook.sheet_names[0])
+        _, memory, _ = measure(lambda: store.open(data, workbook.digest).sheet(workbook.sheet_names[0]))
+        print(f"  from memory (rerun)       {memory:7.4f}s")
+        print(f"    {args.reruns} reruns: {first + memory * (args.reruns - 1):.1f}s")
+        print("\nCompacted dtypes:")
+        print(df.dtypes.to_string())
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
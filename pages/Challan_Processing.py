@@ -1,12 +1,10 @@
 import streamlit as st
-import base64
 from io import BytesIO
-import os
-from openai import OpenAI
+import time
 import pandas as pd
-from llama_parse import LlamaParse
-import threading
 from dotenv import load_dotenv
+from src.batch_engine import StatusBoard
+from src.challan_pipeline import ChallanProcessor
 load_dotenv()
 
 # Custom CSS for styling Streamlit
@@ -21,95 +19,25 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-# Setting up the llama cloud API for parsing PDF
-os.environ["LLAMA_CLOUD_API_KEY"] = st.secrets["LLAMA_CLOUD_API_KEY"]
-
-def initialize_parser():
-    client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-    parser = LlamaParse(result_type="markdown", language="en")
-    return client, parser
-
-client, parser = initialize_parser()
-
-def extract_key_information(page_content):
-    prompt = (
-        "You are a helpful assistant that extracts specific information from text. "
-        "Extract the following fields if present: ITNS No., TAN, Name, Assessment Year, Financial Year, Amount, "
-        "CIN, Date of Deposit, and Challan No. "
-        "Present the information in a markdown table format. "
-        "If a field is not found, include it in the table with the value 'Not found'. "
-        "Use the following markdown table format:\n\n"
-        "| Field | Value |\n"
-        "|-------|-------|\n"
-        "| ITNS No. | [Value] |\n"
-        "| TAN | [Value] |\n"
-        "| Name | [Value] |\n"
-        "| Assessment Year | [Value] |\n"
-        "| Financial Year | [Value] |\n"
-        "| Amount (In Rs.) | [Value] |\n"
-        "| CIN | [Value] |\n"
-        "| Date of Deposit | [Value] |\n"
-        "| Challan No. | [Value] |\n"
+@st.cache_resource
+def load_challan_processor():
+    # Shared by all sessions so the per-API rate limits hold across concurrent batches
+    return ChallanProcessor(
+        openai_api_key=st.secrets["OPENAI_API_KEY"],
+        llama_cloud_api_key=st.secrets["LLAMA_CLOUD_API_KEY"],
     )
-    
-    full_prompt = f"Analyze the following text and present the extracted information in a markdown table without any additional text or explanations:\n\n{page_content}\n\n{prompt}"
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # You can change this to a different model if needed
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": full_prompt},
-            ],
-        )
-    except Exception as e:
-        st.error(f"An error occurred while processing the document: {e}")
-        return None, None
-
-    key_info_md = response.choices[0].message.content
-    lines = key_info_md.strip().split("\n")
-
-    # Initialize dictionary to store column names and values
-    extracted_data = {
-        "ITNS No.": "Not found",
-        "TAN": "Not found",
-        "Name": "Not found",
-        "Assessment Year": "Not found",
-        "Financial Year": "Not found",
-        "Amount (In Rs.)": "Not found",
-        "CIN": "Not found",
-        "Date of Deposit": "Not found",
-        "Challan No.": "Not found"
-    }
 
-    # Iterate over each line in the markdown table to populate the dictionary
-    for line in lines[2:]:  # Skip the header lines
-        items = line.split("|")
-        field_name = items[1].strip()
-        field_value = items[2].strip()
-        if field_name in extracted_data:
-            extracted_data[field_name] = field_value
+processor = load_challan_processor()
 
-    return extracted_data
-
-def parse_pdf_document(file, file_name):
-    if isinstance(file, BytesIO):
-        try:
-            docs = parser.load_data(file, extra_info={"file_name": file_name})
-            doc_content = ""
-            for doc in docs:
-                doc_content += doc.text
-            return doc_content
-        except Exception as e:
-            st.error(f"Error while parsing the file '{file_name}': {e}")
-            return None
-    else:
-        st.error("Invalid file type. Please upload a valid PDF document.")
-        return None
+def results_downloads(rows):
+    """Encodes the completed rows as CSV and XLSX"""
+    df = pd.DataFrame(rows).drop(columns=["Status", "Seconds"])
+    xlsx = BytesIO()
+    df.to_excel(xlsx, index=False)
+    return df.to_csv(index=False).encode("utf-8"), xlsx.getvalue()
 
 def challan_processing():
     upload_tab = st.columns(spec=(1.5, 1), gap="large")[0]  # Adjusted to use only one column for upload
-    all_rows = []  # Store rows of data
     pdf_data_list = []  # Store PDF data for reuse in display
 
     with upload_tab:
@@ -120,32 +48,68 @@ def challan_processing():
             st.success("PDFs uploaded successfully")
 
         if st.button("Process All PDFs", use_container_width=True):
-            with st.spinner("Processing all PDFs..."):
-                threads = []
-                for pdf_upload in pdf_uploads:
-                    pdf_data = pdf_upload.read()  # Read PDF content only once
-                    pdf_file = BytesIO(pdf_data)
-                    file_name = pdf_upload.name
-                    pdf_data_list.append((pdf_data, file_name))  # Store data and name for display
-
-                    # Create a thread to process each PDF concurrently
-                    def process_pdf(pdf_file, file_name):
-                        doc_content = parse_pdf_document(pdf_file, file_name)
-                        if doc_content:
-                            extracted_data = extract_key_information(doc_content)
-                            if extracted_data:
-                                all_rows.append(extracted_data)
-
-                    thread = threading.Thread(target=process_pdf, args=(pdf_file, file_name))
-                    threads.append(thread)
-                    thread.start()
-
-                for thread in threads:
-                    thread.join()  # Ensure all threads complete
-
-            if all_rows:
-                final_df = pd.DataFrame(all_rows)
-                st.dataframe(final_df, use_container_width=True)
+            for pdf_upload in pdf_uploads:
+                pdf_data_list.append((pdf_upload.getvalue(), pdf_upload.name))  # Store data and name for display
+
+            progress_bar = st.progress(0.0, text="Processing all PDFs...")
+            downloads = st.empty()
+            table = st.empty()
+            board = StatusBoard([file_name for _, file_name in pdf_data_list])
+            refresh = {"version": -1, "at": 0.0, "renders": 0}
+
+            def render(force=False):
+                # Redraw the table when rows changed, and rebuild the downloads at most once a second
+                if board.version == refresh["version"] and not force:
+                    return
+                refresh["version"] = board.version
+                table.dataframe(pd.DataFrame(board.rows()), use_container_width=True)
+                completed = board.rows(statuses=("done", "cached"))
+                if completed and (force or time.monotonic() - refresh["at"] >= 1.0):
+                    refresh["at"], refresh["renders"] = time.monotonic(), refresh["renders"] + 1
+                    csv_data, xlsx_data = results_downloads(completed)
+                    # on_click="ignore" keeps the running batch alive when a download is clicked
+                    with downloads.container():
+                        csv_column, xlsx_column = st.columns(2)
+                        csv_column.download_button(
+                            f"Download {len(completed)} rows as CSV", csv_data, "challans.csv", "text/csv",
+                            key=f"challans-csv-{refresh['renders']}", on_click="ignore", use_container_width=True,
+                        )
+                        xlsx_column.download_button(
+                            f"Download {len(completed)} rows as XLSX", xlsx_data, "challans.xlsx",
+                            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                            key=f"challans-xlsx-{refresh['renders']}", on_click="ignore", use_container_width=True,
+                        )
+
+            def progress_callback(stage, unit):
+                def show_progress(progress, result):
+                    counts = board.counts()
+                    progress_bar.progress(
+                        progress.done / progress.total,
+                        text=(
+                            f"{stage}: {progress.done}/{progress.total} {unit} done, {progress.failed} failed, "
+                            f"{progress.throughput:.2f} {unit}/s, {progress.retries} retried requests | "
+                            + ", ".join(f"{count} {status}" for status, count in counts.items())
+                        ),
+                    )
+                return show_progress
+
+            # Cached files first, then the local fast path, LlamaParse and the LLM for the rest
+            _, errors, requests = processor.process(
+                pdf_data_list, board=board, progress=progress_callback, on_poll=render
+            )
+            render(force=True)
+            if requests:
+                llm_count = sum(1 for row in board.rows(statuses=("done",)) if row["Extraction Path"] != "local")
+                st.caption(f"{llm_count} challans extracted by the LLM in {requests} requests")
+
+            for index in sorted(errors):
+                st.error(f"Error while processing the file '{pdf_data_list[index][1]}': {errors[index]}")
+
+            counts = board.counts()
+            st.caption(
+                f"{counts.get('done', 0)} challans processed, {counts.get('cached', 0)} served from the cache, "
+                f"{counts.get('failed', 0)} failed"
+            )
 
     # Removed the display tab for PDFs
 challan_processing()
\ No newline at end of file
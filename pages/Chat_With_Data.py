@@ -1,25 +1,20 @@
 import streamlit as st
-import re
+import itertools
 import os
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceBgeEmbeddings
-from openai import OpenAI
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.retrievers import PineconeHybridSearchRetriever
-from pinecone import Pinecone, ServerlessSpec  # Use Pinecone class and ServerlessSpec
-from pinecone_text.sparse import BM25Encoder
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader
-from langchain_community.document_loaders import PyMuPDFLoader
-from youtube_transcript_api import YouTubeTranscriptApi
-import tempfile
-import nltk
-nltk.download('punkt_tab')
-
-# For reranking
-from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import CrossEncoderReranker
-from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+from src.answer_cache import SemanticAnswerCache, context_fingerprint, document_ids
+from src.documents import DocumentIngestor, default_splitter, open_local_index, get_youtube_id
+from src.ingestion_jobs import IngestionJobs, source_digest
+from src.ingestion import IngestionManifest
+from src.query_pipeline import QueryPipeline
+from src.streaming import CompletionStream
+
+# Heavy dependencies (langchain, OpenAI, Pinecone, the BM25 tokenizer and the reranker)
+# are imported inside the loaders below, so the page renders before any of them is used
 
 # Load environment variables
 load_dotenv()
@@ -27,19 +22,82 @@ load_dotenv()
 # Cache the large components for faster reuse
 @st.cache_resource
 def load_bm25_encoder():
-    return BM25Encoder().default()
+    from src.bm25_store import IncrementalBM25Encoder, ensure_nltk_data
+
+    # Checked once per process from the local NLTK data directory, downloaded only if missing
+    ensure_nltk_data()
+    # Statistics of everything in the index, seeded from the bundled values on first start
+    return IncrementalBM25Encoder.load_or_seed(
+        os.path.join("artifacts", "cache", "bm25_values.json"),
+        seed_path=os.path.join("artifacts", "bm25_values.json"),
+    )
 
 @st.cache_resource
 def load_pinecone_client():
+    from pinecone import Pinecone
+
     return Pinecone(api_key=st.secrets["PINECONE_API_KEY"])
 
+@st.cache_resource
+def load_pinecone_index(index_name):
+    from pinecone import ServerlessSpec
+
+    pinecone_client = load_pinecone_client()
+    # Check if the index exists before using it, once per process rather than on every rerun
+    if index_name not in pinecone_client.list_indexes().names():
+        pinecone_client.create_index(
+            name=index_name,
+            dimension=1536,
+            metric='dotproduct',
+            spec=ServerlessSpec(cloud='aws', region='us-east-1')
+        )
+    return pinecone_client.Index(index_name)
+
 @st.cache_resource
 def load_openai_client():
+    from openai import OpenAI
+
     return OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
 
 @st.cache_resource
 def load_embedding_model():
-    return OpenAIEmbeddings(api_key=st.secrets["OPENAI_API_KEY"])
+    from langchain_openai import OpenAIEmbeddings
+    from src.embedding_cache import CachedEmbeddings
+
+    return CachedEmbeddings(
+        OpenAIEmbeddings(api_key=st.secrets["OPENAI_API_KEY"]),
+        cache_dir=os.path.join("artifacts", "cache", "embeddings"),
+    )
+
+@st.cache_resource
+def load_ingestion_manifest(index_name):
+    return IngestionManifest(os.path.join("artifacts", "cache", f"manifest-{index_name}.json"))
+
+@st.cache_resource
+def load_local_index(index_name):
+    # LOCAL_INDEX_ANN: "" for exact search, "ivf" or "ivfpq" for approximate dense search on large corpora
+    return open_local_index(index_name, dimension=1536)
+
+@st.cache_resource
+def load_reranker():
+    from src.reranker import get_reranking_service
+
+    return get_reranking_service(
+        model_name="BAAI/bge-reranker-base",
+        batch_size=int(os.getenv("RERANKER_BATCH_SIZE", "32")),
+        num_threads=int(os.getenv("RERANKER_THREADS", "0")) or None,
+        backend=os.getenv("RERANKER_BACKEND", "torch"),
+    )
+
+@st.cache_resource
+def load_answer_cache(index_name):
+    # index_name is only the st.cache_resource key, so every index gets a cache of its own and
+    # answers grounded in one index are never served from another
+    return SemanticAnswerCache(
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97")),
+        ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400")),
+        max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000")),
+    )
 
 # Custom CSS for styling Streamlit
 st.markdown(
@@ -54,100 +112,96 @@ st.markdown(
 )
 
 class DataProcessing:
+    """
+    Chat pipeline components, each loaded on first use, so that showing the page or
+    switching to it does not wait for models and clients a run does not touch.
+    """
 
-    def __init__(self):
-        self.splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=250)
-        self.bm25 = load_bm25_encoder()
-
-        # Initialize Pinecone client
-        self.pinecone_client = load_pinecone_client()
-
+    def __init__(self, retriever_backend=None):
         self.index_name = "rag-finance"
-        self.embedding_model = load_embedding_model()
-
-        # Initialize OpenAI client
-        self.client = load_openai_client()
-
-        # Check if the index exists before using it
-        if self.index_name not in self.pinecone_client.list_indexes().names():
-            self.pinecone_client.create_index(
-                name=self.index_name,
-                dimension=1536,
-                metric='dotproduct',
-                spec=ServerlessSpec(cloud='aws', region='us-east-1')
-            )
-        self.index = self.pinecone_client.Index(self.index_name)
-
-        # Initialize the reranker and retriever
-        self.model = HuggingFaceCrossEncoder(model_name="BAAI/bge-reranker-base")
-        self.compressor = CrossEncoderReranker(model=self.model, top_n=4)
+        self.text_key = "text"  # Metadata key holding the chunk text in the index
+        # "pinecone" queries the remote index, "local" runs the hybrid search in-process
+        self.retriever_backend = retriever_backend or os.getenv("RETRIEVER_BACKEND", "pinecone")
         self.retriever = None
 
-    def initialize_compression_retriever(self):
-        """Initialize compression retriever using the base retriever"""
-        self.compression_retriever = ContextualCompressionRetriever(
-            base_compressor=self.compressor, base_retriever=self.retriever
+    @cached_property
+    def splitter(self):
+        return default_splitter()
+
+    @cached_property
+    def bm25(self):
+        return load_bm25_encoder()
+
+    @cached_property
+    def embedding_model(self):
+        return load_embedding_model()
+
+    @cached_property
+    def client(self):
+        return load_openai_client()
+
+    @cached_property
+    def index(self):
+        if self.retriever_backend == "local":
+            return load_local_index(self.index_name)
+        return load_pinecone_index(self.index_name)
+
+    @cached_property
+    def manifest(self):
+        prefix = "local-" if self.retriever_backend == "local" else ""
+        return load_ingestion_manifest(f"{prefix}{self.index_name}")
+
+    @cached_property
+    def answer_cache(self):
+        return load_answer_cache(f"{self.retriever_backend}-{self.index_name}")
+
+    @cached_property
+    def model(self):
+        return load_reranker()
+
+    @cached_property
+    def ingestor(self):
+        return DocumentIngestor(self.index, self.embedding_model, self.bm25, self.manifest, self.text_key)
+
+    def loaded(self, component):
+        """Whether a component was loaded during this run, so status displays never trigger a load"""
+        return component in self.__dict__
+
+    def build_retriever(self, top_k=5):
+        """Build the hybrid retriever over the configured index backend"""
+        from langchain_community.retrievers import PineconeHybridSearchRetriever
+
+        self.retriever = PineconeHybridSearchRetriever(
+            embeddings=self.embedding_model,
+            sparse_encoder=self.bm25,
+            index=self.index,
+            top_k=top_k,
+            text_key=self.text_key
+        )
+        return self.retriever
+
+    def retrieve(self, query):
+        """First-pass hybrid retrieval, returning no documents when the query has no BM25 tokens"""
+        if not self.bm25.encode_queries(query)["indices"]:
+            return []
+        return self.retriever.invoke(query)
+
+    def score(self, documents, query):
+        """Cross-encoder relevance scores of retrieved documents for the query"""
+        return self.model.score([(query, document.page_content) for document in documents])
+
+    def build_query_pipeline(self):
+        """Build the pipeline that overlaps query rewriting with retrieval and reranking of the raw query's results"""
+        return QueryPipeline(
+            rewrite=self.improve_query, retrieve=self.retrieve, score=self.score, max_candidates=self.retriever.top_k, top_n=4
         )
 
     def get_youtube_id(self, url):
         """Extract YouTube video ID from URL"""
-        regex = r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
-        match = re.match(regex, url)
-        return match.group(6) if match else None
+        return get_youtube_id(url)
 
-    def process_youtube(self, youtube_id, corpus):
-        """Process YouTube transcript and add it to corpus"""
-        try:
-            result = YouTubeTranscriptApi.get_transcript(youtube_id)
-            yt_captions = " ".join(item['text'] for item in result)
-            chunks = self.splitter.create_documents([yt_captions])
-            for chunk in chunks:
-                corpus.append(chunk.page_content)
-        except AttributeError as e:
-            st.warning(f"Subtitles are disabled for this video internally for processing.")
-
-    def process_pdf(self, pdf_file, corpus):
-        """Process PDF file and add text chunks to corpus"""
-        if pdf_file is not None:
-            try:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                    tmp_file.write(pdf_file.getvalue())
-                    tmp_file_path = tmp_file.name
-
-                loader = PyMuPDFLoader(tmp_file_path)
-                data = loader.load()
-                os.unlink(tmp_file_path)
-
-                content = "".join(doc.page_content for doc in data)
-                chunks = self.splitter.create_documents([content])
-                for chunk in chunks:
-                    corpus.append(chunk.page_content)
-            except Exception as e:
-                st.warning(f"An error occurred while processing the PDF: {str(e)}")
-
-    def process_whatsapp(self, text, corpus):
-        """Process WhatsApp text conversation and add it to corpus"""
-        pattern = r"(?<=^\d{2}/\d{2}/\d{2}), \d{1,2}:\d{2}(?:\u202f)?(?:am|pm) -"
-        processed_lines = [
-            re.sub(pattern, '', line).strip()
-            for line in text.splitlines()
-            if '<Media omitted>' not in line and line.strip()
-        ]
-        complete_text = "\n".join(processed_lines)
-        chunks = self.splitter.create_documents([complete_text])
-        for chunk in chunks:
-            corpus.append(chunk.page_content)
-
-    def upsert_chunks_to_pinecone(self, corpus):
-        """Upsert the processed content chunks into the Pinecone index with metadata"""
-        embeddings = self.embedding_model.embed_documents(corpus)
-        for i, chunk in enumerate(corpus):
-            vector_id = f"doc-{i}"  # Create a unique ID for each chunk
-            metadata = {"text": chunk}  # Include metadata with the text content
-            self.index.upsert(vectors=[(vector_id, embeddings[i], metadata)])
-
-    def improve_query(self, user_query):
-        """Improve a Hinglish query using OpenAI"""
+    def improve_query(self, user_query, stream=False):
+        """Improve a Hinglish query using OpenAI, or return a CompletionStream of it when stream is set"""
         prompt_template = f"""
         ### Task Description:
         Improve the user's query by making it clearer, more detailed, and optimal for document retrieval systems.
@@ -158,36 +212,33 @@ class DataProcessing:
         ### Output:
         Query:
         """
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt_template}
-            ],
-            temperature=0.7,
-            top_p=1,
-            n=1
-        )
-        return response.choices[0].message.content.strip()
+        return self._complete(prompt_template, stream)
 
-    def generate_response(self, context_data, query):
-        """Generate AI response based on query and context"""
+    def generate_response(self, context_data, query, stream=False):
+        """Generate AI response based on query and context, or return a CompletionStream of it when stream is set"""
         prompt_template = f"""
         Context:
         \"{context_data}\"
         Query:
         \"{query}\"
         """
-        response = self.client.chat.completions.create(
+        return self._complete(prompt_template, stream)
+
+    def _complete(self, prompt, stream=False):
+        """Run a chat completion for the prompt, either blocking or as a token stream"""
+        request = dict(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt_template}
+                {"role": "user", "content": prompt}
             ],
             temperature=0.7,
             top_p=1,
             n=1
         )
+        if stream:
+            return CompletionStream(self.client, **request)
+        response = self.client.chat.completions.create(**request)
         return response.choices[0].message.content.strip()
 
     def handle_retrieved_data(self, retrieved_docs):
@@ -197,9 +248,121 @@ class DataProcessing:
             context_data += content.page_content + "\n"
         return context_data
 
+def cached_answer(dp_obj, query_input, query_embedding):
+    """Return a cached answer for a similar earlier query whose context is unchanged in the current index"""
+    entry = dp_obj.answer_cache.lookup(query_embedding, query_input)
+    if entry is None:
+        return None
+    revision = dp_obj.manifest.revision
+    if entry.index_version != revision:
+        # The index changed since the answer was verified, so serve it only if the same context comes back
+        documents = dp_obj.build_query_pipeline().replay(entry.raw_query, entry.query)
+        if context_fingerprint(document_ids(documents)) != entry.fingerprint:
+            dp_obj.answer_cache.discard(entry)
+            return None
+    dp_obj.answer_cache.record_hit(entry, revision)
+    return entry
+
+def run_query_pipeline(dp_obj, query_input):
+    """Run the query pipeline, streaming the rewritten query into the chat while the raw query is retrieved"""
+    pipeline = dp_obj.build_query_pipeline()
+    if pipeline.skip_rewrite(query_input):
+        with st.spinner("Retrieving and reranking context data..."):
+            return pipeline.run(query_input)
+
+    # The rewrite runs on a pipeline thread and hands its tokens to this one, which owns the chat
+    tokens = queue.Queue()
+
+    def streamed_rewrite(query):
+        try:
+            rewrite = dp_obj.improve_query(query, stream=True)
+            for token in rewrite:
+                tokens.put(token)
+            return rewrite.text
+        finally:
+            tokens.put(None)
+
+    pipeline.rewrite = streamed_rewrite
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(pipeline.run, query_input)
+        with st.chat_message("assistant"):
+            st.write_stream(itertools.chain(["Improved Query: "], iter(tokens.get, None)))
+        with st.spinner("Retrieving and reranking context data..."):
+            return future.result()
+
+def answer_query(dp_obj, query_input):
+    """Rewrite the query while retrieving, rerank the merged context, and stream the answer into the chat"""
+    st.chat_message("user").write(f"Original Query: {query_input}")
+    started = time.perf_counter()
+    query_embedding = dp_obj.embedding_model.embed_query(query_input)
+    entry = cached_answer(dp_obj, query_input, query_embedding)
+    if entry is not None:
+        with st.chat_message("assistant"):
+            st.write(entry.answer)
+            st.caption(f"Cached answer for \"{entry.query}\", served in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return
+
+    index_version = dp_obj.manifest.revision
+    result = run_query_pipeline(dp_obj, query_input)
+
+    if not result.documents:
+        st.warning("No context found for this query (empty sparse vector). Try a different query.")
+        return
+
+    context_data = dp_obj.handle_retrieved_data(result.documents)
+    with st.chat_message("assistant"):
+        answer = dp_obj.generate_response(context_data, result.query, stream=True)
+        st.write_stream(answer)
+        stages = ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in result.timings.items())
+        if answer.stats.time_to_first_token is not None:
+            stages += (
+                f", first token after {answer.stats.time_to_first_token * 1000:.0f} ms, "
+                f"{answer.stats.tokens_per_second:.1f} tokens/s"
+            )
+        st.caption(stages)
+    dp_obj.answer_cache.store(
+        query_embedding, query_input, result.query, answer.text, document_ids(result.documents), index_version
+    )
+
+@st.cache_resource
+def load_ingestion_jobs(retriever_backend):
+    # One pool for all sessions, so the same content uploaded in two sessions is ingested once
+    dp_obj = DataProcessing(retriever_backend)
+    return IngestionJobs(
+        dp_obj.ingestor,
+        dp_obj.splitter,
+        max_workers=int(os.getenv("INGESTION_MAX_WORKERS", "4")),
+        pdf_workers=int(os.getenv("PDF_EXTRACTION_WORKERS", "0")) or None,
+    )
+
+
+def submit_source(jobs, memo_key, kind, source_id, read_payload):
+    """
+    Submits a source for ingestion once per session: reruns, such as the one after every
+    chat message, find its job in the session memo instead of reading and hashing it again.
+    """
+    memo = st.session_state.setdefault("ingestion_jobs", {})
+    key = memo.get(memo_key)
+    if key is None or jobs.status(key) is None:
+        payload = read_payload()
+        key = memo[memo_key] = jobs.submit(kind, source_id, payload, source_digest(kind, payload))
+    return key
+
+
+@st.fragment(run_every=1.0)
+def ingestion_progress(retriever_backend, job_keys):
+    """Polls running ingestion jobs without rerunning the rest of the page, then reruns the page once all have finished."""
+    jobs = [load_ingestion_jobs(retriever_backend).status(key) for key in job_keys]
+    running = [job for job in jobs if job is not None and job.state in ("queued", "running")]
+    if not running:
+        st.rerun()
+    for job in running:
+        st.info(f"{job.source_id}: {job.state} for {time.time() - job.submitted:.0f}s, {job.chunks} chunks read")
+
+
 def chat_with_docs():
     dp_obj = DataProcessing()
-    corpus = []
+    job_keys = []  # Ingestion jobs of the sources on the page
 
     st.title("Chat with your Data")
     st.write("**********")
@@ -209,84 +372,83 @@ def chat_with_docs():
     if chat_type == "Old Database Chat":
         query_input = st.chat_input("Ask your query about the old database content")
         if query_input:
-            dp_obj.retriever = PineconeHybridSearchRetriever(
-                embeddings=dp_obj.embedding_model,
-                sparse_encoder=dp_obj.bm25,
-                index=dp_obj.index,
-                top_k=5
-            )
-            dp_obj.initialize_compression_retriever()
-            improved_query = dp_obj.improve_query(query_input)
-            st.chat_message("user").write(f"Original Query: {query_input}")
-            st.chat_message("assistant").write(f"Improved Query: {improved_query}")
-            sparse_vector = dp_obj.bm25.encode_queries([improved_query])
-
-            if not sparse_vector[0]:
-                st.warning("Empty sparse vector. Try a different query.")
-            else:
-                compressed_docs = dp_obj.compression_retriever.invoke(improved_query)
-                context_data = dp_obj.handle_retrieved_data(compressed_docs)
-                with st.spinner("Retrieving context data, processing and generating... This may take a few more seconds..."):
-                    response = dp_obj.generate_response(context_data, improved_query)
-                st.chat_message("assistant").write(response)
+            dp_obj.build_retriever()
+            answer_query(dp_obj, query_input)
 
     # Option 2: Chat with new uploaded document content
     elif chat_type == "New Document Chat":
+        # Sources are ingested concurrently in the background while the page polls their progress
+        jobs = load_ingestion_jobs(dp_obj.retriever_backend)
         pdf_tab, whatsapp_tab, youtube_tab = st.columns(spec=(1, 1, 1), gap="large")
 
         with pdf_tab:
             pdf_upload = st.file_uploader("Choose a PDF file", type="pdf")
             if pdf_upload:
-                with st.spinner("Processing PDF..."):
-                    dp_obj.process_pdf(pdf_upload, corpus)
+                job_keys.append(
+                    submit_source(jobs, pdf_upload.file_id, "pdf", f"pdf:{pdf_upload.name}", pdf_upload.getvalue)
+                )
                 st.success("PDF document uploaded and setup")
 
         with whatsapp_tab:
             chat_upload = st.file_uploader("Upload the WhatsApp chat text file", type="txt")
             if chat_upload:
-                raw_text = chat_upload.read().decode("utf-8")
-                dp_obj.process_whatsapp(raw_text, corpus)
+                job_keys.append(
+                    submit_source(
+                        jobs, chat_upload.file_id, "whatsapp", f"whatsapp:{chat_upload.name}", chat_upload.getvalue
+                    )
+                )
                 st.success("WhatsApp chat uploaded and setup")
 
         with youtube_tab:
             youtube_link = st.text_input("Enter a YouTube Link")
             youtube_id = dp_obj.get_youtube_id(youtube_link)
             if youtube_id:
-                with st.spinner("Processing YouTube transcript..."):
-                    dp_obj.process_youtube(youtube_id, corpus)
+                job_keys.append(
+                    submit_source(jobs, f"youtube:{youtube_id}", "youtube", f"youtube:{youtube_id}", lambda: youtube_id)
+                )
                 st.success("YouTube transcript uploaded and setup")
 
-        if corpus:
-            # Upsert the new content into Pinecone
-            dp_obj.upsert_chunks_to_pinecone(corpus)
-            
-            # Fit BM25 on the updated corpus
-            dp_obj.bm25.fit(corpus)
-            
-            dp_obj.retriever = PineconeHybridSearchRetriever(
-                embeddings=dp_obj.embedding_model,
-                sparse_encoder=dp_obj.bm25,
-                index=dp_obj.index,
-                top_k=5
-            )
-            dp_obj.initialize_compression_retriever()
+        statuses = [job for job in (jobs.status(key) for key in job_keys) if job is not None]
+        if any(job.state in ("queued", "running") for job in statuses):
+            ingestion_progress(dp_obj.retriever_backend, job_keys)
+        for job in statuses:
+            if job.state == "failed":
+                st.warning(f"{job.source_id} could not be processed: {job.error}")
+            elif job.state == "done":
+                report = job.report
+                st.caption(
+                    f"{job.source_id}: {report.chunks} chunks indexed at {report.chunks_per_second:.1f} chunks/s, "
+                    f"{report.skipped} unchanged, {report.deleted} removed"
+                )
+
+        if any(job.state == "done" for job in statuses):
+            dp_obj.build_retriever()
 
             query_input = st.chat_input("Ask your query about the new documents")
             if query_input:
-                improved_query = dp_obj.improve_query(query_input)
-                st.chat_message("user").write(f"Original Query: {query_input}")
-                st.chat_message("assistant").write(f"Improved Query: {improved_query}")
-                sparse_vector = dp_obj.bm25.encode_queries([improved_query])
-
-                if not sparse_vector[0]:
-                    st.warning("Empty sparse vector. Try a different query.")
-                else:
-                    compressed_docs = dp_obj.compression_retriever.invoke(improved_query)
-                    context_data = dp_obj.handle_retrieved_data(compressed_docs)
-                    with st.spinner("Retrieving context data, processing and generating... This may take a few more seconds..."):
-                        response = dp_obj.generate_response(context_data, improved_query)
-                    st.chat_message("assistant").write(response)
-        else:
+                answer_query(dp_obj, query_input)
+        elif not job_keys:
             st.warning("No documents processed. Please upload or enter content to process.")
 
+    if dp_obj.loaded("embedding_model"):
+        cache_stats = dp_obj.embedding_model.stats()
+        st.sidebar.caption(
+            f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+            f"({cache_stats['hit_rate']:.0%}), {cache_stats['entries']} vectors stored"
+        )
+    if dp_obj.loaded("answer_cache"):
+        answer_stats = dp_obj.answer_cache.stats()
+        st.sidebar.caption(
+            f"Answer cache: {answer_stats['hits']} hits, {answer_stats['misses']} misses "
+            f"({answer_stats['hit_rate']:.0%}), {answer_stats['entries']} answers, "
+            f"{answer_stats['expired']} expired, {answer_stats['invalidated']} invalidated"
+        )
+    rerank_stats = dp_obj.model.metrics() if dp_obj.loaded("model") else {"load_seconds": None}
+    if rerank_stats["load_seconds"] is not None:
+        st.sidebar.caption(
+            f"Reranker: loaded in {rerank_stats['load_seconds']:.1f}s, "
+            f"p50 {rerank_stats['rerank_p50_ms']:.0f} ms / p95 {rerank_stats['rerank_p95_ms']:.0f} ms "
+            f"over {rerank_stats['calls']} calls, {rerank_stats['cache_hits']} cached pair scores reused"
+        )
+
 chat_with_docs()
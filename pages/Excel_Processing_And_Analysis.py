@@ -1,8 +1,11 @@
 import streamlit as st
 import pandas as pd
-from openai import OpenAI
 import os
-from ydata_profiling import ProfileReport
+import time
+from src.financials import SHEET_KINDS, FinancialsCache
+from src.profiling import PROFILE_MODES, ProfileConfig
+from src.report_jobs import ReportJobs
+from src.workbook_store import WorkbookStore
 
 st.markdown(
     """
@@ -28,23 +31,170 @@ st.markdown(
 )
 
 
-def analyze_file(dataframe, output_path):
+@st.cache_resource
+def load_workbook_store():
+    # Parsed sheets are shared between sessions and reruns, keyed by the content of the upload
+    return WorkbookStore(
+        os.path.join("artifacts", "cache", "workbooks"),
+        max_frames=int(os.getenv("WORKBOOK_MAX_SHEETS_IN_MEMORY", "8")),
+        max_rows_in_memory=int(os.getenv("WORKBOOK_MAX_ROWS_IN_MEMORY", "1000000")),
+    )
+
+
+@st.cache_resource
+def load_financials_cache():
+    return FinancialsCache(os.path.join("artifacts", "cache", "financials"))
+
+
+@st.cache_resource
+def load_report_jobs():
+    # One pool and report cache for all sessions, so identical requests share a job
+    return ReportJobs(
+        os.path.join("artifacts", "cache", "reports"),
+        max_workers=int(os.getenv("PROFILE_MAX_WORKERS", "2")),
+        max_reports=int(os.getenv("PROFILE_MAX_REPORTS", "50")),
+    )
+
+
+def analyze_file(dataframe, config=None):
     """
-    Analyzes the given dataframe and generates a report using pandas profiling.
+    Starts generating a pandas profiling report of the given dataframe in the background.
+
+    Reports are cached per sheet content and profile settings, so analysing the same sheet
+    again is served from disk. Large sheets are profiled in minimal mode (chunked column
+    statistics, correlations and histograms), or in full on a stratified sample, depending
+    on the config.
 
     Parameters:
-    - dataframe (pd.DataFrame): The pandas dataframe to be analyzed.
-    - output_path (str): The directory path where the report will be saved.
+    - dataframe (pd.DataFrame | ParquetSheet): The pandas dataframe to be analyzed, or a sheet too large for memory.
+    - config (ProfileConfig): The profiling mode and sampling, chosen by sheet size if not given.
 
     Returns:
-    - str: The file path of the generated report.
+    - str: The report key to poll with load_report_jobs().status.
     """
     # Performing automatic EDA
-    profile = ProfileReport(dataframe, title="Pandas Profiling Report")
-    final_path = os.path.join(output_path, "report.html")
-    profile.to_file(final_path)
+    return load_report_jobs().submit(dataframe, config)
 
-    return final_path
+
+@st.fragment(run_every=1.0)
+def report_progress(report_key):
+    """Polls a running report without rerunning the rest of the page, then reruns the page once it is ready."""
+    job = load_report_jobs().status(report_key)
+    if job.state in ("queued", "running"):
+        st.info(f"Analysis {job.state} for {time.time() - job.submitted:.0f}s...")
+    else:
+        st.rerun()
+
+
+def show_report(report_key, sheet_name):
+    job = load_report_jobs().status(report_key)
+    if job.state in ("queued", "running"):
+        report_progress(report_key)
+    elif job.state == "failed":
+        st.error(f"Analysis of {sheet_name} failed: {job.error}")
+    else:
+        st.success(
+            f"Analysis of {sheet_name} loaded from cache!"
+            if job.cached
+            else f"Analysis of {sheet_name} completed successfully in {job.seconds or 0:.1f}s!"
+        )
+        with open(job.path, "rb") as file_obj:
+            st.download_button(
+                label="Download Analysis Report",
+                data=file_obj.read(),
+                file_name="analysis_report.html",
+                mime="text/html",
+            )
+
+
+def profile_options(df):
+    """Profiling mode and sampling settings, defaulting to the PROFILE_* environment variables."""
+    with st.expander("Profiling options"):
+        default_mode = os.getenv("PROFILE_MODE", "auto")
+        mode = st.selectbox(
+            "Mode",
+            PROFILE_MODES,
+            index=PROFILE_MODES.index(default_mode) if default_mode in PROFILE_MODES else 0,
+            help="Auto profiles in full up to PROFILE_FULL_MAX_CELLS cells and in minimal mode above that.",
+        )
+        sample_rows = st.number_input(
+            "Sample rows for the full report (0 for all rows)",
+            min_value=0,
+            value=int(os.getenv("PROFILE_SAMPLE_ROWS", "0")),
+            step=10000,
+        )
+        # Only low-cardinality text columns make useful strata, judged on the first rows to keep reruns cheap
+        head = df.head(10000)
+        candidates = [
+            column
+            for column in head.columns
+            if not pd.api.types.is_numeric_dtype(head[column]) and head[column].nunique(dropna=False) <= 50
+        ]
+        stratify_by = st.selectbox("Stratify the sample by", [None] + candidates)
+    return ProfileConfig(
+        mode=mode,
+        sample_rows=int(sample_rows) or None,
+        stratify_by=stratify_by,
+        full_max_cells=int(os.getenv("PROFILE_FULL_MAX_CELLS", "2000000")),
+    )
+
+
+def financial_metrics(workbook):
+    """
+    Revenue, gross margin, expense and balance sheet metrics across the recognised sheets
+    of the workbook, computed on request and cached per workbook.
+    """
+    recognised = [name for name in workbook.sheet_names if name in SHEET_KINDS]
+    if not recognised:
+        return
+    st.markdown("#### Financial Metrics📊")
+    periods = {"M": "Month", "Q": "Quarter", "Y": "Year"}
+    freq = st.selectbox("Group by", list(periods), format_func=periods.get)
+    computed_key = f"financials_{workbook.digest}"
+    if not st.session_state.get(computed_key):
+        if not st.button(f"Compute metrics from {', '.join(recognised)}", use_container_width=True):
+            return
+        st.session_state[computed_key] = True
+    with st.spinner("Computing metrics..."):
+        report = load_financials_cache().get_or_compute(workbook.digest, workbook.sheet_names, workbook.load, freq)
+
+    labels = {
+        "total_revenue": "Revenue",
+        "gross_margin": "Gross Margin",
+        "gross_margin_pct": "Gross Margin %",
+        "total_expenses": "Expenses",
+        "operating_income": "Operating Income",
+        "current_ratio": "Current Ratio",
+        "debt_to_equity": "Debt to Equity",
+    }
+    shown = [name for name in labels if name in report.metrics]
+    for column, name in zip(st.columns(len(shown)), shown):
+        value = report.metrics[name]
+        if pd.isna(value):
+            column.metric(labels[name], "n/a")
+        else:
+            column.metric(labels[name], f"{value:,.2f}" if name in ("current_ratio", "debt_to_equity") else f"{value:,.0f}")
+    if report.metrics.get("equity", 1.0) <= 0:
+        st.warning(
+            f"Equity is {report.metrics['equity']:,.0f}: liabilities exceed assets, so debt to equity is not meaningful."
+        )
+
+    titles = {
+        "by_period": "By Period",
+        "by_product": "By Product",
+        "revenue_by_customer": "Top Customers",
+        "expenses_by_type": "Expenses by Type",
+        "expenses_by_type_period": "Expenses by Period",
+        "balance_sheet": "Balance Sheet",
+    }
+    names = [name for name in titles if name in report.tables]
+    for tab, name in zip(st.tabs([titles[name] for name in names]), names):
+        with tab:
+            table = report.tables[name]
+            # Only the largest customers are shown, the full table can have a row per customer
+            st.dataframe(table.head(50) if name == "revenue_by_customer" else table, use_container_width=True)
+            if name == "by_period":
+                st.line_chart(table[[column for column in ("revenue", "cogs", "expenses") if column in table]])
 
 
 def excel_processing_and_analysis():
@@ -65,7 +215,7 @@ def excel_processing_and_analysis():
         )
 
         # File upload
-        uploaded_file = st.file_uploader("Choose an Excel file", type=["xlsx", "xls"])
+        uploaded_file = st.file_uploader("Choose an Excel file", type=["xlsx", "xls", "csv"])
 
     if uploaded_file is not None:
         with display_tab:
@@ -75,20 +225,27 @@ def excel_processing_and_analysis():
             st.success(f"File {uploaded_file.name} uploaded successfully!")
 
     if uploaded_file is not None:
-        file_path = uploaded_file
-        excel_file = pd.ExcelFile(file_path)
-        sheet_names = excel_file.sheet_names
+        # The workbook is parsed once per upload, reruns read the cached sheets
+        digests = st.session_state.setdefault("workbook_digests", {})
+        workbook = load_workbook_store().open(
+            uploaded_file.getvalue(), digests.get(uploaded_file.file_id), file_name=uploaded_file.name
+        )
+        digests[uploaded_file.file_id] = workbook.digest
+        sheet_names = workbook.sheet_names
 
         # Display sheet names as markdown
         st.markdown("#### Available Sheets📂")
         selected_sheet = st.selectbox("Select a sheet to analyze", sheet_names)
 
-        start_analysis = False
         if selected_sheet:
-            df = pd.read_excel(file_path, sheet_name=selected_sheet)
+            # Sheets above WORKBOOK_MAX_ROWS_IN_MEMORY rows stay on disk and are processed in chunks
+            df = workbook.load(selected_sheet)
             sheet_display, description = st.columns(spec=(1, 1), gap="small")
             with sheet_display:
                 st.dataframe(df.head(5))
+                if workbook.is_large(selected_sheet):
+                    st.caption(f"{len(df):,} rows, processed from disk in chunks. Reports use the minimal profile.")
+                config = profile_options(df)
             with description:
                 if selected_sheet == "Sales Data":
                     st.write(
@@ -99,9 +256,8 @@ def excel_processing_and_analysis():
                         key="start_analysis_sales",
                         use_container_width=True,
                     ):
-                        start_analysis = True
-                        with st.spinner("Analyzing..."):
-                            report_path = analyze_file(df, "artifacts")
+                        with st.spinner("Preparing analysis..."):
+                            st.session_state["report_job"] = (analyze_file(df, config), selected_sheet)
 
                 elif selected_sheet == "Expenses":
                     st.write(
@@ -112,9 +268,8 @@ def excel_processing_and_analysis():
                         key="start_analysis_expenses",
                         use_container_width=True,
                     ):
-                        start_analysis = True
-                        with st.spinner("Analyzing..."):
-                            report_path = analyze_file(df, "artifacts")
+                        with st.spinner("Preparing analysis..."):
+                            st.session_state["report_job"] = (analyze_file(df, config), selected_sheet)
 
                 elif selected_sheet == "COGS":
                     st.write(
@@ -125,9 +280,8 @@ def excel_processing_and_analysis():
                         key="start_analysis_cogs",
                         use_container_width=True,
                     ):
-                        start_analysis = True
-                        with st.spinner("Analyzing..."):
-                            report_path = analyze_file(df, "artifacts")
+                        with st.spinner("Preparing analysis..."):
+                            st.session_state["report_job"] = (analyze_file(df, config), selected_sheet)
 
                 elif selected_sheet == "Balance Sheet Data":
                     st.write(
@@ -138,27 +292,22 @@ def excel_processing_and_analysis():
                         key="start_analysis_balance",
                         use_container_width=True,
                     ):
-                        start_analysis = True
-                        with st.spinner("Analyzing..."):
-                            report_path = analyze_file(df, "artifacts")
+                        with st.spinner("Preparing analysis..."):
+                            st.session_state["report_job"] = (analyze_file(df, config), selected_sheet)
                 else:
                     if st.button(
                         "Start Analysis",
                         key="start_analysis_sales",
                         use_container_width=True,
                     ):
-                        start_analysis = True
-                        with st.spinner("Analyzing..."):
-                            report_path = analyze_file(df, "artifacts")
-
-            if start_analysis:
-                st.success("Analysis Completed Successfully!")
-                st.download_button(
-                    label="Download Analysis Report",
-                    data=open(report_path, "rb").read(),
-                    file_name="analysis_report.html",
-                    mime="text/html",
-                )
+                        with st.spinner("Preparing analysis..."):
+                            st.session_state["report_job"] = (analyze_file(df, config), selected_sheet)
+
+            # The report is generated off the script thread, so other widgets stay responsive meanwhile
+            if "report_job" in st.session_state:
+                show_report(*st.session_state["report_job"])
+
+        financial_metrics(workbook)
 
 
 excel_processing_and_analysis()
@@ -0,0 +1,244 @@
+import os
+import tempfile
+from typing import Optional
+
+import numpy as np
+
+from src.logger import logging
+
+
+def _kmeans(data: np.ndarray, k: int, iterations: int, rng: np.random.Generator, spherical: bool) -> np.ndarray:
+    """
+    Lloyd's k-means in batches so the (points x centroids) score matrix stays small.
+
+    Parameters:
+    data (np.ndarray): The float32 training points, one per row.
+    k (int): The number of centroids.
+    iterations (int): The number of assignment/update rounds.
+    rng (np.random.Generator): The random generator used for initialization.
+    spherical (bool): Assign by maximum inner product and keep centroids unit length,
+    instead of by minimum Euclidean distance.
+
+    Returns:
+    np.ndarray: The (k, dim) float32 centroids.
+    """
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _assign(data, centroids, spherical)
+        sums = np.zeros_like(centroids)
+        # Per-batch sort + reduceat is much faster than np.add.at over all rows
+        for start in range(0, len(data), 8192):
+            part = assignment[start : start + 8192]
+            order = np.argsort(part, kind="stable")
+            labels, first = np.unique(part[order], return_index=True)
+            sums[labels] += np.add.reduceat(data[start : start + 8192][order], first, axis=0)
+        counts = np.bincount(assignment, minlength=k)
+        empty = counts == 0
+        # Re-seed empty clusters with random points so every list stays usable
+        sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+        counts[empty] = 1
+        centroids = sums / counts[:, None]
+        if spherical:
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+def _assign(data: np.ndarray, centroids: np.ndarray, spherical: bool, batch_size: int = 8192) -> np.ndarray:
+    """Return the index of the best centroid for every row of data."""
+    # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2)
+    bias = None if spherical else 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    assignment = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), batch_size):
+        scores = data[start : start + batch_size] @ centroids.T
+        if bias is not None:
+            scores -= bias
+        assignment[start : start + batch_size] = scores.argmax(axis=1)
+    return assignment
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index for inner-product search, with
+    optional product quantization (IVF-PQ).
+
+    A coarse k-means quantizer splits the vectors into nlist lists, and a query only
+    scores the vectors in its nprobe closest lists. With pq_m set, every vector is also
+    encoded as pq_m one-byte codes. Candidates are then ranked with lookup tables
+    (asymmetric distance computation), and only the best rerank_factor * k candidates are
+    rescored exactly against the full vectors. The index stores row numbers into a dense
+    matrix owned by the caller, so it adds little memory on top of it.
+
+    Parameters:
+    dimension (int): The vector dimension.
+    nlist (int): The number of coarse lists. Around sqrt(N) to 4 * sqrt(N) works well.
+    nprobe (int): The number of lists scanned per query. Higher means better recall and
+    higher latency.
+    pq_m (Optional[int]): The number of PQ sub-quantizers, a divisor of dimension, or None
+    for exact scoring of all candidates (IVF-Flat).
+    rerank_factor (int): With PQ, how many candidates per requested result are rescored.
+    min_train_size (int): The number of vectors collected before the quantizers are trained.
+    seed (int): The random seed for training.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        nlist: int = 1024,
+        nprobe: int = 16,
+        pq_m: Optional[int] = None,
+        rerank_factor: int = 10,
+        min_train_size: int = 20_000,
+        seed: int = 0,
+    ):
+        if pq_m is not None and dimension % pq_m:
+            raise ValueError(f"pq_m={pq_m} must divide the dimension {dimension}")
+        self.dimension = dimension
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.rerank_factor = rerank_factor
+        self.min_train_size = min_train_size
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.codebooks: Optional[np.ndarray] = None
+        self._lists = []
+        self._codes = []
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def reset(self):
+        """Forgets the trained quantizers and lists, e.g. before the caller reloads its matrix."""
+        self.centroids = None
+        self.codebooks = None
+        self._lists = []
+        self._codes = []
+
+    def train(self, vectors: np.ndarray, iterations: int = 10):
+        """
+        Trains the coarse quantizer and, with PQ, the sub-quantizer codebooks.
+
+        Parameters:
+        vectors (np.ndarray): A representative (N, dimension) sample of the data.
+        iterations (int): The number of k-means rounds.
+        """
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(64 * self.nlist, 100_000)
+        if len(vectors) > sample_size:
+            vectors = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.centroids = _kmeans(vectors, self.nlist, iterations, rng, spherical=True)
+        self.nlist = len(self.centroids)
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(self.nlist)]
+
+        if self.pq_m:
+            sub = self.dimension // self.pq_m
+            self.codebooks = np.stack(
+                [
+                    _kmeans(np.ascontiguousarray(vectors[:, j * sub : (j + 1) * sub]), 256, iterations, rng, spherical=False)
+                    for j in range(self.pq_m)
+                ]
+            )
+            self._codes = [np.empty((0, self.pq_m), dtype=np.uint8) for _ in range(self.nlist)]
+        logging.info(f"Trained IVF index with {self.nlist} lists on {len(vectors)} vectors (pq_m={self.pq_m})")
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        sub = self.dimension // self.pq_m
+        codes = np.empty((len(vectors), self.pq_m), dtype=np.uint8)
+        for j in range(self.pq_m):
+            part = np.ascontiguousarray(vectors[:, j * sub : (j + 1) * sub])
+            codes[:, j] = _assign(part, self.codebooks[j], spherical=False)
+        return codes
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        """
+        Adds vectors to their lists. The index must be trained.
+
+        Parameters:
+        rows (np.ndarray): The row numbers of the vectors in the caller's dense matrix.
+        vectors (np.ndarray): The (len(rows), dimension) vectors.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        assignment = _assign(vectors, self.centroids, spherical=True)
+        codes = self._encode(vectors) if self.pq_m else None
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(self.nlist + 1))
+        for list_id in np.flatnonzero(np.diff(bounds)):
+            members = order[bounds[list_id] : bounds[list_id + 1]]
+            self._lists[list_id] = np.concatenate([self._lists[list_id], rows[members]])
+            if codes is not None:
+                self._codes[list_id] = np.concatenate([self._codes[list_id], codes[members]])
+
+    def search(self, query: np.ndarray, k: int, nprobe: Optional[int] = None) -> np.ndarray:
+        """
+        Returns candidate rows for a query, best first.
+
+        Parameters:
+        query (np.ndarray): The query vector.
+        k (int): The number of results the caller needs.
+        nprobe (Optional[int]): Overrides the number of lists to scan.
+
+        Returns:
+        np.ndarray: Candidate row numbers for the caller to rescore exactly. Without PQ these
+        are all rows of the probed lists, with PQ the rerank_factor * k best by approximate score.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self._lists[i] for i in probed])
+        if not self.pq_m or len(rows) <= self.rerank_factor * k:
+            return rows
+
+        sub = self.dimension // self.pq_m
+        tables = np.einsum("jcs,js->jc", self.codebooks, query.reshape(self.pq_m, sub))
+        codes = np.concatenate([self._codes[i] for i in probed])
+        approx = tables[np.arange(self.pq_m), codes].sum(axis=1)
+        shortlist = np.argpartition(-approx, self.rerank_factor * k - 1)[: self.rerank_factor * k]
+        return rows[shortlist]
+
+    def remap(self, mapping: np.ndarray):
+        """
+        Renumbers rows after the caller compacted its matrix.
+
+        Parameters:
+        mapping (np.ndarray): The new row number of every old row, or -1 for dropped rows.
+        """
+        for list_id, rows in enumerate(self._lists):
+            new_rows = mapping[rows]
+            keep = new_rows >= 0
+            self._lists[list_id] = new_rows[keep]
+            if self.pq_m:
+                self._codes[list_id] = self._codes[list_id][keep]
+
+    def save(self, path: str):
+        """Write the trained quantizers and the lists to an .npz file atomically."""
+        lengths = np.array([len(rows) for rows in self._lists], dtype=np.int64)
+        arrays = {
+            "config": np.array([self.dimension, self.nlist, self.nprobe, self.pq_m or 0, self.rerank_factor]),
+            "centroids": self.centroids,
+            "lengths": lengths,
+            "rows": np.concatenate(self._lists) if self._lists else np.empty(0, dtype=np.int64),
+        }
+        if self.pq_m:
+            arrays["codebooks"] = self.codebooks
+            arrays["codes"] = np.concatenate(self._codes)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as file_obj:
+            np.savez(file_obj, **arrays)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> "IVFIndex":
+        """Restore a saved index. Search-time settings such as nprobe keep their current values."""
+        state = np.load(path)
+        dimension, nlist, _, pq_m, _ = state["config"].tolist()
+        self.dimension, self.nlist, self.pq_m = dimension, nlist, pq_m or None
+        self.centroids = state["centroids"]
+        offsets = np.concatenate([[0], np.cumsum(state["lengths"])])
+        self._lists = [state["rows"][offsets[i] : offsets[i + 1]] for i in range(nlist)]
+        if self.pq_m:
+            self.codebooks = state["codebooks"]
+            self._codes = [state["codes"][offsets[i] : offsets[i + 1]] for i in range(nlist)]
+        return self
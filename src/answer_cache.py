@@ -0,0 +1,198 @@
+import hashlib
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Years, quarters, amounts and other tokens with digits, e.g. "2023", "q3", "fy24"
+NUMERIC_TOKEN_PATTERN = re.compile(r"[a-z]*\d[\w.,]*")
+
+
+def document_ids(documents: List[Document]) -> List[str]:
+    """Return the chunk ID of each document, falling back to a hash of its text for records without one."""
+    return [
+        document.metadata.get("chunk_id") or hashlib.sha256(document.page_content.encode("utf-8")).hexdigest()
+        for document in documents
+    ]
+
+
+def context_fingerprint(chunk_ids: List[str]) -> str:
+    """Order-independent fingerprint of the set of context chunks an answer was generated from."""
+    return hashlib.sha256("\n".join(sorted(set(chunk_ids))).encode("utf-8")).hexdigest()
+
+
+def numeric_tokens(query: str) -> FrozenSet[str]:
+    """The tokens of a query that contain digits, which embeddings barely tell apart ("Q3 2023" vs "Q4 2024")."""
+    return frozenset(token.rstrip(".,") for token in NUMERIC_TOKEN_PATTERN.findall(query.lower()))
+
+
+@dataclass
+class CachedAnswer:
+    """
+    One cached response.
+
+    Parameters:
+    query (str): The final (possibly rewritten) query the answer was generated for.
+    raw_query (str): The query as the user asked it.
+    answer (str): The generated response.
+    fingerprint (str): The context_fingerprint of the chunks used as context.
+    index_version (str): The index revision the context was last retrieved from.
+    numbers (FrozenSet[str]): The numeric_tokens of the raw user query.
+    created (float): When the answer was generated.
+    hits (int): How often the entry was served.
+    """
+
+    query: str
+    raw_query: str
+    answer: str
+    fingerprint: str
+    index_version: str
+    numbers: FrozenSet[str] = frozenset()
+    created: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+class SemanticAnswerCache:
+    """
+    In-memory cache of generated answers keyed by query embedding similarity.
+
+    A lookup returns the most similar cached query at or above the cosine similarity
+    threshold that has not expired and mentions exactly the same numbers, so a question
+    about another year or quarter is never served this one's answer. Each entry remembers
+    the fingerprint of the context chunks its answer was built from and the index
+    revision at that time. While the revision is unchanged the entry is served at once.
+    Once the index has changed the caller re-runs retrieval (no LLM calls) and keeps the
+    entry, now verified against the new revision, only if the same context comes back.
+    Entries beyond max_entries are evicted least recently used first.
+
+    Parameters:
+    threshold (float): The minimum cosine similarity between queries for a hit.
+    ttl_seconds (float): How long an answer may be served.
+    max_entries (int): The maximum number of cached answers.
+    """
+
+    def __init__(self, threshold: float = 0.97, ttl_seconds: float = 24 * 3600, max_entries: int = 2000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[CachedAnswer] = []
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidated = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _remove(self, positions: List[int]):
+        removed = set(positions)
+        keep = [i for i in range(len(self._entries)) if i not in removed]
+        self._entries = [self._entries[i] for i in keep]
+        self._vectors = self._vectors[keep] if keep else None
+
+    def lookup(self, embedding: List[float], query: str) -> Optional[CachedAnswer]:
+        """
+        Finds a cached answer for a semantically equivalent query.
+
+        Parameters:
+        embedding (List[float]): The embedding of the raw user query.
+        query (str): The raw user query.
+
+        Returns:
+        Optional[CachedAnswer]: The best matching live entry, or None on a miss. When its
+        index_version is not the current revision, the caller must check that its context
+        is unchanged before serving it.
+        """
+        numbers = numeric_tokens(query)
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self.misses += 1
+                return None
+            stale = [i for i, entry in enumerate(self._entries) if now - entry.created > self.ttl_seconds]
+            if stale:
+                self.expired += len(stale)
+                self._remove(stale)
+                if self._vectors is None:
+                    self.misses += 1
+                    return None
+            similarities = self._vectors @ vector
+            for i, entry in enumerate(self._entries):
+                if entry.numbers != numbers:
+                    similarities[i] = -1.0
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry = self._entries[best]
+            entry.last_used = now
+            return entry
+
+    def record_hit(self, entry: CachedAnswer, index_version: str):
+        """Count a served entry and mark it as verified against the given index revision."""
+        with self._lock:
+            entry.hits += 1
+            entry.index_version = index_version
+            self.hits += 1
+
+    def discard(self, entry: CachedAnswer):
+        """Drop an entry whose context changed."""
+        with self._lock:
+            self.invalidated += 1
+            self.misses += 1
+            positions = [i for i, cached in enumerate(self._entries) if cached is entry]
+            if positions:
+                self._remove(positions)
+
+    def store(
+        self,
+        embedding: List[float],
+        raw_query: str,
+        query: str,
+        answer: str,
+        chunk_ids: List[str],
+        index_version: str,
+    ):
+        """
+        Caches a freshly generated answer.
+
+        Parameters:
+        embedding (List[float]): The embedding of the raw user query.
+        raw_query (str): The raw user query.
+        query (str): The final query the answer was generated for.
+        answer (str): The generated response.
+        chunk_ids (List[str]): The IDs of the context chunks.
+        index_version (str): The index revision the chunks were retrieved from.
+        """
+        vector = self._normalize(embedding)[None, :]
+        entry = CachedAnswer(
+            query, raw_query, answer, context_fingerprint(chunk_ids), index_version, numeric_tokens(raw_query)
+        )
+        with self._lock:
+            self._entries.append(entry)
+            self._vectors = vector if self._vectors is None else np.vstack([self._vectors, vector])
+            if len(self._entries) > self.max_entries:
+                by_use = sorted(range(len(self._entries)), key=lambda i: self._entries[i].last_used)
+                self._remove(by_use[: len(self._entries) - self.max_entries])
+
+    def stats(self) -> Dict[str, float]:
+        """Return the hit, miss, expiry and invalidation counters and the number of entries."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "expired": self.expired,
+            "invalidated": self.invalidated,
+            "entries": len(self._entries),
+        }
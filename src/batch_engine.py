@@ -0,0 +1,277 @@
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from src.exception import CustomException
+from src.logger import logging
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting the request rate to one upstream API.
+
+    Parameters:
+    rate (float): Tokens added per second, i.e. the sustained requests per second.
+    capacity (Optional[float]): The burst size. Defaults to one second worth of tokens.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until the tokens are available and take them. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+@dataclass
+class BatchResult:
+    """
+    Outcome of one item of a batch.
+
+    Parameters:
+    index (int): The position of the item in the input.
+    value (Any): The return value of the task, None when it failed.
+    error (Optional[Exception]): The exception the task raised after all retries.
+    seconds (float): The time spent on the item.
+    """
+
+    index: int
+    value: Any = None
+    error: Optional[Exception] = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchProgress:
+    """
+    Snapshot of a running batch, passed to the progress callback after every item.
+
+    Parameters:
+    done (int): Items finished, successfully or not.
+    failed (int): Items that failed.
+    total (int): Items in the batch.
+    elapsed (float): Seconds since the batch started.
+    retries (int): Upstream calls retried so far.
+    """
+
+    done: int
+    failed: int
+    total: int
+    elapsed: float
+    retries: int
+
+    @property
+    def throughput(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Whether a failed upstream request is worth retrying: rate limiting, timeouts, connection
+    errors and server-side (5xx) errors. Client errors such as bad requests or invalid API
+    keys fail the same way on every attempt.
+    """
+    try:
+        import openai
+
+        if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code == 429 or error.status_code >= 500
+    except ImportError:
+        pass
+    try:
+        import httpx
+
+        if isinstance(error, (httpx.TimeoutException, httpx.TransportError)):
+            return True
+    except ImportError:
+        pass
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # Other HTTP clients, e.g. httpx.HTTPStatusError or requests.HTTPError, carry the response
+    response = getattr(error, "response", None)
+    status_code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return isinstance(status_code, int) and (status_code == 429 or status_code >= 500)
+
+
+class BatchEngine:
+    """
+    Runs a task over many items on a bounded thread pool.
+
+    Tasks wrap their upstream requests in call(), which waits for the token bucket of
+    that API and retries transient failures (see is_transient) with jittered exponential
+    backoff. Results come back
+    in input order whatever order the items finish in. The engine can be shared between
+    batches (and sessions) so the rate limits hold across all of them.
+
+    Parameters:
+    max_workers (int): The maximum number of items processed at once.
+    rate_limits (Optional[Dict[str, float]]): Requests per second allowed per API name.
+    max_retries (int): Retries per upstream call before the item fails.
+    backoff_base (float): The base delay in seconds of the exponential backoff.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        rate_limits: Optional[Dict[str, float]] = None,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+    ):
+        self.max_workers = max_workers
+        self.buckets = {api: TokenBucket(rate) for api, rate in (rate_limits or {}).items()}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def call(self, api: str, func: Callable, *args, **kwargs):
+        """
+        Calls an upstream API under its rate limit, retrying transient failures with jittered
+        backoff. Other errors are raised at once.
+
+        Parameters:
+        api (str): The API name, selecting the token bucket. APIs without one are not limited.
+        func (Callable): The request to make.
+
+        Returns:
+        The return value of func.
+        """
+        bucket = self.buckets.get(api)
+        for attempt in range(self.max_retries + 1):
+            if bucket is not None:
+                bucket.acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient(e):
+                    raise CustomException(e, sys)
+                with self._lock:
+                    self.retries += 1
+                delay = self.backoff_base * (2**attempt)
+                delay = random.uniform(delay / 2, delay)
+                logging.warning(f"{api} request failed ({e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+    def _run_one(self, index: int, task: Callable, item) -> BatchResult:
+        started = time.perf_counter()
+        try:
+            return BatchResult(index, value=task(item), seconds=time.perf_counter() - started)
+        except Exception as e:
+            logging.error(f"Batch item {index} failed: {e}")
+            return BatchResult(index, error=e, seconds=time.perf_counter() - started)
+
+    def map(
+        self,
+        task: Callable,
+        items: List,
+        on_progress: Optional[Callable[[BatchProgress, BatchResult], None]] = None,
+        on_poll: Optional[Callable[[], None]] = None,
+        poll_interval: float = 0.5,
+    ) -> List[BatchResult]:
+        """
+        Runs task on every item.
+
+        Parameters:
+        task (Callable): Processes one item. Exceptions are caught and recorded per item.
+        items (List): The inputs, in the order the results should be returned.
+        on_progress (Optional[Callable]): Called with the progress and the finished result
+            each time an item completes. It runs on the calling thread, so it may update UI.
+        on_poll (Optional[Callable]): Called on the calling thread after completions and at
+            least every poll_interval seconds while the batch runs, e.g. to redraw a StatusBoard.
+        poll_interval (float): Seconds between on_poll calls.
+
+        Returns:
+        List[BatchResult]: One result per item, in input order.
+        """
+        results: List[Optional[BatchResult]] = [None] * len(items)
+        started = time.perf_counter()
+        retries_before = self.retries
+        failed = 0
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {executor.submit(self._run_one, i, task, item) for i, item in enumerate(items)}
+            while pending:
+                finished, pending = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    results[result.index] = result
+                    done += 1
+                    failed += not result.ok
+                    if on_progress is not None:
+                        progress = BatchProgress(
+                            done, failed, len(items), time.perf_counter() - started, self.retries - retries_before
+                        )
+                        on_progress(progress, result)
+                if on_poll is not None:
+                    on_poll()
+        return results
+
+
+class StatusBoard:
+    """
+    Thread-safe status, timing and result fields of every item of a batch.
+
+    Workers call update as an item moves through its stages, and the UI thread renders
+    rows() whenever it likes. An item's clock starts at its first update and stops when
+    it reaches a final status.
+
+    Parameters:
+    names (List[str]): The display name of each item, in batch order.
+    """
+
+    FINAL_STATUSES = ("done", "cached", "failed")
+
+    def __init__(self, names: List[str]):
+        self._rows = [{"File": name, "Status": "queued", "Seconds": None} for name in names]
+        self._started: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def update(self, index: int, status: str, **fields):
+        """Set the status of an item, optionally with result fields to show in its row."""
+        now = time.perf_counter()
+        with self._lock:
+            row = self._rows[index]
+            started = self._started.setdefault(index, now)
+            row["Status"] = status
+            row.update(fields)
+            if status in self.FINAL_STATUSES:
+                row["Seconds"] = round(now - started, 2)
+            self.version += 1
+
+    def rows(self, statuses: Optional[tuple] = None) -> List[Dict]:
+        """Return copies of the rows in batch order, optionally only those with the given statuses."""
+        with self._lock:
+            return [dict(row) for row in self._rows if statuses is None or row["Status"] in statuses]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for row in self._rows:
+                counts[row["Status"]] = counts.get(row["Status"], 0) + 1
+            return counts
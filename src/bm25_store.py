@@ -0,0 +1,203 @@
+import json
+import os
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import List
+
+from pinecone_text.sparse import BM25Encoder
+
+from src.file_lock import file_lock, file_state
+from src.logger import logging
+
+NLTK_RESOURCES = {"punkt_tab": "tokenizers/punkt_tab", "stopwords": "corpora/stopwords"}
+
+
+def ensure_nltk_data():
+    """
+    Makes sure the NLTK data the BM25 tokenizer needs is installed.
+
+    Every resource is first looked up in the local NLTK data directories, which needs no
+    network, and only the missing ones are downloaded. A failed download is logged rather
+    than raised, so an offline start with the data already present is not slowed down.
+    """
+    import nltk
+
+    for package, resource in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            if not nltk.download(package, quiet=True):
+                logging.warning(f"NLTK resource {package} is missing and could not be downloaded")
+
+
+class IncrementalBM25Encoder(BM25Encoder):
+    """
+    BM25 encoder whose corpus statistics can be updated document by document.
+
+    The stock BM25Encoder.fit replaces doc_freq, n_docs and avgdl with the statistics of
+    the given corpus only. This encoder keeps them in line with everything in the index
+    instead: partial_fit adds documents, remove subtracts them, and both cost time
+    proportional to the tokens of the affected documents. The statistics are written to
+    disk atomically in the same JSON format BM25Encoder.load reads.
+
+    The file may be shared by several processes, such as the app and the ingest CLI. The
+    changes made since the last save are kept apart, and save applies them to whatever
+    the file holds under a file lock, so neither process overwrites the other's documents.
+
+    Parameters:
+    path (str): The JSON file the statistics are persisted to.
+    kwargs: Tokenizer and scoring parameters passed on to BM25Encoder.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.doc_freq = {}
+        self.n_docs = 0
+        self.avgdl = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Changes since the statistics were last read from or written to path, None after fit
+        self._pending = [Counter(), 0, 0]
+        self._state = None
+
+    @classmethod
+    def load_or_seed(cls, path: str, seed_path: str = None) -> "IncrementalBM25Encoder":
+        """
+        Loads persisted statistics, falling back to a seed file on first use.
+
+        Parameters:
+        path (str): The JSON file the statistics are persisted to.
+        seed_path (str): Statistics to start from when path does not exist yet.
+
+        Returns:
+        IncrementalBM25Encoder: The encoder with its statistics loaded.
+        """
+        encoder = cls(path)
+        source = path if os.path.exists(path) else seed_path
+        if source and os.path.exists(source):
+            encoder.load(source)
+            encoder.path = path
+            if source == path:
+                encoder._state = file_state(path)
+            # JSON turns the integer token hashes into whatever type they were dumped with; keep them ints
+            encoder.doc_freq = {int(idx): val for idx, val in encoder.doc_freq.items()}
+            logging.info(f"Loaded BM25 statistics for {encoder.n_docs} documents from {source}")
+        return encoder
+
+    def _update(self, corpus: List[str], sign: int):
+        doc_freq_delta: Counter = Counter()
+        n_docs_delta = 0
+        doc_len_delta = 0
+        for doc in corpus:
+            indices, tf = self._tf(doc)
+            if len(indices) == 0:
+                continue
+            n_docs_delta += 1
+            doc_len_delta += sum(tf)
+            doc_freq_delta.update(indices)
+        if sign < 0:
+            doc_freq_delta = Counter({idx: -count for idx, count in doc_freq_delta.items()})
+        self._change(doc_freq_delta, sign * n_docs_delta, sign * doc_len_delta)
+
+    def _change(self, doc_freq_delta: Counter, n_docs_delta: int, doc_len_delta: int):
+        """Apply signed deltas and note them as unsaved and in this thread's rollback journal, if any."""
+        with self._lock:
+            self._apply(doc_freq_delta, n_docs_delta, doc_len_delta)
+            for changes in (self._pending, getattr(self._local, "journal", None)):
+                if changes is not None:
+                    changes[0].update(doc_freq_delta)
+                    changes[1] += n_docs_delta
+                    changes[2] += doc_len_delta
+
+    def _apply(self, doc_freq_delta: Counter, n_docs_delta: int, doc_len_delta: int):
+        """Add signed deltas to the statistics. Called with self._lock held."""
+        sum_doc_len = self.avgdl * self.n_docs + doc_len_delta
+        self.n_docs = max(self.n_docs + n_docs_delta, 0)
+        for idx, count in doc_freq_delta.items():
+            value = self.doc_freq.get(idx, 0) + count
+            if value > 0:
+                self.doc_freq[idx] = value
+            else:
+                self.doc_freq.pop(idx, None)
+        self.avgdl = sum_doc_len / self.n_docs if self.n_docs else 0.0
+
+    @contextmanager
+    def rollback_on_error(self):
+        """
+        Reverts the changes this thread makes to the statistics inside the block if it
+        raises, e.g. for chunks whose upsert failed. Changes made by other threads stay.
+        """
+        journal = self._local.journal = [Counter(), 0, 0]
+        try:
+            yield self
+        except BaseException:
+            self._local.journal = None
+            self._change(Counter({idx: -count for idx, count in journal[0].items()}), -journal[1], -journal[2])
+            logging.info(f"Rolled back BM25 statistics of {journal[1]} documents")
+            raise
+        finally:
+            self._local.journal = None
+
+    def partial_fit(self, corpus: List[str]) -> "IncrementalBM25Encoder":
+        """
+        Adds documents to the corpus statistics.
+
+        Parameters:
+        corpus (List[str]): The documents that were added to the index.
+
+        Returns:
+        IncrementalBM25Encoder: The encoder itself.
+        """
+        self._update(corpus, 1)
+        return self
+
+    def remove(self, corpus: List[str]) -> "IncrementalBM25Encoder":
+        """
+        Subtracts documents that were previously added with partial_fit.
+
+        Parameters:
+        corpus (List[str]): The documents that were removed from the index.
+
+        Returns:
+        IncrementalBM25Encoder: The encoder itself.
+        """
+        self._update(corpus, -1)
+        return self
+
+    def fit(self, corpus: List[str]) -> "IncrementalBM25Encoder":
+        """Replace the statistics with those of the given corpus, like BM25Encoder.fit."""
+        with self._lock:
+            self.doc_freq, self.n_docs, self.avgdl = {}, 0, 0.0
+            self._pending = None
+        return self.partial_fit(corpus)
+
+    def save(self):
+        """
+        Write the statistics to self.path through a temporary file and an atomic rename.
+
+        When another process saved the file since this encoder read or wrote it, the
+        changes made here since then are applied to the file's statistics first.
+        """
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with self._lock, file_lock(self.path):
+            if self._pending is not None and file_state(self.path) not in (None, self._state):
+                with open(self.path) as file_obj:
+                    stored = json.load(file_obj)
+                self.doc_freq = {
+                    int(idx): val for idx, val in zip(stored["doc_freq"]["indices"], stored["doc_freq"]["values"])
+                }
+                self.n_docs, self.avgdl = stored["n_docs"], stored["avgdl"]
+                self._apply(*self._pending)
+                logging.info(f"Merged BM25 statistics saved by another process from {self.path}")
+            params = self.get_params()
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as file_obj:
+                json.dump(params, file_obj)
+                file_obj.flush()
+                self._state = file_state(file_obj)
+            os.replace(tmp_path, self.path)
+            self._pending = [Counter(), 0, 0]
@@ -0,0 +1,187 @@
+import json
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import tiktoken
+
+from src.challan_extractor import CHALLAN_FIELDS, NOT_FOUND
+from src.logger import logging
+
+BATCH_INSTRUCTIONS = (
+    "You are a helpful assistant that extracts specific information from income tax challan receipts. "
+    "Each document below starts with a line '### Document <id>'. For every document, extract these fields: "
+    + ", ".join(CHALLAN_FIELDS)
+    + ". If a field is not found, use the value 'Not found'. "
+    "Reply with a single JSON object that maps each document id to an object with exactly these field names "
+    "as keys and the extracted values as strings, without any additional text or explanations."
+)
+
+
+@dataclass
+class BatchExtractionStats:
+    """
+    Request and token counts of one batched extraction run.
+
+    Parameters:
+    documents (int): Documents extracted.
+    requests (int): Chat completions sent, including single-document retries.
+    prompt_tokens (int): Prompt tokens reported by the API.
+    retried (int): Documents that had to be retried on their own.
+    """
+
+    documents: int = 0
+    requests: int = 0
+    prompt_tokens: int = 0
+    retried: int = 0
+
+
+def pack_documents(
+    documents: List[Tuple[str, str]], budget_tokens: int, count_tokens: Callable[[str], int], max_documents: int = 20
+) -> List[List[Tuple[str, str]]]:
+    """
+    Greedily groups documents into batches whose prompt stays within a token budget.
+
+    A document that exceeds the budget on its own still gets a batch of its own.
+
+    Parameters:
+    documents (List[Tuple[str, str]]): (document ID, parsed text) pairs in order.
+    budget_tokens (int): The maximum prompt tokens per request, including the instructions.
+    count_tokens (Callable[[str], int]): Counts the tokens of a text.
+    max_documents (int): The maximum documents per request, bounding the response size.
+
+    Returns:
+    List[List[Tuple[str, str]]]: The batches, preserving document order.
+    """
+    available = budget_tokens - count_tokens(BATCH_INSTRUCTIONS)
+    batches, current, used = [], [], 0
+    for doc_id, text in documents:
+        tokens = count_tokens(f"### Document {doc_id}\n{text}\n\n")
+        if current and (used + tokens > available or len(current) >= max_documents):
+            batches.append(current)
+            current, used = [], 0
+        current.append((doc_id, text))
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def batch_prompt(batch: List[Tuple[str, str]]) -> str:
+    documents = "".join(f"### Document {doc_id}\n{text}\n\n" for doc_id, text in batch)
+    return f"{BATCH_INSTRUCTIONS}\n\n{documents}"
+
+
+def parse_batch_response(content: str, doc_ids: List[str]) -> Tuple[Dict[str, Dict[str, str]], List[str]]:
+    """
+    Splits a batched JSON response back into one extracted_data dict per document.
+
+    Parameters:
+    content (str): The model response.
+    doc_ids (List[str]): The IDs of the documents in the request.
+
+    Returns:
+    Tuple[Dict[str, Dict[str, str]], List[str]]: The fields per document, and the IDs
+    whose entry is missing or not an object.
+    """
+    try:
+        payload = json.loads(content)
+    except (TypeError, json.JSONDecodeError):
+        return {}, list(doc_ids)
+    if not isinstance(payload, dict):
+        return {}, list(doc_ids)
+
+    results, failed = {}, []
+    for doc_id in doc_ids:
+        entry = payload.get(doc_id)
+        if not isinstance(entry, dict):
+            failed.append(doc_id)
+            continue
+        results[doc_id] = {field: str(entry.get(field) or NOT_FOUND).strip() for field in CHALLAN_FIELDS}
+    return results, failed
+
+
+class BatchedChallanExtractor:
+    """
+    Extracts the challan fields of many documents with few chat completions.
+
+    Documents are packed under a token budget, measured with tiktoken, into requests that
+    state the instructions once and ask for JSON keyed by document ID. Documents missing
+    from a response or with a malformed entry are retried on their own with the
+    single-document extraction.
+
+    Parameters:
+    client: An OpenAI client.
+    extract_single (Callable[[str], Dict[str, str]]): The single-document extraction, e.g. extract_key_information.
+    model (str): The chat model.
+    budget_tokens (int): The maximum prompt tokens per request.
+    max_documents (int): The maximum documents per request.
+    call (Optional[Callable]): Wraps each request, e.g. BatchEngine.call with its API name bound.
+    count_tokens (Optional[Callable[[str], int]]): Token counter, the model's tiktoken encoding by default.
+    """
+
+    def __init__(
+        self,
+        client,
+        extract_single: Callable[[str], Dict[str, str]],
+        model: str = "gpt-4o-mini",
+        budget_tokens: int = 8000,
+        max_documents: int = 20,
+        call: Optional[Callable] = None,
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ):
+        self.client = client
+        self.extract_single = extract_single
+        self.model = model
+        self.budget_tokens = budget_tokens
+        self.max_documents = max_documents
+        self.call = call or (lambda func, *args, **kwargs: func(*args, **kwargs))
+        if count_tokens is None:
+            encoding = tiktoken.encoding_for_model(model)
+            count_tokens = lambda text: len(encoding.encode(text))
+        self.count_tokens = count_tokens
+
+    def batches(self, documents: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+        return pack_documents(documents, self.budget_tokens, self.count_tokens, self.max_documents)
+
+    def extract_batch(
+        self, batch: List[Tuple[str, str]], stats: Optional[BatchExtractionStats] = None
+    ) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Exception]]:
+        """
+        Extracts one packed batch, retrying unparseable documents individually.
+
+        A failed request fails the whole batch instead of being repeated once per document.
+        Transient failures are retried by call() (see is_transient), a bad request or an
+        invalid API key would fail the same way for every document.
+
+        Parameters:
+        batch (List[Tuple[str, str]]): (document ID, parsed text) pairs from batches().
+        stats (Optional[BatchExtractionStats]): Counters to update.
+
+        Returns:
+        Tuple[Dict[str, Dict[str, str]], Dict[str, Exception]]: The extracted fields per
+        document ID, and the error of each document whose retry failed as well.
+        """
+        stats = stats if stats is not None else BatchExtractionStats()
+        doc_ids = [doc_id for doc_id, _ in batch]
+        response = self.call(
+            self.client.chat.completions.create,
+            model=self.model,
+            messages=[{"role": "user", "content": batch_prompt(batch)}],
+            response_format={"type": "json_object"},
+        )
+        stats.requests += 1
+        if getattr(response, "usage", None):
+            stats.prompt_tokens += response.usage.prompt_tokens
+        results, failed = parse_batch_response(response.choices[0].message.content, doc_ids)
+
+        texts, errors = dict(batch), {}
+        for doc_id in failed:
+            stats.requests += 1
+            stats.retried += 1
+            try:
+                results[doc_id] = self.extract_single(texts[doc_id])
+            except Exception as e:
+                logging.error(f"Extraction of document {doc_id} failed: {e}")
+                errors[doc_id] = e
+        stats.documents += len(batch)
+        return results, errors
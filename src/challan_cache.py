@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+def file_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def extraction_version(*parts: str) -> str:
+    """Short hash of everything that shapes the extracted fields, such as prompts, model and extractor version."""
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class ChallanCache:
+    """
+    Persistent cache of challan parsing and extraction results keyed by the SHA-256 of the PDF.
+
+    Parsed markdown depends only on the file and the parser, so it survives prompt changes.
+    Extracted fields are stored under the extraction version as well, so changing a prompt,
+    the model or the local extractor makes earlier results unreachable.
+
+    Parameters:
+    path (str): The SQLite database file.
+    version (str): The current extraction version, see extraction_version.
+    parser_name (str): Identifies the parser and its settings in the parsed markdown key.
+    """
+
+    def __init__(self, path: str, version: str, parser_name: str = "llamaparse-markdown"):
+        self.version = version
+        self.parser_name = parser_name
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS parsed (digest TEXT, parser TEXT, markdown TEXT, created REAL, "
+            "PRIMARY KEY (digest, parser))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS extracted (digest TEXT, version TEXT, fields TEXT, path TEXT, created REAL, "
+            "PRIMARY KEY (digest, version))"
+        )
+        self._db.commit()
+
+    def get_extracted(self, digest: str) -> Optional[Tuple[Dict[str, str], str]]:
+        """Return the extracted fields and extraction path of a file for the current version, if cached."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fields, path FROM extracted WHERE digest = ? AND version = ?", (digest, self.version)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def put_extracted(self, digest: str, fields: Dict[str, str], path: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO extracted VALUES (?, ?, ?, ?, ?)",
+                (digest, self.version, json.dumps(fields), path, time.time()),
+            )
+            self._db.commit()
+
+    def get_parsed(self, digest: str) -> Optional[str]:
+        """Return the parsed markdown of a file, if cached."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT markdown FROM parsed WHERE digest = ? AND parser = ?", (digest, self.parser_name)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_parsed(self, digest: str, markdown: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO parsed VALUES (?, ?, ?, ?)", (digest, self.parser_name, markdown, time.time())
+            )
+            self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Return the extraction hit and miss counters of this process and the number of cached files."""
+        with self._lock:
+            (parsed,) = self._db.execute("SELECT COUNT(*) FROM parsed").fetchone()
+            (extracted,) = self._db.execute(
+                "SELECT COUNT(*) FROM extracted WHERE version = ?", (self.version,)
+            ).fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "parsed": parsed,
+            "extracted": extracted,
+        }
@@ -0,0 +1,117 @@
+import re
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import pymupdf
+
+CHALLAN_FIELDS = [
+    "ITNS No.",
+    "TAN",
+    "Name",
+    "Assessment Year",
+    "Financial Year",
+    "Amount (In Rs.)",
+    "CIN",
+    "Date of Deposit",
+    "Challan No.",
+]
+NOT_FOUND = "Not found"
+# Bump when the patterns or validation change, so cached extractions are redone
+EXTRACTOR_VERSION = "1"
+
+# Receipt labels, lower-cased without punctuation, mapped to the fields they hold
+LABEL_FIELDS = {
+    "itns no": "ITNS No.",
+    "tan": "TAN",
+    "name": "Name",
+    "assessment year": "Assessment Year",
+    "financial year": "Financial Year",
+    "amount in rs": "Amount (In Rs.)",
+    "cin": "CIN",
+    "date of deposit": "Date of Deposit",
+    "challan no": "Challan No.",
+}
+DATE_FORMATS = ("%d-%b-%Y", "%d/%m/%Y", "%d-%m-%Y", "%d %b %Y")
+FIELD_PATTERNS = {
+    "ITNS No.": re.compile(r"\d{3}"),
+    "TAN": re.compile(r"[A-Z]{4}\d{5}[A-Z]"),
+    "Name": re.compile(r"\S.*"),
+    "Assessment Year": re.compile(r"\d{4}-\d{2}"),
+    "Financial Year": re.compile(r"\d{4}-\d{2}"),
+    "Amount (In Rs.)": re.compile(r"\d{1,3}(,\d{2,3})*(\.\d{1,2})?"),
+    "CIN": re.compile(r"\d{14}[A-Z0-9]{4,6}"),
+    "Challan No.": re.compile(r"\d{1,7}"),
+}
+INLINE_PAIR = re.compile(r"^(?P<label>[^:]+?)\s*:\s*(?P<value>.*)$")
+
+
+def pdf_text(pdf_data: bytes) -> str:
+    """Return the text layer of all pages of a PDF, empty for scanned documents."""
+    with pymupdf.open(stream=pdf_data, filetype="pdf") as document:
+        return "\n".join(page.get_text() for page in document)
+
+
+def _label_key(label: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", label.lower()).split())
+
+
+def _label_values(text: str) -> Dict[str, str]:
+    """Collects "Label : Value" pairs, whether on one line or split over three as PyMuPDF emits them."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    pairs = {}
+    for i, line in enumerate(lines):
+        if line == ":" and 0 < i < len(lines) - 1:
+            label, value = lines[i - 1], lines[i + 1]
+        else:
+            match = INLINE_PAIR.match(line)
+            if not match:
+                continue
+            label, value = match.group("label"), match.group("value")
+            if not value and i < len(lines) - 1:
+                value = lines[i + 1]
+        pairs.setdefault(_label_key(label), value.strip())
+    return pairs
+
+
+def _normalize(field: str, value: str) -> str:
+    if field == "Amount (In Rs.)":
+        return value.replace("₹", "").replace("Rs.", "").strip()
+    if field in ("TAN", "CIN"):
+        return value.replace(" ", "").upper()
+    return value
+
+
+def is_valid(field: str, value: str) -> bool:
+    """Checks an extracted value against the format of its field."""
+    if field == "Date of Deposit":
+        for date_format in DATE_FORMATS:
+            try:
+                datetime.strptime(value, date_format)
+                return True
+            except ValueError:
+                continue
+        return False
+    return bool(FIELD_PATTERNS[field].fullmatch(value))
+
+
+def extract_challan_fields(text: str) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Extracts the challan fields from the text of a machine-generated receipt.
+
+    Parameters:
+    text (str): The text layer of the receipt.
+
+    Returns:
+    Tuple[Dict[str, str], List[str]]: The fields in the same shape as the LLM extraction,
+    with "Not found" for missing values, and the fields that are missing or invalid.
+    """
+    pairs = _label_values(text)
+    extracted_data = {field: NOT_FOUND for field in CHALLAN_FIELDS}
+    for label, field in LABEL_FIELDS.items():
+        if label in pairs:
+            extracted_data[field] = _normalize(field, pairs[label])
+    problems = [
+        field for field in CHALLAN_FIELDS
+        if extracted_data[field] == NOT_FOUND or not is_valid(field, extracted_data[field])
+    ]
+    return extracted_data, problems
@@ -0,0 +1,292 @@
+import os
+import threading
+from functools import partial
+from io import BytesIO
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.batch_engine import BatchEngine, BatchProgress, BatchResult, StatusBoard
+from src.challan_batching import BATCH_INSTRUCTIONS, BatchedChallanExtractor, BatchExtractionStats
+from src.challan_cache import ChallanCache, extraction_version, file_digest
+from src.challan_extractor import CHALLAN_FIELDS, EXTRACTOR_VERSION, NOT_FOUND, extract_challan_fields, pdf_text
+from src.logger import logging
+
+EXTRACTION_MODEL = "gpt-4o-mini"  # You can change this to a different model if needed
+EXTRACTION_PROMPT = (
+    "You are a helpful assistant that extracts specific information from text. "
+    "Extract the following fields if present: ITNS No., TAN, Name, Assessment Year, Financial Year, Amount, "
+    "CIN, Date of Deposit, and Challan No. "
+    "Present the information in a markdown table format. "
+    "If a field is not found, include it in the table with the value 'Not found'. "
+    "Use the following markdown table format:\n\n"
+    "| Field | Value |\n"
+    "|-------|-------|\n"
+    "| ITNS No. | [Value] |\n"
+    "| TAN | [Value] |\n"
+    "| Name | [Value] |\n"
+    "| Assessment Year | [Value] |\n"
+    "| Financial Year | [Value] |\n"
+    "| Amount (In Rs.) | [Value] |\n"
+    "| CIN | [Value] |\n"
+    "| Date of Deposit | [Value] |\n"
+    "| Challan No. | [Value] |\n"
+)
+CURRENT_VERSION = extraction_version(EXTRACTION_PROMPT, BATCH_INSTRUCTIONS, EXTRACTION_MODEL, EXTRACTOR_VERSION)
+
+ProgressFactory = Callable[[str, str], Callable[[BatchProgress, BatchResult], None]]
+
+
+def parse_extraction_table(key_info_md: str) -> Dict[str, str]:
+    """Reads the markdown table returned for the single-document prompt into the extracted_data dict."""
+    extracted_data = {field: NOT_FOUND for field in CHALLAN_FIELDS}
+    lines = key_info_md.strip().split("\n")
+    # Iterate over each line in the markdown table to populate the dictionary
+    for line in lines[2:]:  # Skip the header lines
+        items = line.split("|")
+        if len(items) < 3:
+            continue
+        field_name = items[1].strip()
+        field_value = items[2].strip()
+        if field_name in extracted_data:
+            extracted_data[field_name] = field_value
+    return extracted_data
+
+
+class ChallanProcessor:
+    """
+    The challan pipeline without any UI: local fast path, LlamaParse, (batched) LLM
+    extraction and the result cache.
+
+    The OpenAI and LlamaParse clients are only created when a file first needs them, so
+    importing and constructing the processor touches no network.
+
+    Parameters:
+    openai_api_key (Optional[str]): Defaults to the OPENAI_API_KEY environment variable.
+    llama_cloud_api_key (Optional[str]): Defaults to the LLAMA_CLOUD_API_KEY environment variable.
+    engine (Optional[BatchEngine]): The worker pool and rate limits. Configured from the
+        CHALLAN_* and *_REQUESTS_PER_SECOND environment variables by default.
+    cache (Optional[ChallanCache]): The result cache, artifacts/cache/challans.sqlite by default.
+    batch_tokens (Optional[int]): Prompt budget of batched extraction, 0 for one request per
+        file. Defaults to CHALLAN_EXTRACTION_BATCH_TOKENS or 8000.
+    """
+
+    def __init__(
+        self,
+        openai_api_key: Optional[str] = None,
+        llama_cloud_api_key: Optional[str] = None,
+        engine: Optional[BatchEngine] = None,
+        cache: Optional[ChallanCache] = None,
+        batch_tokens: Optional[int] = None,
+    ):
+        self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
+        self.llama_cloud_api_key = llama_cloud_api_key or os.getenv("LLAMA_CLOUD_API_KEY")
+        self.engine = engine or BatchEngine(
+            max_workers=int(os.getenv("CHALLAN_MAX_WORKERS", "8")),
+            rate_limits={
+                "llamaparse": float(os.getenv("LLAMAPARSE_REQUESTS_PER_SECOND", "2")),
+                "openai": float(os.getenv("OPENAI_REQUESTS_PER_SECOND", "5")),
+            },
+            max_retries=int(os.getenv("CHALLAN_MAX_RETRIES", "3")),
+        )
+        self.cache = cache or ChallanCache(os.path.join("artifacts", "cache", "challans.sqlite"), CURRENT_VERSION)
+        if batch_tokens is None:
+            batch_tokens = int(os.getenv("CHALLAN_EXTRACTION_BATCH_TOKENS", "8000"))
+        self.batch_tokens = batch_tokens
+        self._client = None
+        self._parser = None
+        self._extractor = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from openai import OpenAI
+
+                self._client = OpenAI(api_key=self.openai_api_key)
+            return self._client
+
+    @property
+    def parser(self):
+        with self._lock:
+            if self._parser is None:
+                from llama_parse import LlamaParse
+
+                self._parser = LlamaParse(api_key=self.llama_cloud_api_key, result_type="markdown", language="en")
+            return self._parser
+
+    @property
+    def extractor(self) -> Optional[BatchedChallanExtractor]:
+        """The batched extractor, or None when batching is disabled."""
+        if self.batch_tokens <= 0:
+            return None
+        client = self.client
+        with self._lock:
+            if self._extractor is None:
+                self._extractor = BatchedChallanExtractor(
+                    client,
+                    extract_single=self.extract_key_information,
+                    model=EXTRACTION_MODEL,
+                    budget_tokens=self.batch_tokens,
+                    call=partial(self.engine.call, "openai"),
+                )
+            return self._extractor
+
+    def parse_pdf_document(self, pdf_data: bytes, file_name: str) -> str:
+        """Parse a PDF into markdown with LlamaParse."""
+        parser = self.parser
+        # A fresh buffer per attempt, since a failed attempt may have consumed the previous one
+        docs = self.engine.call(
+            "llamaparse", lambda: parser.load_data(BytesIO(pdf_data), extra_info={"file_name": file_name})
+        )
+        return "".join(doc.text for doc in docs)
+
+    def extract_key_information(self, page_content: str) -> Dict[str, str]:
+        """Extract the challan fields of one parsed document with a single chat completion."""
+        full_prompt = (
+            "Analyze the following text and present the extracted information in a markdown table without any "
+            f"additional text or explanations:\n\n{page_content}\n\n{EXTRACTION_PROMPT}"
+        )
+        response = self.engine.call(
+            "openai",
+            self.client.chat.completions.create,
+            model=EXTRACTION_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": full_prompt},
+            ],
+        )
+        return parse_extraction_table(response.choices[0].message.content)
+
+    def _complete(self, board: StatusBoard, index: int, digest: str, extracted_data: Dict[str, str], path: str):
+        # Cache each row as soon as it is done, so an interrupted batch keeps its progress
+        self.cache.put_extracted(digest, extracted_data, path)
+        board.update(index, "done", **extracted_data, **{"Extraction Path": path})
+
+    def _read(self, board: StatusBoard, upload: Tuple[int, bytes, str]) -> Optional[Tuple[str, str]]:
+        """Returns None when the local fast path completed the file, otherwise the parsed content for the LLM."""
+        index, pdf_data, file_name = upload
+        board.update(index, "parsing")
+        digest = file_digest(pdf_data)
+        # Machine-generated receipts are read locally from their text layer, the cloud
+        # parser and the LLM are only used when a required field is missing or malformed
+        try:
+            text = pdf_text(pdf_data)
+        except Exception:
+            text = ""  # Unreadable locally, leave it to the cloud parser
+        extracted_data, problems = extract_challan_fields(text)
+        if not problems:
+            self._complete(board, index, digest, extracted_data, "local")
+            return None
+
+        doc_content = self.cache.get_parsed(digest)
+        if doc_content is None:
+            try:
+                doc_content = self.parse_pdf_document(pdf_data, file_name)
+                if not doc_content:
+                    raise ValueError(f"No text could be parsed from '{file_name}'")
+            except Exception as e:
+                board.update(index, "failed", Error=str(e))
+                raise
+            self.cache.put_parsed(digest, doc_content)
+        board.update(index, "extracting")
+        return doc_content, f"llm ({', '.join(problems)} not found locally)"
+
+    def _extract_pending(
+        self,
+        board: StatusBoard,
+        pending: Dict[int, Tuple[str, str, str]],
+        on_progress: Optional[Callable] = None,
+        on_poll: Optional[Callable] = None,
+    ) -> Tuple[Dict[int, Exception], int]:
+        """Runs the LLM extraction for the files the local path could not handle. Returns the errors and request count."""
+        extractor = self.extractor
+        if extractor is None:
+            def extract_one(index):
+                digest, content, path = pending[index]
+                self._complete(board, index, digest, self.extract_key_information(content), path)
+
+            indices = list(pending)
+            results = self.engine.map(extract_one, indices, on_progress=on_progress, on_poll=on_poll)
+            return {indices[r.index]: r.error for r in results if not r.ok}, len(indices)
+
+        def extract_batch(batch):
+            stats = BatchExtractionStats()
+            extracted, batch_errors = extractor.extract_batch(batch, stats)
+            for doc_id, extracted_data in extracted.items():
+                digest, _, path = pending[int(doc_id)]
+                self._complete(board, int(doc_id), digest, extracted_data, path)
+            for doc_id, error in batch_errors.items():
+                board.update(int(doc_id), "failed", Error=str(error))
+            return batch_errors, stats
+
+        batches = extractor.batches([(str(i), content) for i, (_, content, _) in pending.items()])
+        results = self.engine.map(extract_batch, batches, on_progress=on_progress, on_poll=on_poll)
+        errors, requests = {}, 0
+        for result, batch in zip(results, batches):
+            if not result.ok:
+                errors.update({int(doc_id): result.error for doc_id, _ in batch})
+                continue
+            batch_errors, stats = result.value
+            errors.update({int(doc_id): error for doc_id, error in batch_errors.items()})
+            requests += stats.requests
+        return errors, requests
+
+    def process(
+        self,
+        files: List[Tuple[bytes, str]],
+        board: Optional[StatusBoard] = None,
+        progress: Optional[ProgressFactory] = None,
+        on_poll: Optional[Callable[[], None]] = None,
+    ) -> Tuple[StatusBoard, Dict[int, Exception], int]:
+        """
+        Processes a batch of challan PDFs.
+
+        Files seen before under the current extraction version come from the cache, the
+        rest go through the local fast path and, where that fails, LlamaParse and the LLM.
+
+        Parameters:
+        files (List[Tuple[bytes, str]]): (PDF bytes, file name) pairs.
+        board (Optional[StatusBoard]): Receives per-file status and rows, created if not given.
+        progress (Optional[ProgressFactory]): Builds the BatchEngine progress callback for a
+            stage name and unit, e.g. ("Reading", "PDFs").
+        on_poll (Optional[Callable]): Passed to BatchEngine.map to redraw live displays.
+
+        Returns:
+        Tuple[StatusBoard, Dict[int, Exception], int]: The board with one row per file in
+        input order, the error per failed file index, and the LLM requests sent.
+        """
+        board = board or StatusBoard([file_name for _, file_name in files])
+        progress = progress or (lambda stage, unit: None)
+        errors, pending, new_files = {}, {}, []
+        digests = [file_digest(pdf_data) for pdf_data, _ in files]
+        for index, (pdf_data, file_name) in enumerate(files):
+            cached = self.cache.get_extracted(digests[index])
+            if cached is not None:
+                extracted_data, path = cached
+                board.update(index, "cached", **extracted_data, **{"Extraction Path": path})
+            else:
+                new_files.append((index, pdf_data, file_name))
+        if on_poll is not None:
+            on_poll()
+
+        results = self.engine.map(
+            partial(self._read, board), new_files, on_progress=progress("Reading", "PDFs"), on_poll=on_poll
+        )
+        for result in results:
+            index = new_files[result.index][0]
+            if not result.ok:
+                errors[index] = result.error
+            elif result.value is not None:
+                pending[index] = (digests[index], *result.value)
+
+        requests = 0
+        if pending:
+            extraction_errors, requests = self._extract_pending(
+                board, pending, progress("Extracting", "requests"), on_poll
+            )
+            errors.update(extraction_errors)
+
+        for index, error in errors.items():
+            logging.error(f"Challan '{files[index][1]}' failed: {error}")
+            board.update(index, "failed", Error=str(error))
+        return board, errors, requests
@@ -0,0 +1,294 @@
+"""
+Headless batch jobs for challan extraction and document ingestion, for scheduled runs
+outside the Streamlit app. API keys are read from the environment (or a .env file).
+
+Run from the repository root:
+    python -m src.cli challans path/to/challans --output challans.parquet --workers 8
+    python -m src.cli ingest path/to/documents --backend local --workers 4 --chunk-size 16 --output ingest.csv
+
+Finished files are recorded in <output>.checkpoint.jsonl and skipped when the job is
+run again, so an interrupted job resumes where it stopped. Pass --restart to start over.
+
+ingest shares the manifest, BM25 statistics, embedding cache and local index under
+artifacts/cache with the Chat With Data page, and may run while the app is ingesting
+into the same index: all of them are updated under file or database locks, and the
+local index applies the other process's changes before writing its own.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+from src.challan_cache import file_digest
+from src.logger import logging
+
+
+class Checkpoint:
+    """
+    Append-only JSON lines record of finished files, keyed by content hash.
+
+    Parameters:
+    path (str): The checkpoint file.
+    restart (bool): Discard an existing checkpoint.
+    """
+
+    def __init__(self, path: str, restart: bool = False):
+        self.path = path
+        self.records: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if restart and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file_obj:
+                for line in file_obj:
+                    # A line cut short by an interruption is simply redone
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.records[record["digest"]] = record
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self.records
+
+    def add(self, digest: str, record: Dict):
+        record = {**record, "digest": digest}
+        with self._lock:
+            self.records[digest] = record
+            with open(self.path, "a", encoding="utf-8") as file_obj:
+                file_obj.write(json.dumps(record) + "\n")
+
+
+def list_files(directory: str, extensions: tuple) -> List[str]:
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in names if name.lower().endswith(extensions))
+    return sorted(paths)
+
+
+def write_table(rows: List[Dict], output: str):
+    """Writes rows to Parquet or CSV, depending on the output file extension."""
+    import pandas as pd
+
+    df = pd.DataFrame(rows)
+    if output.endswith(".parquet"):
+        df.to_parquet(output, index=False)
+    else:
+        df.to_csv(output, index=False)
+
+
+def print_progress(stage: str, unit: str):
+    last = {"at": 0.0}
+
+    def show_progress(progress, result):
+        if progress.done == progress.total or time.monotonic() - last["at"] >= 1.0:
+            last["at"] = time.monotonic()
+            print(
+                f"{stage}: {progress.done}/{progress.total} {unit}, {progress.failed} failed, "
+                f"{progress.throughput:.2f} {unit}/s, {progress.retries} retries",
+                file=sys.stderr,
+            )
+
+    return show_progress
+
+
+def run_challans(args) -> int:
+    from src.batch_engine import BatchEngine, StatusBoard
+    from src.challan_pipeline import ChallanProcessor
+
+    checkpoint = Checkpoint(f"{args.output}.checkpoint.jsonl", restart=args.restart)
+    engine = BatchEngine(
+        max_workers=args.workers,
+        rate_limits={
+            "llamaparse": float(os.getenv("LLAMAPARSE_REQUESTS_PER_SECOND", "2")),
+            "openai": float(os.getenv("OPENAI_REQUESTS_PER_SECOND", "5")),
+        },
+        max_retries=int(os.getenv("CHALLAN_MAX_RETRIES", "3")),
+    )
+    processor = ChallanProcessor(engine=engine, batch_tokens=args.batch_tokens)
+
+    paths = list_files(args.input, (".pdf",))
+    order, failures = [], {}
+    # Files are read and processed in slices so memory stays bounded on large directories
+    for start in range(0, len(paths), args.chunk_size):
+        files, digests = [], []
+        for path in paths[start : start + args.chunk_size]:
+            with open(path, "rb") as file_obj:
+                pdf_data = file_obj.read()
+            digest = file_digest(pdf_data)
+            order.append(digest)
+            if digest not in checkpoint:
+                files.append((pdf_data, os.path.relpath(path, args.input)))
+                digests.append(digest)
+        if not files:
+            continue
+
+        board = StatusBoard([name for _, name in files])
+
+        def save_finished():
+            for index, row in enumerate(board.rows()):
+                if row["Status"] in ("done", "cached") and digests[index] not in checkpoint:
+                    checkpoint.add(digests[index], row)
+
+        _, errors, _ = processor.process(files, board=board, progress=print_progress, on_poll=save_finished)
+        save_finished()
+        rows = board.rows()
+        failures.update({digests[index]: rows[index] for index in errors})
+
+    rows = [checkpoint.records.get(digest) or failures[digest] for digest in dict.fromkeys(order)]
+    write_table([{key: value for key, value in row.items() if key != "digest"} for row in rows], args.output)
+    print(f"{len(rows) - len(failures)} challans written to {args.output}, {len(failures)} failed", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def build_ingestor(backend: str, index_name: str):
+    """Creates the same index, encoders and manifest the Chat With Data page uses, see the module docstring."""
+    from langchain_openai import OpenAIEmbeddings
+
+    from src.bm25_store import IncrementalBM25Encoder
+    from src.documents import DocumentIngestor, open_local_index
+    from src.embedding_cache import CachedEmbeddings
+    from src.ingestion import IngestionManifest
+
+    embeddings = CachedEmbeddings(
+        OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY")),
+        cache_dir=os.path.join("artifacts", "cache", "embeddings"),
+    )
+    bm25 = IncrementalBM25Encoder.load_or_seed(
+        os.path.join("artifacts", "cache", "bm25_values.json"),
+        seed_path=os.path.join("artifacts", "bm25_values.json"),
+    )
+    if backend == "local":
+        index = open_local_index(index_name)
+        manifest_name = f"local-{index_name}"
+    else:
+        from pinecone import Pinecone
+
+        index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index(index_name)
+        manifest_name = index_name
+    manifest = IngestionManifest(os.path.join("artifacts", "cache", f"manifest-{manifest_name}.json"))
+    return DocumentIngestor(index, embeddings, bm25, manifest)
+
+
+def run_ingest(args) -> int:
+    from src.documents import default_splitter, pdf_chunk_stream, whatsapp_chunk_stream
+
+    checkpoint = Checkpoint(f"{args.output}.checkpoint.jsonl", restart=args.restart)
+    ingestor = build_ingestor(args.backend, args.index_name)
+    splitter = default_splitter()
+
+    def chat_lines(path):
+        with open(path, encoding="utf-8-sig") as file_obj:
+            yield from file_obj
+
+    # The CPUs are split between the sources synced at once, as in IngestionJobs
+    pdf_workers = max((os.cpu_count() or 1) // args.workers, 1)
+
+    def read(path):
+        name = os.path.basename(path)
+        if path.lower().endswith(".pdf"):
+            with open(path, "rb") as file_obj:
+                data = file_obj.read()
+            digest = file_digest(data)
+        else:
+            # Chat exports can be hundreds of MB, so they are hashed and parsed without being read whole
+            sha256 = hashlib.sha256()
+            with open(path, "rb") as file_obj:
+                for block in iter(lambda: file_obj.read(1 << 20), b""):
+                    sha256.update(block)
+            digest, data = sha256.hexdigest(), None
+        if digest in checkpoint:
+            return path, digest, None, None
+        # Source IDs match the ones the page uses for uploads of the same file. Chunks are
+        # returned as lazy streams, produced while they are synced
+        if data is not None:
+            return path, digest, f"pdf:{name}", pdf_chunk_stream(data, splitter, pdf_workers)
+        return path, digest, f"whatsapp:{name}", whatsapp_chunk_stream(chat_lines(path), splitter)
+
+    def ingest(path):
+        path, digest, source_id, chunks = read(path)
+        report = ingestor.upsert_stream(chunks, source_id) if source_id is not None else None
+        return path, digest, source_id, report
+
+    paths = list_files(args.input, (".pdf", ".txt"))
+    rows, failed, done = [], 0, 0
+    # Each worker reads, hashes, chunks and syncs one source at a time, like the ingestion
+    # jobs of the page, which share the DocumentIngestor the same way. Paths are handed
+    # out in slices, so at most chunk_size PDFs are held in memory at once
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for start in range(0, len(paths), args.chunk_size):
+            futures = {executor.submit(ingest, path): path for path in paths[start : start + args.chunk_size]}
+            for future in as_completed(futures):
+                done += 1
+                path = futures[future]
+                try:
+                    path, digest, source_id, report = future.result()
+                    if source_id is None:
+                        continue
+                except Exception as e:
+                    logging.error(f"Ingestion of {path} failed: {e}")
+                    rows.append({"file": path, "status": "failed", "error": str(e)})
+                    failed += 1
+                    continue
+                record = {
+                    "file": path,
+                    "source_id": source_id,
+                    "status": "done",
+                    "chunks": report.chunks + report.skipped,
+                    "upserted": report.chunks,
+                    "skipped": report.skipped,
+                    "deleted": report.deleted,
+                    "seconds": round(report.seconds, 2),
+                }
+                checkpoint.add(digest, record)
+                print(
+                    f"{done}/{len(paths)} {source_id}: {report.chunks} upserted, {report.skipped} unchanged",
+                    file=sys.stderr,
+                )
+
+    rows = [
+        {key: value for key, value in record.items() if key != "digest"} for record in checkpoint.records.values()
+    ] + rows
+    write_table(rows, args.output)
+    print(f"{len(rows) - failed} documents ingested, {failed} failed, report written to {args.output}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def main(argv=None) -> int:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    challans = commands.add_parser("challans", help="extract challan fields from a directory of PDFs")
+    challans.add_argument("input", help="directory searched recursively for PDFs")
+    challans.add_argument("--output", default="challans.parquet", help=".parquet or .csv")
+    challans.add_argument("--workers", type=int, default=8)
+    challans.add_argument("--batch-tokens", type=int, default=None, help="batched extraction budget, 0 to disable")
+    challans.add_argument("--chunk-size", type=int, default=500, help="files read into memory at a time")
+    challans.add_argument("--restart", action="store_true", help="ignore the checkpoint")
+    challans.set_defaults(run=run_challans)
+
+    ingest = commands.add_parser("ingest", help="chunk and index a directory of PDFs and WhatsApp exports")
+    ingest.add_argument("input", help="directory searched recursively for .pdf and .txt files")
+    ingest.add_argument("--output", default="ingest.csv", help="per-file report, .parquet or .csv")
+    ingest.add_argument("--backend", choices=("pinecone", "local"), default=os.getenv("RETRIEVER_BACKEND", "pinecone"))
+    ingest.add_argument("--index-name", default="rag-finance")
+    ingest.add_argument("--workers", type=int, default=4, help="sources read and synced at once")
+    ingest.add_argument("--chunk-size", type=int, default=16, help="files read ahead at a time")
+    ingest.add_argument("--restart", action="store_true", help="ignore the checkpoint")
+    ingest.set_defaults(run=run_ingest)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
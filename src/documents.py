@@ -0,0 +1,400 @@
+import multiprocessing
+import os
+import re
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.ann_index import IVFIndex
+from src.ingestion import BatchUpserter, UpsertReport
+from src.local_index import LocalHybridIndex
+from src.logger import logging
+
+YOUTUBE_URL_PATTERN = re.compile(
+    r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
+)
+# The first line of a message in Android ("12/03/23, 9:15 pm - Name: text") and iOS
+# ("[12/03/23, 9:15:02 PM] Name: text") exports. Lines without it continue the previous message
+WHATSAPP_MESSAGE_PATTERN = re.compile(
+    r"^\u200e?\[?(?P<date>\d{1,2}/\d{1,2}/\d{2,4}),? (?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?"
+    r"[\u202f ]?(?P<meridiem>[AaPp]\.?[Mm]\.?)?\]?(?: -)? (?:(?P<sender>[^:]+?): )?(?P<text>.*)$"
+)
+WHATSAPP_MEDIA_PATTERN = re.compile(r"^\u200e?(?:<Media omitted>|(?:image|video|audio|sticker|GIF|document) omitted)")
+
+
+def open_local_index(index_name: str, dimension: int = 1536) -> LocalHybridIndex:
+    """
+    Opens the persisted local hybrid index of an index name under artifacts/cache.
+
+    LOCAL_INDEX_ANN selects exact search (empty) or approximate dense search ("ivf" or
+    "ivfpq") for large corpora, tuned with LOCAL_INDEX_NLIST and LOCAL_INDEX_NPROBE.
+    """
+    ann_type = os.getenv("LOCAL_INDEX_ANN", "")
+    ann = None
+    if ann_type in ("ivf", "ivfpq"):
+        ann = IVFIndex(
+            dimension=dimension,
+            nlist=int(os.getenv("LOCAL_INDEX_NLIST", "1024")),
+            nprobe=int(os.getenv("LOCAL_INDEX_NPROBE", "16")),
+            pq_m=96 if ann_type == "ivfpq" else None,
+        )
+    return LocalHybridIndex(os.path.join("artifacts", "cache", f"local-index-{index_name}"), dimension=dimension, ann=ann)
+
+
+def default_splitter():
+    """The chunking used for every document source: 1000 characters with 250 overlap."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=250)
+
+
+def get_youtube_id(url: str) -> Optional[str]:
+    """Extract YouTube video ID from URL"""
+    match = YOUTUBE_URL_PATTERN.match(url)
+    return match.group(6) if match else None
+
+
+# A page's sections as (heading, text) pairs, the first heading None when the page continues the previous section
+PageSections = List[Tuple[Optional[str], str]]
+
+_worker_pdf = None
+
+
+def _page_sections(page) -> PageSections:
+    """
+    Splits the text of a page into sections at its headings.
+
+    A line is a heading when its font is noticeably larger than the body text of the page,
+    or when it is short, entirely bold and does not end like a sentence.
+    """
+    lines = []
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if spans:
+                lines.append(
+                    (
+                        "".join(span["text"] for span in spans).strip(),
+                        max(span["size"] for span in spans),
+                        all(span["flags"] & 16 for span in spans),
+                    )
+                )
+    if not lines:
+        return []
+    sizes = Counter()
+    for text, size, _ in lines:
+        sizes[round(size, 1)] += len(text)
+    body_size = sizes.most_common(1)[0][0]
+
+    sections, heading, body = [], None, []
+    for text, size, bold in lines:
+        is_heading = len(text) <= 120 and (
+            size >= body_size * 1.15 or (bold and len(text.split()) <= 12 and not text.endswith((".", ",", ";", ":")))
+        )
+        if is_heading:
+            if body == [heading]:
+                # A heading directly followed by another, such as a chapter title, opens the next section
+                heading, body = text, body + [text]
+                continue
+            if body or heading is not None:
+                sections.append((heading, "\n".join(body)))
+            heading, body = text, [text]
+        else:
+            body.append(text)
+    sections.append((heading, "\n".join(body)))
+    return sections
+
+
+def _init_pdf_worker(pdf_data: bytes):
+    # The document is sent to each worker once, rather than with every page range
+    global _worker_pdf
+    import pymupdf
+
+    _worker_pdf = pymupdf.open(stream=pdf_data, filetype="pdf")
+
+
+def _extract_pages(start: int, stop: int) -> List[PageSections]:
+    return [_page_sections(_worker_pdf[number]) for number in range(start, stop)]
+
+
+def pdf_page_sections(
+    pdf_data: bytes, workers: Optional[int] = None, batch_pages: int = 16
+) -> Iterator[Tuple[int, PageSections]]:
+    """
+    Extracts the sections of every page of a PDF, in page order, as they become available.
+
+    The PDF is opened from memory. In documents of more than one batch, the first batch_pages
+    pages are extracted in this process while the rest are split into ranges extracted on a
+    process pool, with at most two ranges per worker in flight, so pages are yielded while
+    later ones are still being extracted.
+
+    Parameters:
+    pdf_data (bytes): The PDF file content.
+    workers (Optional[int]): The extraction processes, the CPU count by default.
+    batch_pages (int): Pages extracted per task.
+
+    Returns:
+    Iterator[Tuple[int, PageSections]]: The 1-based page number and the sections of each page.
+    """
+    import pymupdf
+
+    workers = workers or os.cpu_count() or 1
+    with pymupdf.open(stream=pdf_data, filetype="pdf") as document:
+        pages = document.page_count
+        if workers == 1 or pages <= batch_pages:
+            for number in range(pages):
+                yield number + 1, _page_sections(document[number])
+            return
+
+        ranges = iter(range(batch_pages, pages, batch_pages))
+        executor = ProcessPoolExecutor(
+            max_workers=min(workers, (pages - 1) // batch_pages),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_pdf_worker,
+            initargs=(pdf_data,),
+        )
+        try:
+            pending = deque()
+            for start in ranges:
+                pending.append((start, executor.submit(_extract_pages, start, min(start + batch_pages, pages))))
+                if len(pending) == 2 * workers:
+                    break
+            # The first pages are extracted here while the worker processes start up
+            for number in range(batch_pages):
+                yield number + 1, _page_sections(document[number])
+            while pending:
+                start, future = pending.popleft()
+                for offset, sections in enumerate(future.result()):
+                    yield start + offset + 1, sections
+                following = next(ranges, None)
+                if following is not None:
+                    pending.append(
+                        (following, executor.submit(_extract_pages, following, min(following + batch_pages, pages)))
+                    )
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def pdf_chunk_stream(pdf_data: bytes, splitter, workers: Optional[int] = None) -> Iterator[Tuple[str, Dict]]:
+    """
+    Splits a PDF into chunks within its pages and sections, yielding them as pages are extracted.
+
+    Chunks never span two pages or two sections. Each comes with its page number and the
+    heading of its section, carried over from earlier pages when a section continues.
+
+    Parameters:
+    pdf_data (bytes): The PDF file content.
+    splitter: A LangChain text splitter, see default_splitter.
+    workers (Optional[int]): The extraction processes, see pdf_page_sections.
+
+    Returns:
+    Iterator[Tuple[str, Dict]]: The chunk texts and their metadata.
+    """
+    section = None
+    for page, sections in pdf_page_sections(pdf_data, workers):
+        for heading, text in sections:
+            section = heading if heading is not None else section
+            # Pinecone rejects null metadata, so chunks before the first heading have no section
+            metadata = {"page": page} if section is None else {"page": page, "section": section}
+            for chunk in splitter.split_text(text):
+                yield chunk, metadata
+
+
+def pdf_chunks(pdf_data: bytes, splitter) -> List[str]:
+    """
+    Extracts the text of a PDF and splits it into chunks, see pdf_chunk_stream.
+
+    Parameters:
+    pdf_data (bytes): The PDF file content.
+    splitter: A LangChain text splitter, see default_splitter.
+
+    Returns:
+    List[str]: The chunk texts.
+    """
+    return [chunk for chunk, _ in pdf_chunk_stream(pdf_data, splitter)]
+
+
+def whatsapp_messages(lines: Iterable[str], dayfirst: bool = True) -> Iterator[Tuple[datetime, str, str, str]]:
+    """
+    Parses an exported WhatsApp chat line by line into messages.
+
+    Lines that do not start with a timestamp are appended to the message before them.
+    System notices (messages without a sender) and media placeholders are skipped.
+
+    Parameters:
+    lines (Iterable[str]): The lines of the export, e.g. an open text file.
+    dayfirst (bool): Whether dates are written day first, as in most locales outside the US.
+
+    Returns:
+    Iterator[Tuple[datetime, str, str, str]]: The timestamp, date as written, sender and text of each message.
+    """
+    dates = {}  # Parsed dates by their text, since a chat has many messages per day
+    message = None
+    for line in lines:
+        match = WHATSAPP_MESSAGE_PATTERN.match(line)
+        timestamp = None
+        if match:
+            date, hour, minute, second, meridiem, sender, text = match.groups()
+            day = dates.get(date)
+            if day is None:
+                first, middle, year = (int(part) for part in date.split("/"))
+                day_number, month = (first, middle) if dayfirst else (middle, first)
+                if month > 12:
+                    day_number, month = month, day_number
+                try:
+                    day = dates[date] = datetime(year + 2000 if year < 100 else year, month, day_number)
+                except ValueError:
+                    day = None
+            if day is not None:
+                hour = int(hour)
+                if meridiem:
+                    hour = hour % 12 + (12 if meridiem[0] in "Pp" else 0)
+                if hour < 24:
+                    timestamp = day.replace(hour=hour, minute=int(minute) % 60, second=int(second or 0) % 60)
+        if timestamp is None:
+            line = line.strip()
+            if message is not None and line:
+                message[3].append(line)
+            continue
+        if message is not None:
+            yield message[0], message[1], message[2], "\n".join(message[3])
+            message = None
+        text = text.strip()
+        if sender is not None and not ("omitted" in text and WHATSAPP_MEDIA_PATTERN.match(text)):
+            message = (timestamp, date, sender.strip(), [text])
+    if message is not None:
+        yield message[0], message[1], message[2], "\n".join(message[3])
+
+
+def whatsapp_chunk_stream(
+    lines: Iterable[str],
+    splitter,
+    max_chars: int = 1000,
+    overlap_chars: int = 250,
+    gap_minutes: int = 60,
+    dayfirst: bool = True,
+) -> Iterator[Tuple[str, Dict]]:
+    """
+    Groups the messages of an exported WhatsApp chat into chunks by conversation, lazily.
+
+    A chunk holds consecutive messages until there is a pause of more than gap_minutes,
+    which starts a new conversation, or until it would exceed max_chars. A chunk cut by
+    size repeats its last messages, up to overlap_chars, at the start of the next one.
+    Messages longer than max_chars on their own are split with the splitter. Memory is
+    bounded by the chunk size, whatever the size of the export.
+
+    Parameters:
+    lines (Iterable[str]): The lines of the export, e.g. an open text file.
+    splitter: A LangChain text splitter, see default_splitter.
+    max_chars (int): The chunk size, as in default_splitter.
+    overlap_chars (int): The overlap between chunks of one conversation, as in default_splitter.
+    gap_minutes (int): The pause that ends a conversation.
+    dayfirst (bool): Whether dates are written day first.
+
+    Returns:
+    Iterator[Tuple[str, Dict]]: The chunk texts, and their first and last message time and senders.
+    """
+    gap = timedelta(minutes=gap_minutes)
+    window: List[Tuple[datetime, str, str]] = []  # (timestamp, sender, line)
+    size = 0
+
+    def chunk(entries):
+        senders = list(dict.fromkeys(sender for _, sender, _ in entries))
+        metadata = {"start": entries[0][0].isoformat(), "end": entries[-1][0].isoformat(), "senders": senders}
+        return "\n".join(line for _, _, line in entries), metadata
+
+    for timestamp, date, sender, text in whatsapp_messages(lines, dayfirst):
+        line = f"{date} {sender}: {text}"
+        if window and timestamp - window[-1][0] > gap:
+            yield chunk(window)
+            window, size = [], 0
+        if len(line) > max_chars:
+            if window:
+                yield chunk(window)
+                window, size = [], 0
+            for piece in splitter.split_text(line):
+                yield chunk([(timestamp, sender, piece)])
+            continue
+        # size counts a newline after every line, which is exactly the joined length with the new line
+        if window and size + len(line) > max_chars:
+            yield chunk(window)
+            overlap, overlap_size = [], 0
+            for entry in reversed(window):
+                if overlap_size + len(entry[2]) + 1 > min(overlap_chars, max_chars - len(line)):
+                    break
+                overlap.insert(0, entry)
+                overlap_size += len(entry[2]) + 1
+            window, size = overlap, overlap_size
+        window.append((timestamp, sender, line))
+        size += len(line) + 1
+    if window:
+        yield chunk(window)
+
+
+def whatsapp_chunks(text: str, splitter) -> List[str]:
+    """Splits an exported WhatsApp chat into chunks of conversation, see whatsapp_chunk_stream."""
+    return [chunk for chunk, _ in whatsapp_chunk_stream(text.splitlines(), splitter)]
+
+
+def youtube_chunks(youtube_id: str, splitter) -> List[str]:
+    """Fetches the transcript of a YouTube video and splits it into chunks."""
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    result = YouTubeTranscriptApi.get_transcript(youtube_id)
+    yt_captions = " ".join(item['text'] for item in result)
+    return [chunk.page_content for chunk in splitter.create_documents([yt_captions])]
+
+
+class DocumentIngestor:
+    """
+    Syncs the chunks of document sources into a hybrid index.
+
+    Parameters:
+    index: A Pinecone index or LocalHybridIndex.
+    embedding_model: The dense embeddings model.
+    sparse_encoder: The BM25 encoder, updated incrementally when it supports partial_fit.
+    manifest (IngestionManifest): The record of already indexed chunks.
+    text_key (str): The metadata key holding the chunk text.
+    """
+
+    def __init__(self, index, embedding_model, sparse_encoder, manifest, text_key: str = "text"):
+        self.index = index
+        self.embedding_model = embedding_model
+        self.sparse_encoder = sparse_encoder
+        self.manifest = manifest
+        self.text_key = text_key
+
+    def upsert_chunks(self, chunks: List[str], source_id: str) -> UpsertReport:
+        """Upsert the new or changed chunks of one source into the index and drop its stale chunks."""
+        upserter = BatchUpserter(
+            index=self.index,
+            embedding_model=self.embedding_model,
+            sparse_encoder=self.sparse_encoder,
+            text_key=self.text_key,
+        )
+        report = upserter.sync_source(source_id, chunks, self.manifest)
+        if isinstance(self.index, LocalHybridIndex) and (report.chunks or report.deleted):
+            self.index.flush()
+        logging.info(f"Synced {source_id}: {report.chunks} new, {report.skipped} unchanged, {report.deleted} removed")
+        return report
+
+    def upsert_stream(self, chunks: Iterable[Tuple[str, Dict]], source_id: str) -> UpsertReport:
+        """
+        Like upsert_chunks, for chunks with metadata that are embedded while the source is still being read.
+
+        Parameters:
+        chunks (Iterable[Tuple[str, Dict]]): The chunk texts and metadata, e.g. from pdf_chunk_stream.
+        source_id (str): A stable identifier of the document.
+        """
+        upserter = BatchUpserter(
+            index=self.index,
+            embedding_model=self.embedding_model,
+            sparse_encoder=self.sparse_encoder,
+            text_key=self.text_key,
+        )
+        report = upserter.sync_stream(source_id, chunks, self.manifest)
+        if isinstance(self.index, LocalHybridIndex) and (report.chunks or report.deleted):
+            self.index.flush()
+        logging.info(f"Synced {source_id}: {report.chunks} new, {report.skipped} unchanged, {report.deleted} removed")
+        return report
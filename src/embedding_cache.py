@@ -0,0 +1,228 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.logger import logging
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so that re-extracted copies of the same text share a cache entry."""
+    return " ".join(text.split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Persistent, size-bounded cache in front of a LangChain embeddings model.
+
+    Vectors are stored in a memory-mapped float32 matrix with one row per entry, and a
+    SQLite database maps the key of each entry (model name plus a hash of the normalized
+    text) to its row and last access time. When the cache is full the least recently
+    used rows are reused. Both files survive restarts, so repeated chunks and queries
+    never reach the embeddings API twice. Several processes may share a cache directory,
+    such as the app and the ingest CLI. Rows are claimed inside a SQLite write
+    transaction, so no two processes are handed the same row. Cached rows are also read
+    inside one, so no other process can evict and reuse a row between its lookup and the
+    copy of its vector.
+
+    Parameters:
+    embeddings (Embeddings): The model to call on cache misses.
+    cache_dir (str): The directory holding the SQLite index and the vector matrix.
+    max_entries (int): The maximum number of cached vectors.
+    model_name (str): The name used in cache keys. Defaults to the wrapped model's name.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache_dir: str, max_entries: int = 50_000, model_name: str = None):
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, slot INTEGER UNIQUE, last_used REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+        self._vectors = None
+        self._open_existing_matrix()
+
+    def _open_existing_matrix(self):
+        meta = dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+        if "dimension" in meta:
+            # The matrix file was sized on creation, so an existing cache keeps its capacity
+            self.max_entries = int(meta["capacity"])
+            self._open_matrix(int(meta["dimension"]), record=False)
+
+    def _open_matrix(self, dimension: int, record: bool = True):
+        path = os.path.join(self.cache_dir, "vectors.f32")
+        mode = "r+" if os.path.exists(path) else "w+"
+        self._vectors = np.memmap(path, dtype=np.float32, mode=mode, shape=(self.max_entries, dimension))
+        if not record:
+            return
+        self._db.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+            [("dimension", str(dimension)), ("capacity", str(self.max_entries))],
+        )
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{digest}"
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """Return the hit, miss and eviction counters of this process and the number of cached vectors."""
+        with self._lock:
+            (size,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+            "entries": size,
+        }
+
+    def _lookup(self, keys: List[str]) -> Dict[str, int]:
+        slots = {}
+        unique = list(dict.fromkeys(keys))
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(unique), 500):
+            part = unique[start : start + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = self._db.execute(f"SELECT key, slot FROM entries WHERE key IN ({placeholders})", part)
+            slots.update(rows.fetchall())
+        return slots
+
+    def _read(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Returns the cached vectors of keys and marks them as used."""
+        # The write lock is needed for last_used anyway, and it keeps the rows from being
+        # reused by another process until their vectors are copied
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            slots = self._lookup(keys)
+            if slots and self._vectors is None:
+                self._open_existing_matrix()
+            if slots:
+                now = time.time()
+                self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in slots])
+            cached = {key: self._vectors[slot].tolist() for key, slot in slots.items()}
+        except Exception:
+            self._db.rollback()
+            raise
+        self._db.commit()
+        return cached
+
+    def _allocate(self, count: int) -> List[int]:
+        """Return free rows of the matrix, evicting the least recently used entries if needed."""
+        # Rows are handed out in order and evicted rows are reused at once, so rows 0..used-1 are always taken
+        (used,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        slots = list(range(used, min(used + count, self.max_entries)))
+        shortfall = count - len(slots)
+        if shortfall > 0:
+            evicted = self._db.execute(
+                "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (shortfall,)
+            ).fetchall()
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in evicted])
+            slots.extend(slot for _, slot in evicted)
+            self.evictions += len(evicted)
+        return slots
+
+    def _store(self, keys: List[str], vectors: List[List[float]]):
+        """Writes new vectors to free rows. The caller commits."""
+        # Taking the write lock up front keeps the row count _allocate reads valid until the rows are inserted
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            if self._vectors is None:
+                # Another process may have created the matrix since this one opened the cache
+                self._open_existing_matrix()
+            if self._vectors is None:
+                self._open_matrix(len(vectors[0]))
+            # Another thread or process may have stored the same text meanwhile, and only max_entries vectors fit
+            present = self._lookup(keys)
+            pairs = [(key, vector) for key, vector in zip(keys, vectors) if key not in present]
+            pairs = pairs[-self.max_entries :]
+            if not pairs:
+                return
+            slots = self._allocate(len(pairs))
+            self._vectors[slots] = np.asarray([vector for _, vector in pairs], dtype=np.float32)
+            self._vectors.flush()
+            now = time.time()
+            self._db.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?)", [(key, slot, now) for (key, _), slot in zip(pairs, slots)]
+            )
+        except Exception:
+            self._db.rollback()
+            raise
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a list of texts, calling the wrapped model only for texts not in the cache.
+
+        Parameters:
+        texts (List[str]): The texts to embed.
+
+        Returns:
+        List[List[float]]: One vector per text, in input order.
+        """
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            cached = self._read(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        hits = sum(1 for key in keys if key in cached)
+        self.hits += hits
+        self.misses += len(keys) - hits
+
+        if missing:
+            fresh = self.embeddings.embed_documents(list(missing.values()))
+            cached.update(zip(missing.keys(), fresh))
+            with self._lock:
+                self._store(list(missing.keys()), fresh)
+                self._db.commit()
+            logging.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} embedded")
+
+        return [list(cached[key]) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a single query, served from the cache when the same text was embedded before.
+
+        Parameters:
+        text (str): The query text.
+
+        Returns:
+        List[float]: The query vector.
+        """
+        key = self._key(text)
+        with self._lock:
+            vector = self._read([key]).get(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+
+        self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._store([key], [vector])
+            self._db.commit()
+        return vector
@@ -0,0 +1,59 @@
+import os
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """
+    Holds an exclusive lock on path + ".lock" for the duration of the block.
+
+    The lock is advisory and taken on a separate file, so the file it guards can still be
+    replaced atomically while it is held. It serializes read-modify-write cycles between
+    processes, such as the Streamlit app and the headless CLI updating the same state.
+
+    Parameters:
+    path (str): The file to guard.
+    """
+    lock_path = f"{path}.lock"
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            # LK_LOCK retries for 10 seconds before giving up, so keep trying until it is granted
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+def file_state(path_or_file) -> Optional[Tuple[int, int, int]]:
+    """
+    Identifies the version of a file on disk, to tell whether another process replaced it.
+
+    Parameters:
+    path_or_file: A path, or an open file object.
+
+    Returns:
+    Optional[Tuple[int, int, int]]: The inode, modification time and size, None when the
+    path does not exist. An atomic replace always changes the inode.
+    """
+    try:
+        stat = os.fstat(path_or_file.fileno()) if hasattr(path_or_file, "fileno") else os.stat(path_or_file)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
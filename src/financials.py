@@ -0,0 +1,383 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from src.logger import logging
+from src.parquet_sheets import ParquetSheet
+
+ANALYTICS_VERSION = "2"
+
+# Sheet names as the Excel page knows them, and the column names each role is found under
+SHEET_KINDS = {
+    "Sales Data": "sales",
+    "COGS": "cogs",
+    "Expenses": "expenses",
+    "Balance Sheet Data": "balance",
+}
+COLUMN_CANDIDATES = {
+    "sales": {
+        "revenue": ["Net Sale Amount", "Net Sales", "Revenue", "Sale Amount", "Amount"],
+        "date": ["Date of Sale", "Date", "Invoice Date"],
+        "customer": ["Customer ID", "Customer", "Customer Name"],
+        "product": ["Product Name", "Product", "Item"],
+    },
+    "cogs": {
+        "amount": ["COGS Amount", "COGS", "Cost", "Amount"],
+        "date": ["Date", "Date of Sale"],
+        "product": ["Product Name", "Product", "Item"],
+    },
+    "expenses": {
+        "amount": ["Amount", "Expense Amount", "Value"],
+        "date": ["Date", "Expense Date"],
+        "type": ["Expense Type", "Type", "Category"],
+    },
+    "balance": {
+        "value": ["Value", "Amount", "Balance"],
+        "type": ["Type", "Class"],
+        "description": ["Description", "Account", "Line Item"],
+        "date": ["Date", "As Of", "Balance Date"],
+    },
+}
+# Balance sheet line types after lower-casing and dropping a plural "s", e.g. "ASSETS" or "Liabilities"
+BALANCE_TYPES = {
+    "asset": "Asset",
+    "liability": "Liability",
+    "liabilitie": "Liability",
+    "equity": "Equity",
+    "equitie": "Equity",
+}
+# The date of balance sheet lines without one, older than any real date so dated lines take precedence
+UNDATED = pd.Timestamp.min
+# Balance sheet lines counted as current assets or current liabilities
+CURRENT_KEYWORDS = (
+    "cash",
+    "receivable",
+    "inventory",
+    "prepaid",
+    "marketable",
+    "payable",
+    "accrued",
+    "short-term",
+    "short term",
+    "current",
+    "overdraft",
+)
+
+
+@dataclass
+class FinancialReport:
+    """
+    Financial statement metrics of one workbook.
+
+    Parameters:
+    metrics (Dict[str, float]): Headline figures such as total revenue, gross margin,
+        current ratio and debt-to-equity. Figures whose sheets are missing are left out.
+    tables (Dict[str, pd.DataFrame]): Breakdowns by period, customer, product, expense
+        type and balance sheet line.
+    sheets (List[str]): The sheets the figures were computed from.
+    freq (str): The pandas period frequency of the period tables.
+    seconds (float): Time taken to compute the report.
+    """
+
+    metrics: Dict[str, float] = field(default_factory=dict)
+    tables: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    sheets: List[str] = field(default_factory=list)
+    freq: str = "M"
+    seconds: float = 0.0
+
+
+def find_column(df: pd.DataFrame, candidates: List[str]) -> Optional[str]:
+    """The first candidate present in the frame, matched case-insensitively and ignoring surrounding spaces."""
+    columns = {str(column).strip().lower(): column for column in df.columns}
+    for candidate in candidates:
+        if candidate.lower() in columns:
+            return columns[candidate.lower()]
+    return None
+
+
+def _sum_by(values: pd.Series, *keys: pd.Series) -> pd.Series:
+    return values.groupby(list(keys), observed=True, sort=False, dropna=True).sum()
+
+
+def _sum_by_period(values: pd.Series, dates: pd.Series, freq: str, *keys: pd.Series) -> pd.Series:
+    """
+    Sums by the given keys and period. The values are summed per distinct date first, so
+    only the distinct dates are parsed, however many rows share them.
+    """
+    by_date = _sum_by(values, *keys, dates.rename("period"))
+    levels = [by_date.index.get_level_values(level) for level in range(by_date.index.nlevels)]
+    dates = levels.pop()
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates.astype(str), errors="coerce", format="mixed")
+    periods = pd.PeriodIndex(dates, freq=freq, name="period")
+    return by_date.groupby(levels + [periods], observed=True, dropna=True).sum()
+
+
+def aggregate_sheet(kind: str, df: pd.DataFrame, freq: str = "M") -> Dict[str, pd.Series]:
+    """
+    Partial sums of one sheet, or of one chunk of it.
+
+    The partials of several chunks are combined with merge_partials, so a sheet too large
+    for memory can be aggregated piece by piece.
+
+    Parameters:
+    kind (str): "sales", "cogs", "expenses" or "balance", see SHEET_KINDS.
+    df (pd.DataFrame): The sheet or chunk.
+    freq (str): The period frequency, e.g. "M" for months or "Q" for quarters.
+
+    Returns:
+    Dict[str, pd.Series]: Sums keyed by what they are grouped by. Empty when the sheet
+    lacks the required columns.
+    """
+    columns = {role: find_column(df, candidates) for role, candidates in COLUMN_CANDIDATES[kind].items()}
+    amount_role = {"sales": "revenue", "cogs": "amount", "expenses": "amount", "balance": "value"}[kind]
+    if columns[amount_role] is None:
+        candidates = COLUMN_CANDIDATES[kind][amount_role]
+        logging.warning(f"No {amount_role} column in the {kind} sheet, looked for {candidates}")
+        return {}
+    amount = pd.to_numeric(df[columns[amount_role]], errors="coerce").fillna(0.0)
+
+    partials = {}
+    if kind == "balance":
+        line_type = df[columns["type"]] if columns["type"] is not None else pd.Series("Asset", index=df.index)
+        description = df[columns["description"]] if columns["description"] is not None else pd.Series("Total", index=df.index)
+        date = df[columns["date"]] if columns["date"] is not None else pd.Series("", index=df.index)
+        balance = _sum_by(amount, line_type.rename("type"), description.rename("description"), date.rename("date"))
+        # Labels and dates are normalised after grouping, on the few distinct lines rather than every row
+        types = balance.index.get_level_values("type").astype(str).str.strip().str.lower().str.rstrip("s")
+        types = types.map(lambda value: BALANCE_TYPES.get(value, value.title()))
+        descriptions = balance.index.get_level_values("description").astype(str)
+        dates = balance.index.get_level_values("date")
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates.astype(str), errors="coerce", format="mixed")
+        dates = pd.DatetimeIndex(dates).fillna(UNDATED).rename("date")
+        partials["balance"] = balance.groupby([types.rename("type"), descriptions.rename("description"), dates]).sum()
+        return partials
+
+    dates = df[columns["date"]] if columns["date"] is not None else None
+    if dates is not None:
+        partials[f"{kind}_by_period"] = _sum_by_period(amount, dates, freq)
+    if kind == "sales":
+        partials["sales_total"] = pd.Series({"total": amount.sum()})
+        if columns["customer"] is not None:
+            partials["sales_by_customer"] = _sum_by(amount, df[columns["customer"]].rename("customer"))
+        if columns["product"] is not None:
+            partials["sales_by_product"] = _sum_by(amount, df[columns["product"]].rename("product"))
+    elif kind == "cogs":
+        partials["cogs_total"] = pd.Series({"total": amount.sum()})
+        if columns["product"] is not None:
+            partials["cogs_by_product"] = _sum_by(amount, df[columns["product"]].rename("product"))
+    elif kind == "expenses":
+        partials["expenses_total"] = pd.Series({"total": amount.sum()})
+        expense_type = pd.Series("Other", index=df.index, name="type")
+        if columns["type"] is not None:
+            expense_type = df[columns["type"]].rename("type")
+        if dates is not None:
+            partials["expenses_by_type_period"] = _sum_by_period(amount, dates, freq, expense_type)
+        else:
+            partials["expenses_by_type"] = _sum_by(amount, expense_type)
+    return partials
+
+
+def merge_partials(partials: Iterable[Dict[str, pd.Series]]) -> Dict[str, pd.Series]:
+    """Adds up the partial sums of several chunks, aligning them on their group keys."""
+    collected: Dict[str, List[pd.Series]] = {}
+    for partial in partials:
+        for name, series in partial.items():
+            collected.setdefault(name, []).append(series)
+    merged = {}
+    for name, parts in collected.items():
+        combined = pd.concat(parts)
+        merged[name] = combined.groupby(level=list(range(combined.index.nlevels)), observed=True, sort=False).sum()
+    return merged
+
+
+def _with_share(series: pd.Series, name: str) -> pd.DataFrame:
+    table = series.sort_values(ascending=False).to_frame(name)
+    total = series.sum()
+    table["share_pct"] = 100 * table[name] / total if total else np.nan
+    return table
+
+
+def _ratio(numerator: float, denominator: float) -> float:
+    return numerator / denominator if denominator else float("nan")
+
+
+def build_report(sums: Dict[str, pd.Series], freq: str = "M") -> FinancialReport:
+    """
+    Derives the metrics and tables from merged partial sums.
+
+    Gross margin is revenue minus COGS, overall, per period and per product. Balance sheet
+    lines are balances at a date, so each line (type and description) counts with its
+    value at its latest date only. The current ratio divides current assets by current
+    liabilities, where a line is current when its description contains one of
+    CURRENT_KEYWORDS. Debt-to-equity divides total liabilities by equity, taken from
+    "Equity" lines when the sheet has them and as assets minus liabilities otherwise. It
+    is NaN when equity is not positive, where the ratio has no meaning.
+    """
+    report = FinancialReport(freq=freq)
+    metrics, tables = report.metrics, report.tables
+    revenue = sums["sales_total"].sum() if "sales_total" in sums else None
+    cogs = sums["cogs_total"].sum() if "cogs_total" in sums else None
+    expenses = sums["expenses_total"].sum() if "expenses_total" in sums else None
+
+    if revenue is not None:
+        metrics["total_revenue"] = revenue
+    if cogs is not None:
+        metrics["total_cogs"] = cogs
+    if revenue is not None and cogs is not None:
+        metrics["gross_margin"] = revenue - cogs
+        metrics["gross_margin_pct"] = 100 * _ratio(revenue - cogs, revenue)
+    if expenses is not None:
+        metrics["total_expenses"] = expenses
+        if "gross_margin" in metrics:
+            metrics["operating_income"] = metrics["gross_margin"] - expenses
+
+    expenses_by_period = None
+    if "expenses_by_type_period" in sums:
+        by_type_period = sums["expenses_by_type_period"]
+        tables["expenses_by_type_period"] = by_type_period.unstack("period", fill_value=0.0).sort_index(axis=1)
+        tables["expenses_by_type"] = _with_share(by_type_period.groupby(level="type").sum(), "amount")
+        expenses_by_period = by_type_period.groupby(level="period").sum()
+    elif "expenses_by_type" in sums:
+        tables["expenses_by_type"] = _with_share(sums["expenses_by_type"], "amount")
+
+    period_columns = {
+        "revenue": sums.get("sales_by_period"),
+        "cogs": sums.get("cogs_by_period"),
+        "expenses": expenses_by_period,
+    }
+    period_columns = {name: series for name, series in period_columns.items() if series is not None}
+    if period_columns:
+        by_period = pd.DataFrame(period_columns).sort_index().fillna(0.0)
+        if {"revenue", "cogs"} <= set(by_period.columns):
+            by_period["gross_margin"] = by_period["revenue"] - by_period["cogs"]
+            by_period["gross_margin_pct"] = 100 * by_period["gross_margin"] / by_period["revenue"].replace(0, np.nan)
+            if "expenses" in by_period.columns:
+                by_period["operating_income"] = by_period["gross_margin"] - by_period["expenses"]
+        by_period.index = by_period.index.astype(str)
+        tables["by_period"] = by_period
+
+    if "sales_by_customer" in sums:
+        tables["revenue_by_customer"] = _with_share(sums["sales_by_customer"], "revenue")
+    if "sales_by_product" in sums or "cogs_by_product" in sums:
+        by_product = pd.DataFrame(
+            {"revenue": sums.get("sales_by_product"), "cogs": sums.get("cogs_by_product")}
+        ).fillna(0.0)
+        by_product["gross_margin"] = by_product["revenue"] - by_product["cogs"]
+        by_product["gross_margin_pct"] = 100 * by_product["gross_margin"] / by_product["revenue"].replace(0, np.nan)
+        tables["by_product"] = by_product.sort_values("revenue", ascending=False)
+
+    if "balance" in sums:
+        balance = sums["balance"]
+        dates = balance.index.get_level_values("date")
+        latest = balance.index.to_frame(index=False).groupby(["type", "description"])["date"].transform("max")
+        balance = balance[dates == latest.to_numpy()].droplevel("date")
+        tables["balance_sheet"] = balance.unstack("type", fill_value=0.0)
+        line_type = balance.index.get_level_values("type")
+        current = balance.index.get_level_values("description").str.lower().str.contains("|".join(CURRENT_KEYWORDS))
+        assets = balance[line_type == "Asset"].sum()
+        liabilities = balance[line_type == "Liability"].sum()
+        equity_lines = balance[line_type == "Equity"]
+        equity = equity_lines.sum() if len(equity_lines) else assets - liabilities
+        metrics.update(
+            total_assets=assets,
+            total_liabilities=liabilities,
+            equity=equity,
+            current_assets=balance[(line_type == "Asset") & current].sum(),
+            current_liabilities=balance[(line_type == "Liability") & current].sum(),
+        )
+        metrics["current_ratio"] = _ratio(metrics["current_assets"], metrics["current_liabilities"])
+        metrics["debt_to_equity"] = _ratio(liabilities, equity) if equity > 0 else float("nan")
+    report.metrics = {name: float(value) for name, value in metrics.items()}
+    return report
+
+
+def compute_financials(sheets: Dict[str, Union[pd.DataFrame, ParquetSheet]], freq: str = "M") -> FinancialReport:
+    """
+    Financial metrics of the recognised sheets of a workbook.
+
+    Sheets too large for memory can be passed as ParquetSheet, which is aggregated chunk
+    by chunk, so memory is bounded by the chunk size and the number of groups.
+
+    Parameters:
+    sheets (Dict[str, Union[pd.DataFrame, ParquetSheet]]): Sheets by name. Names not in SHEET_KINDS are ignored.
+    freq (str): The period frequency of the period tables.
+
+    Returns:
+    FinancialReport: The metrics and breakdown tables.
+    """
+    started = time.perf_counter()
+    partials = []
+    for name, sheet in sheets.items():
+        if name not in SHEET_KINDS:
+            continue
+        if isinstance(sheet, ParquetSheet):
+            # Fold each chunk into the running sums, so only one chunk's groups are held besides the totals
+            sums = {}
+            for chunk in sheet.chunks():
+                sums = merge_partials([sums, aggregate_sheet(SHEET_KINDS[name], chunk, freq)])
+            partials.append(sums)
+        else:
+            partials.append(aggregate_sheet(SHEET_KINDS[name], sheet, freq))
+    report = build_report(merge_partials(partials), freq)
+    report.sheets = [name for name in sheets if name in SHEET_KINDS]
+    report.seconds = time.perf_counter() - started
+    logging.info(f"Computed financials of {report.sheets} in {report.seconds:.2f}s")
+    return report
+
+
+class FinancialsCache:
+    """
+    Financial reports cached per workbook content hash and period frequency.
+
+    Reports are kept in memory and pickled under directory, so they survive restarts. The
+    key includes ANALYTICS_VERSION, so changing how metrics are computed invalidates them.
+
+    Parameters:
+    directory (str): Where the reports are written.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._reports: Dict[str, FinancialReport] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get_or_compute(
+        self,
+        digest: str,
+        sheet_names: List[str],
+        load_sheet: Callable[[str], Union[pd.DataFrame, ParquetSheet]],
+        freq: str = "M",
+    ) -> FinancialReport:
+        """
+        Returns the cached report of a workbook, computing it from its recognised sheets on a miss.
+
+        Parameters:
+        digest (str): The SHA-256 of the workbook file.
+        sheet_names (List[str]): The sheets of the workbook.
+        load_sheet (Callable): Returns a sheet by name, only called on a cache miss.
+        freq (str): The period frequency.
+        """
+        key = f"{digest}-{freq}-v{ANALYTICS_VERSION}"
+        path = os.path.join(self.directory, f"{key}.pkl")
+        with self._lock:
+            report = self._reports.get(key)
+            if report is None and os.path.exists(path):
+                report = pd.read_pickle(path)
+                self._reports[key] = report
+        if report is not None:
+            return report
+        report = compute_financials({name: load_sheet(name) for name in sheet_names if name in SHEET_KINDS}, freq)
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+        pd.to_pickle(report, partial)
+        os.replace(partial, path)
+        with self._lock:
+            self._reports[key] = report
+        return report
@@ -0,0 +1,544 @@
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from src.exception import CustomException
+from src.file_lock import file_lock, file_state
+from src.logger import logging
+
+# Pinecone rejects upsert requests above 2MB and recommends ~100 dense vectors per call
+MAX_REQUEST_BYTES = 2 * 1024 * 1024
+MAX_VECTORS_PER_REQUEST = 100
+MAX_IDS_PER_DELETE = 1000
+
+
+def batched(items: List, batch_size: int) -> Iterator[List]:
+    """
+    Yields consecutive slices of at most batch_size items from the given list.
+
+    Parameters:
+    items (List): The items to split.
+    batch_size (int): The maximum number of items in a slice.
+
+    Returns:
+    Iterator[List]: The slices in their original order.
+    """
+    for start in range(0, len(items), batch_size):
+        yield items[start : start + batch_size]
+
+
+def chunk_id(source_id: str, text: str) -> str:
+    """
+    Derives a content-addressed vector ID from the source ID and the chunk text.
+
+    Whitespace is normalized before hashing so that re-extracting the same document
+    with different line wrapping yields the same IDs.
+
+    Parameters:
+    source_id (str): A stable identifier of the document the chunk came from.
+    text (str): The chunk text.
+
+    Returns:
+    str: A hex digest that is identical for identical chunks of the same source.
+    """
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{source_id}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+def estimate_vector_bytes(vector: Dict) -> int:
+    """
+    Estimates the serialized request size of a single upsert record.
+
+    Parameters:
+    vector (Dict): A record with id, values, sparse_values and metadata keys.
+
+    Returns:
+    int: The approximate number of bytes the record adds to an upsert request.
+    """
+    # A float32 serializes to roughly 20 characters in JSON including the separator
+    size = len(vector["id"]) + 20 * len(vector["values"])
+    sparse = vector.get("sparse_values")
+    if sparse:
+        size += 32 * len(sparse["indices"])
+    metadata = vector.get("metadata")
+    if metadata:
+        size += len(json.dumps(metadata, ensure_ascii=False).encode("utf-8"))
+    return size
+
+
+def size_bounded_batches(
+    vectors: List[Dict],
+    max_vectors: int = MAX_VECTORS_PER_REQUEST,
+    max_bytes: int = MAX_REQUEST_BYTES,
+) -> Iterator[List[Dict]]:
+    """
+    Groups upsert records into requests bounded by both record count and payload size.
+
+    Parameters:
+    vectors (List[Dict]): The records to group.
+    max_vectors (int): The maximum number of records per request.
+    max_bytes (int): The maximum estimated payload size per request.
+
+    Returns:
+    Iterator[List[Dict]]: Lists of records, each small enough for a single upsert call.
+    """
+    batch, batch_bytes = [], 0
+    for vector in vectors:
+        vector_bytes = estimate_vector_bytes(vector)
+        if batch and (len(batch) >= max_vectors or batch_bytes + vector_bytes > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(vector)
+        batch_bytes += vector_bytes
+    if batch:
+        yield batch
+
+
+@dataclass
+class UpsertReport:
+    """
+    Summary of a bulk upsert run.
+
+    Parameters:
+    chunks (int): The number of chunks written to the index.
+    requests (int): The number of upsert requests sent.
+    retries (int): The number of failed requests that were retried.
+    seconds (float): The wall-clock time of the run.
+    skipped (int): The number of chunks already in the index that were not re-embedded.
+    deleted (int): The number of stale chunks removed from the index.
+    """
+
+    chunks: int = 0
+    requests: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+    skipped: int = 0
+    deleted: int = 0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds > 0 else 0.0
+
+
+class IngestionManifest:
+    """
+    Persistent record of which chunk IDs each source has in the index.
+
+    The manifest is a JSON file mapping source IDs to their chunk IDs. It is rewritten
+    atomically after every change so an interrupted run never leaves it half written.
+    Several processes may share the file, such as the app and the ingest CLI: every read
+    reloads it when another process replaced it, and record holds a file lock while it
+    reloads, applies its change and writes, so no process overwrites another's sources.
+    version counts the changes this instance made or picked up from the file, so
+    in-process caches of retrieval results can tell when the index has moved on. revision
+    identifies the file itself, so it also changes across restarts.
+
+    Parameters:
+    path (str): The JSON file backing the manifest. It is created on first save.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.sources: Dict[str, List[str]] = {}
+        self.version = 0
+        self._state = None
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        """Reload the file if another process replaced it. Called with self._lock held."""
+        if file_state(self.path) in (None, self._state):
+            return
+        with open(self.path, encoding="utf-8") as file_obj:
+            self.sources = json.load(file_obj)
+            state = file_state(file_obj)
+        if self._state is not None:
+            self.version += 1
+        self._state = state
+
+    @property
+    def revision(self) -> str:
+        """The version of the manifest file on disk, which changes with every ingest by any process."""
+        with self._lock:
+            self._refresh()
+            return "-".join(str(part) for part in self._state) if self._state else "empty"
+
+    def diff(self, source_id: str, chunk_ids: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        Compares the current chunks of a source with the indexed ones.
+
+        Parameters:
+        source_id (str): The source being ingested.
+        chunk_ids (List[str]): The chunk IDs the source consists of now.
+
+        Returns:
+        Tuple[List[str], List[str]]: The IDs that are not indexed yet, and the indexed IDs
+        that no longer belong to the source.
+        """
+        with self._lock:
+            self._refresh()
+            indexed = set(self.sources.get(source_id, []))
+        current = set(chunk_ids)
+        new_ids = [cid for cid in dict.fromkeys(chunk_ids) if cid not in indexed]
+        stale_ids = sorted(indexed - current)
+        return new_ids, stale_ids
+
+    def indexed(self, source_id: str) -> Set[str]:
+        """Return the chunk IDs a source has in the index."""
+        with self._lock:
+            self._refresh()
+            return set(self.sources.get(source_id, []))
+
+    def fingerprint(self, source_id: str) -> Optional[str]:
+        """Return a digest of the chunk IDs a source has in the index, None when it has none recorded."""
+        with self._lock:
+            self._refresh()
+            chunk_ids = self.sources.get(source_id)
+        if chunk_ids is None:
+            return None
+        return hashlib.sha256("\n".join(chunk_ids).encode("utf-8")).hexdigest()
+
+    def contains(self, chunk_id: str) -> bool:
+        """Return whether any source currently has the given chunk ID in the index."""
+        with self._lock:
+            self._refresh()
+            return any(chunk_id in ids for ids in self.sources.values())
+
+    def record(self, source_id: str, chunk_ids: List[str]):
+        """
+        Stores the chunk IDs of a source and persists the manifest.
+
+        Parameters:
+        source_id (str): The source that was ingested.
+        chunk_ids (List[str]): The chunk IDs now in the index for that source.
+        """
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        with self._lock, file_lock(self.path):
+            self._refresh()
+            if self.sources.get(source_id) == chunk_ids:
+                return
+            self.sources[source_id] = chunk_ids
+            self.version += 1
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file_obj:
+            json.dump(self.sources, file_obj)
+            file_obj.flush()
+            state = file_state(file_obj)
+        os.replace(tmp_path, self.path)
+        self._state = state
+
+
+class BatchUpserter:
+    """
+    Builds dense and sparse vectors for text chunks in batches and writes them to a
+    Pinecone-compatible index using size-bounded requests on a small worker pool.
+
+    Embedding of the next batch overlaps with the upsert requests of the previous one,
+    and each request is retried with exponential backoff and jitter on failure.
+
+    Parameters:
+    index: The index to write to. Only upsert(vectors=...) and delete(ids=...) are required.
+    embedding_model: A LangChain embeddings object providing embed_documents.
+    sparse_encoder: An optional fitted BM25 encoder providing encode_documents.
+    text_key (str): The metadata key under which the chunk text is stored.
+    embed_batch_size (int): The number of chunks embedded per embeddings call.
+    max_vectors (int): The maximum number of records per upsert request.
+    max_bytes (int): The maximum estimated payload size per upsert request.
+    max_workers (int): The number of concurrent upsert requests.
+    max_retries (int): The number of retries per request before giving up.
+    backoff_base (float): The initial backoff delay in seconds.
+    """
+
+    def __init__(
+        self,
+        index,
+        embedding_model,
+        sparse_encoder=None,
+        text_key: str = "text",
+        embed_batch_size: int = 256,
+        max_vectors: int = MAX_VECTORS_PER_REQUEST,
+        max_bytes: int = MAX_REQUEST_BYTES,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+    ):
+        self.index = index
+        self.embedding_model = embedding_model
+        self.sparse_encoder = sparse_encoder
+        self.text_key = text_key
+        self.embed_batch_size = embed_batch_size
+        self.max_vectors = max_vectors
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+    def build_vectors(
+        self, ids: List[str], texts: List[str], metadatas: Optional[List[Dict]] = None
+    ) -> List[Dict]:
+        """
+        Embeds one batch of chunks and assembles the upsert records for it.
+
+        Parameters:
+        ids (List[str]): The vector IDs, one per chunk.
+        texts (List[str]): The chunk texts.
+        metadatas (Optional[List[Dict]]): Extra metadata per chunk.
+
+        Returns:
+        List[Dict]: Records with id, values, sparse_values and metadata keys.
+        """
+        dense = self.embedding_model.embed_documents(texts)
+        sparse = (
+            self.sparse_encoder.encode_documents(texts)
+            if self.sparse_encoder is not None
+            else [None] * len(texts)
+        )
+        metadatas = metadatas or [{} for _ in texts]
+
+        vectors = []
+        for vector_id, text, dense_values, sparse_values, metadata in zip(
+            ids, texts, dense, sparse, metadatas
+        ):
+            vector = {
+                "id": vector_id,
+                "values": [float(v) for v in dense_values],
+                "metadata": {self.text_key: text, **metadata},
+            }
+            # Pinecone rejects empty sparse vectors, so chunks without BM25 tokens are dense-only
+            if sparse_values and sparse_values["indices"]:
+                vector["sparse_values"] = {
+                    "indices": [int(i) for i in sparse_values["indices"]],
+                    "values": [float(v) for v in sparse_values["values"]],
+                }
+            vectors.append(vector)
+        return vectors
+
+    def _upsert_with_retry(self, batch: List[Dict]) -> int:
+        """Send one upsert request, retrying with jittered exponential backoff. Returns the retry count."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.index.upsert(vectors=batch)
+                return attempt
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise CustomException(e, sys)
+                delay = self.backoff_base * (2**attempt)
+                delay = random.uniform(delay / 2, delay)
+                logging.warning(
+                    f"Upsert of {len(batch)} vectors failed ({e}), retrying in {delay:.2f}s"
+                )
+                time.sleep(delay)
+
+    def upsert(
+        self, ids: List[str], texts: List[str], metadatas: Optional[List[Dict]] = None
+    ) -> UpsertReport:
+        """
+        Embeds and upserts all chunks, returning throughput statistics.
+
+        Parameters:
+        ids (List[str]): The vector IDs, one per chunk.
+        texts (List[str]): The chunk texts.
+        metadatas (Optional[List[Dict]]): Extra metadata per chunk.
+
+        Returns:
+        UpsertReport: The number of chunks, requests, retries and the elapsed time.
+        """
+        report = UpsertReport()
+        started = time.perf_counter()
+        metadatas = metadatas or [{} for _ in texts]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = []
+            for start in range(0, len(texts), self.embed_batch_size):
+                end = start + self.embed_batch_size
+                self._submit_batch(executor, futures, report, ids[start:end], texts[start:end], metadatas[start:end])
+
+            for future in futures:
+                report.retries += future.result()
+
+        report.seconds = time.perf_counter() - started
+        logging.info(
+            f"Upserted {report.chunks} chunks in {report.requests} requests "
+            f"({report.chunks_per_second:.1f} chunks/s, {report.retries} retries)"
+        )
+        return report
+
+    def _submit_batch(self, executor, futures: List, report: UpsertReport, ids, texts, metadatas):
+        """Embeds one batch of chunks and queues its upsert requests on the executor."""
+        vectors = self.build_vectors(ids, texts, metadatas)
+        for batch in size_bounded_batches(vectors, self.max_vectors, self.max_bytes):
+            futures.append(executor.submit(self._upsert_with_retry, batch))
+            report.requests += 1
+        report.chunks += len(vectors)
+
+    def _rollback_on_error(self, incremental: bool):
+        """Reverts the BM25 statistics changed inside the block if the block raises, when the encoder supports it."""
+        if incremental and hasattr(self.sparse_encoder, "rollback_on_error"):
+            return self.sparse_encoder.rollback_on_error()
+        return nullcontext()
+
+    def fetch_texts(self, ids: List[str]) -> List[str]:
+        """
+        Reads the chunk texts of indexed vectors back from their metadata.
+
+        Parameters:
+        ids (List[str]): The vector IDs to fetch.
+
+        Returns:
+        List[str]: The texts of the vectors that were found.
+        """
+        texts = []
+        for batch in batched(ids, MAX_IDS_PER_DELETE):
+            response = self.index.fetch(ids=batch)
+            vectors = response["vectors"] if isinstance(response, dict) else response.vectors
+            for vector in vectors.values():
+                metadata = vector["metadata"] if isinstance(vector, dict) else vector.metadata
+                if metadata and self.text_key in metadata:
+                    texts.append(metadata[self.text_key])
+        return texts
+
+    def sync_source(
+        self,
+        source_id: str,
+        texts: List[str],
+        manifest: IngestionManifest,
+        metadatas: Optional[List[Dict]] = None,
+    ) -> UpsertReport:
+        """
+        Brings the index in line with the current chunks of one source.
+
+        Only chunks whose content-addressed ID is not in the manifest are embedded and
+        upserted, and chunks the source no longer contains are deleted from the index.
+        When the sparse encoder supports partial_fit, its statistics are updated with the
+        added and removed chunks, rolled back if the upsert or the deletes fail, and saved
+        once the index is updated.
+
+        Parameters:
+        source_id (str): A stable identifier of the document, e.g. "pdf:report.pdf".
+        texts (List[str]): The current chunk texts of the document.
+        manifest (IngestionManifest): The record of already indexed chunks.
+        metadatas (Optional[List[Dict]]): Extra metadata per chunk.
+
+        Returns:
+        UpsertReport: The upsert statistics including skipped and deleted chunk counts.
+        """
+        started = time.perf_counter()
+        metadatas = metadatas or [{} for _ in texts]
+        ids = [chunk_id(source_id, text) for text in texts]
+        new_ids, stale_ids = manifest.diff(source_id, ids)
+
+        pending = set(new_ids)
+        new_texts, new_metadatas = [], []
+        for cid, text, metadata in zip(ids, texts, metadatas):
+            if cid in pending:
+                pending.discard(cid)
+                new_texts.append(text)
+                new_metadatas.append({"source": source_id, "chunk_id": cid, **metadata})
+
+        # Keep incremental BM25 statistics in line with the index before encoding the new chunks.
+        # They are rolled back if the index is not updated, and saved only once it is
+        incremental = hasattr(self.sparse_encoder, "partial_fit") and bool(new_texts or stale_ids)
+        with self._rollback_on_error(incremental):
+            if incremental:
+                self.sparse_encoder.remove(self.fetch_texts(stale_ids))
+                self.sparse_encoder.partial_fit(new_texts)
+            report = self.upsert(new_ids, new_texts, new_metadatas) if new_ids else UpsertReport()
+            for batch in batched(stale_ids, MAX_IDS_PER_DELETE):
+                self.index.delete(ids=batch)
+                report.deleted += len(batch)
+        manifest.record(source_id, ids)
+        if incremental:
+            self.sparse_encoder.save()
+
+        report.skipped = len(set(ids)) - len(new_ids)
+        report.seconds = time.perf_counter() - started
+        logging.info(
+            f"Synced source {source_id}: {report.chunks} new, {report.skipped} unchanged, "
+            f"{report.deleted} deleted"
+        )
+        return report
+
+    def sync_stream(
+        self, source_id: str, chunks: Iterable[Tuple[str, Dict]], manifest: IngestionManifest
+    ) -> UpsertReport:
+        """
+        Like sync_source, for chunks that are still being produced, such as the pages of a large PDF.
+
+        New chunks are embedded and upserted a batch at a time as they arrive, so embedding
+        overlaps with reading the source and only one batch of vectors is held at a time.
+        Stale chunks are deleted once the source is exhausted. With a partial_fit encoder,
+        the BM25 statistics are updated with each batch before it is encoded, rather than
+        with all new chunks up front, rolled back if the sync fails part way and saved
+        once it succeeds.
+
+        Parameters:
+        source_id (str): A stable identifier of the document, e.g. "pdf:report.pdf".
+        chunks (Iterable[Tuple[str, Dict]]): The chunk texts with their extra metadata.
+        manifest (IngestionManifest): The record of already indexed chunks.
+
+        Returns:
+        UpsertReport: The upsert statistics including skipped and deleted chunk counts.
+        """
+        started = time.perf_counter()
+        report = UpsertReport()
+        indexed = manifest.indexed(source_id)
+        incremental = hasattr(self.sparse_encoder, "partial_fit")
+        ids, seen = [], set()
+        batch_ids, batch_texts, batch_metadatas = [], [], []
+
+        def flush():
+            if incremental:
+                self.sparse_encoder.partial_fit(batch_texts)
+            self._submit_batch(executor, futures, report, batch_ids, batch_texts, batch_metadatas)
+
+        with self._rollback_on_error(incremental), ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = []
+            for text, metadata in chunks:
+                cid = chunk_id(source_id, text)
+                ids.append(cid)
+                if cid in indexed or cid in seen:
+                    continue
+                seen.add(cid)
+                batch_ids.append(cid)
+                batch_texts.append(text)
+                batch_metadatas.append({"source": source_id, "chunk_id": cid, **metadata})
+                if len(batch_ids) == self.embed_batch_size:
+                    flush()
+                    batch_ids, batch_texts, batch_metadatas = [], [], []
+            if batch_ids:
+                flush()
+            for future in futures:
+                report.retries += future.result()
+
+            stale_ids = sorted(indexed - set(ids))
+            if incremental:
+                self.sparse_encoder.remove(self.fetch_texts(stale_ids))
+            for batch in batched(stale_ids, MAX_IDS_PER_DELETE):
+                self.index.delete(ids=batch)
+                report.deleted += len(batch)
+        manifest.record(source_id, ids)
+        if incremental and (seen or stale_ids):
+            self.sparse_encoder.save()
+
+        report.skipped = len(set(ids)) - len(seen)
+        report.seconds = time.perf_counter() - started
+        logging.info(
+            f"Streamed source {source_id}: {report.chunks} new, {report.skipped} unchanged, "
+            f"{report.deleted} deleted"
+        )
+        return report
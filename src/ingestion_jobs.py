@@ -0,0 +1,167 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+
+from src.documents import pdf_chunk_stream, whatsapp_chunk_stream, youtube_chunks
+from src.ingestion import UpsertReport
+from src.logger import logging
+
+SOURCE_KINDS = ("pdf", "whatsapp", "youtube")
+
+
+def source_digest(kind: str, payload: Union[bytes, str]) -> str:
+    """SHA-256 of a source's content: the file bytes, or the video ID of a YouTube source."""
+    data = payload if isinstance(payload, bytes) else payload.encode("utf-8")
+    return hashlib.sha256(kind.encode("utf-8") + b"\x00" + data).hexdigest()
+
+
+@dataclass
+class IngestionJob:
+    """
+    Status of the ingestion of one source.
+
+    Parameters:
+    key (str): The job key, the source ID and content digest.
+    source_id (str): The source, e.g. "pdf:report.pdf".
+    kind (str): One of SOURCE_KINDS.
+    state (str): "queued", "running", "done" or "failed".
+    chunks (int): The chunks read from the source so far.
+    report (Optional[UpsertReport]): The sync statistics, once done.
+    error (Optional[str]): Why the ingestion failed.
+    submitted (float): When the job was submitted.
+    seconds (Optional[float]): Time from submission to completion.
+    indexed (Optional[str]): The manifest fingerprint of the source once done.
+    """
+
+    key: str
+    source_id: str
+    kind: str
+    state: str = "queued"
+    chunks: int = 0
+    report: Optional[UpsertReport] = None
+    error: Optional[str] = None
+    submitted: float = 0.0
+    seconds: Optional[float] = None
+    indexed: Optional[str] = None
+
+
+class IngestionJobs:
+    """
+    Ingests document sources in the background, several at a time.
+
+    Every source runs on a thread of a shared pool, where chunks are embedded and upserted
+    while the source is still being read (see DocumentIngestor.upsert_stream). YouTube
+    sources spend that time waiting on the network for their transcript, WhatsApp exports
+    are parsed line by line, and large PDFs are extracted on a process pool of their own
+    (see pdf_page_sections), so CPU-bound parsing does not hold up the other sources. The
+    CPUs are split between the sources ingested at once, so max_workers PDFs never start
+    more extraction processes than there are CPUs.
+
+    Jobs are keyed by source ID and content digest. Submitting a source that is already
+    queued, running or done returns the existing job, so reruns and other sessions never
+    ingest the same content twice. A done job is only reused while the manifest still
+    holds the chunks it indexed: once another version of the source has replaced them,
+    the job is dropped and the content ingested again. Only the most recent max_jobs
+    finished jobs are kept.
+
+    Parameters:
+    ingestor (DocumentIngestor): Syncs the chunks into the index.
+    splitter: A LangChain text splitter, see default_splitter.
+    max_workers (int): Sources ingested at once.
+    pdf_workers (Optional[int]): Extraction processes per PDF, the CPU count divided by
+    max_workers by default.
+    max_jobs (int): Finished jobs remembered.
+    """
+
+    def __init__(self, ingestor, splitter, max_workers: int = 4, pdf_workers: Optional[int] = None, max_jobs: int = 200):
+        self.ingestor = ingestor
+        self.splitter = splitter
+        self.max_workers = max_workers
+        self.pdf_workers = pdf_workers or max((os.cpu_count() or 1) // max_workers, 1)
+        self.max_jobs = max_jobs
+        self._executor = None
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, source_id: str, payload: Union[bytes, str], digest: Optional[str] = None) -> str:
+        """
+        Starts ingesting a source unless the same content is already being or was ingested.
+
+        Parameters:
+        kind (str): One of SOURCE_KINDS.
+        source_id (str): A stable identifier of the source, e.g. "pdf:report.pdf".
+        payload (Union[bytes, str]): The file content, or the video ID of a YouTube source.
+        digest (Optional[str]): The source_digest of the payload, if the caller already knows it.
+
+        Returns:
+        str: The job key to poll with status.
+        """
+        if kind not in SOURCE_KINDS:
+            raise ValueError(f"Unknown source kind {kind!r}, expected one of {SOURCE_KINDS}")
+        key = f"{source_id}:{digest or source_digest(kind, payload)}"
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.state != "failed":
+                if job.state != "done" or job.indexed == self.ingestor.manifest.fingerprint(source_id):
+                    return key
+                logging.info(f"{source_id} was replaced since {key} was ingested, ingesting it again")
+            self._jobs.pop(key, None)  # A retried job moves to the end of the submission order
+            job = self._jobs[key] = IngestionJob(key, source_id, kind, submitted=time.time())
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ingestion")
+            self._executor.submit(self._run, job, payload)
+        logging.info(f"Queued ingestion of {source_id}")
+        return key
+
+    def _chunks(self, kind: str, payload: Union[bytes, str]) -> Iterable[Tuple[str, Dict]]:
+        if kind == "pdf":
+            return pdf_chunk_stream(payload, self.splitter, self.pdf_workers)
+        if kind == "whatsapp":
+            return whatsapp_chunk_stream(io.TextIOWrapper(io.BytesIO(payload), encoding="utf-8-sig"), self.splitter)
+        return ((chunk, {}) for chunk in youtube_chunks(payload, self.splitter))
+
+    def _counted(self, job: IngestionJob, chunks: Iterable[Tuple[str, Dict]]) -> Iterator[Tuple[str, Dict]]:
+        for chunk in chunks:
+            job.chunks += 1
+            yield chunk
+
+    def _run(self, job: IngestionJob, payload: Union[bytes, str]):
+        job.state = "running"
+        try:
+            report = self.ingestor.upsert_stream(self._counted(job, self._chunks(job.kind, payload)), job.source_id)
+        except Exception as e:
+            logging.error(f"Ingestion of {job.source_id} failed: {e}")
+            job.error = str(e) or type(e).__name__
+            job.seconds = time.time() - job.submitted
+            job.state = "failed"
+        else:
+            # The state is set last, so a job polled as done always has its report
+            job.report = report
+            job.indexed = self.ingestor.manifest.fingerprint(job.source_id)
+            job.seconds = time.time() - job.submitted
+            job.state = "done"
+        self._prune()
+
+    def status(self, key: str) -> Optional[IngestionJob]:
+        """A snapshot of a job, None when it is unknown or no longer remembered."""
+        with self._lock:
+            job = self._jobs.get(key)
+            return replace(job) if job is not None else None
+
+    def _prune(self):
+        with self._lock:
+            finished = [key for key, job in self._jobs.items() if job.state in ("done", "failed")]
+            # Jobs are kept in submission order, so the oldest finished ones go first
+            for key in finished[: max(len(finished) - self.max_jobs, 0)]:
+                del self._jobs[key]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,533 @@
+import glob
+import json
+import os
+import tempfile
+import threading
+from array import array
+from itertools import chain
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.ann_index import IVFIndex
+from src.file_lock import file_lock, file_state
+from src.logger import logging
+
+
+class LocalHybridIndex:
+    """
+    In-process hybrid dense + sparse index with the subset of the Pinecone Index API used
+    by this project (upsert, query, fetch, delete, describe_index_stats).
+
+    Dense scores are a single matrix-vector product over a float32 matrix and sparse scores
+    are accumulated from an inverted index of BM25 postings. Like a Pinecone dotproduct
+    index, the score of a record is the sum of both, so the alpha weighting applied by
+    PineconeHybridSearchRetriever through hybrid_convex_scale carries over unchanged and
+    the retriever works with this index as a drop-in.
+
+    Deleted or overwritten records are tombstoned and dropped when the index is saved.
+    Saved indexes are opened with the dense matrix memory-mapped, and it is only copied
+    into memory once records are added. Between saves, flush persists only the records
+    added and deleted since the last flush, as a segment file next to the saved index, so
+    its cost does not grow with the index. Segments are replayed on load, and folded into
+    the saved index once they hold as many records as it does, or max_segments of them
+    have been written.
+
+    Several processes, such as the Streamlit app and the headless CLI, can write the same
+    index. Flushes and saves take a file lock on the index directory and first apply what
+    the other processes flushed or saved, and queries pick up their changes as well, so no
+    process overwrites another's records.
+
+    With an approximate nearest-neighbour index attached, dense scores are only computed
+    for its candidates plus the best sparse matches instead of for every row. It is
+    trained once enough records have been upserted and updated on every later upsert.
+
+    Parameters:
+    path (str): The directory the index is persisted to. Existing data is loaded.
+    dimension (int): The dense vector dimension.
+    ann (IVFIndex): An optional, untrained or previously saved ANN index for the dense part.
+    max_segments (int): The most segments written before flush saves the whole index.
+    """
+
+    def __init__(self, path: str = None, dimension: int = 1536, ann: IVFIndex = None, max_segments: int = 64):
+        self.path = path
+        self.dimension = dimension
+        self.ann = ann
+        self.max_segments = max_segments
+        self._lock = threading.RLock()
+        self._reset()
+        if path:
+            with file_lock(path):
+                if os.path.exists(os.path.join(path, "index.json")):
+                    self._load()
+
+    def _reset(self):
+        self._dense = np.zeros((0, self.dimension), dtype=np.float32)
+        self._size = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids: List[str] = []
+        self._metadata: List[dict] = []
+        self._rows: Dict[str, int] = {}
+        self._postings: Dict[int, tuple] = {}
+        # Persistence state: the saved index generation and file version, its segments,
+        # and the changes of this process not flushed yet (new rows with their sparse values)
+        self._generation = 0
+        self._state = None
+        self._base_rows = 0
+        self._segments = 0
+        self._segment_rows = 0
+        self._unflushed: Dict[int, Optional[dict]] = {}
+        self._deleted = set()
+        self._cleared = False
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _reserve(self, extra: int):
+        """Grow the dense matrix geometrically so appends are amortized O(1)."""
+        needed = self._size + extra
+        if needed <= self._dense.shape[0] and not isinstance(self._dense, np.memmap):
+            return
+        capacity = max(needed, 2 * self._dense.shape[0], 1024)
+        dense = np.zeros((capacity, self.dimension), dtype=np.float32)
+        dense[: self._size] = self._dense[: self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: self._size] = self._alive[: self._size]
+        self._dense, self._alive = dense, alive
+
+    def upsert(self, vectors: List, namespace: Optional[str] = None, **kwargs):
+        """
+        Inserts or overwrites records.
+
+        Parameters:
+        vectors (List): Dicts with id, values, and optional sparse_values and metadata keys,
+        or (id, values, metadata) tuples.
+        """
+        records = []
+        for vector in vectors:
+            if isinstance(vector, tuple):
+                vector = {"id": vector[0], "values": vector[1], "metadata": vector[2] if len(vector) > 2 else None}
+            records.append(vector)
+
+        with self._lock:
+            self._reserve(len(records))
+            first_row = self._size
+            for record in records:
+                old_row = self._rows.get(record["id"])
+                if old_row is not None:
+                    self._alive[old_row] = False
+                row = self._size
+                self._size += 1
+                self._dense[row] = record["values"]
+                self._alive[row] = True
+                self._ids.append(record["id"])
+                self._metadata.append(record.get("metadata") or {})
+                self._rows[record["id"]] = row
+                self._deleted.discard(record["id"])
+
+                sparse = record.get("sparse_values")
+                if self.path:
+                    self._unflushed[row] = sparse
+                if sparse:
+                    for idx, value in zip(sparse["indices"], sparse["values"]):
+                        rows, values = self._postings.setdefault(int(idx), (array("q"), array("f")))
+                        rows.append(row)
+                        values.append(value)
+            self._update_ann(np.arange(first_row, self._size))
+        return {"upserted_count": len(records)}
+
+    def _update_ann(self, rows: np.ndarray):
+        """Add new rows to the ANN index, training it first once enough records exist."""
+        if self.ann is None:
+            return
+        if self.ann.is_trained:
+            self.ann.add(rows, self._dense[rows])
+        elif len(self._rows) >= self.ann.min_train_size:
+            alive = np.flatnonzero(self._alive[: self._size])
+            self.ann.train(self._dense[alive])
+            self.ann.add(alive, self._dense[alive])
+
+    def delete(self, ids: List[str] = None, delete_all: bool = False, namespace: Optional[str] = None, **kwargs):
+        """Tombstone the given records, or all records when delete_all is set."""
+        with self._lock:
+            if delete_all:
+                self._alive[:] = False
+                self._rows.clear()
+                self._unflushed.clear()
+                self._cleared = bool(self.path)
+                self._deleted.clear()
+                return {}
+            for vector_id in ids or []:
+                row = self._rows.pop(vector_id, None)
+                if row is not None:
+                    self._alive[row] = False
+                    if self.path:
+                        self._deleted.add(vector_id)
+        return {}
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None, **kwargs) -> Dict:
+        """Return the stored values and metadata of the given records."""
+        self._refresh()
+        with self._lock:
+            vectors = {}
+            for vector_id in ids:
+                row = self._rows.get(vector_id)
+                if row is not None:
+                    vectors[vector_id] = {
+                        "id": vector_id,
+                        "values": self._dense[row].tolist(),
+                        "metadata": dict(self._metadata[row]),
+                    }
+        return {"vectors": vectors, "namespace": namespace or ""}
+
+    def describe_index_stats(self, **kwargs) -> Dict:
+        return {"dimension": self.dimension, "total_vector_count": len(self._rows)}
+
+    def _sparse_scores(self, sparse_vector: Dict, size: int) -> np.ndarray:
+        scores = np.zeros(size, dtype=np.float32)
+        if sparse_vector:
+            for idx, weight in zip(sparse_vector["indices"], sparse_vector["values"]):
+                posting = self._postings.get(int(idx))
+                if posting is None:
+                    continue
+                rows = np.frombuffer(posting[0], dtype=np.int64)
+                values = np.frombuffer(posting[1], dtype=np.float32)
+                # A token occurs at most once per record, so the rows of a posting are unique
+                scores[rows] += weight * values
+        return scores
+
+    def scores(self, vector: List[float] = None, sparse_vector: Dict = None, top_k: int = None) -> np.ndarray:
+        """
+        Computes the hybrid dot-product score of every row.
+
+        Parameters:
+        vector (List[float]): The (alpha-scaled) dense query vector.
+        sparse_vector (Dict): The (alpha-scaled) sparse query vector with indices and values.
+        top_k (int): When given and a trained ANN index is attached, only its candidates and
+        the best sparse matches are scored, and every other row gets -inf.
+
+        Returns:
+        np.ndarray: One score per row, -inf for deleted rows.
+        """
+        size = self._size
+        scores = self._sparse_scores(sparse_vector, size)
+        if vector is not None:
+            query = np.asarray(vector, dtype=np.float32)
+            if top_k and self.ann is not None and self.ann.is_trained:
+                candidates = [self.ann.search(query, top_k)]
+                if sparse_vector and size:
+                    shortlist = min(self.ann.rerank_factor * top_k, size)
+                    candidates.append(np.argpartition(-scores, shortlist - 1)[:shortlist])
+                candidates = np.unique(np.concatenate(candidates))
+                hybrid = np.full(size, -np.inf, dtype=np.float32)
+                hybrid[candidates] = self._dense[candidates] @ query + scores[candidates]
+                scores = hybrid
+            else:
+                scores += self._dense[:size] @ query
+        scores[~self._alive[:size]] = -np.inf
+        return scores
+
+    def query(
+        self,
+        vector: List[float] = None,
+        sparse_vector: Dict = None,
+        top_k: int = 10,
+        include_metadata: bool = False,
+        include_values: bool = False,
+        namespace: Optional[str] = None,
+        **kwargs,
+    ) -> Dict:
+        """
+        Returns the top_k records by hybrid score in the same shape as a Pinecone query.
+
+        Parameters:
+        vector (List[float]): The dense query vector.
+        sparse_vector (Dict): The sparse query vector.
+        top_k (int): The number of matches to return.
+        include_metadata (bool): Whether to include a copy of each match's metadata.
+        include_values (bool): Whether to include each match's dense values.
+
+        Returns:
+        Dict: {"matches": [{"id", "score", "metadata"?, "values"?}, ...]}
+        """
+        self._refresh()
+        with self._lock:
+            scores = self.scores(vector, sparse_vector, top_k)
+            return self._matches(scores, top_k, include_metadata, include_values)
+
+    def _matches(self, scores: np.ndarray, top_k: int, include_metadata: bool, include_values: bool) -> Dict:
+        k = min(top_k, len(self._rows))
+        if k == 0:
+            return {"matches": [], "namespace": ""}
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        # Rows outside the ANN candidates and deleted rows score -inf and are no matches,
+        # even when fewer than top_k rows scored
+        top = top[np.isfinite(scores[top])]
+        matches = []
+        for row in top:
+            match = {"id": self._ids[row], "score": float(scores[row])}
+            if include_metadata:
+                match["metadata"] = dict(self._metadata[row])
+            if include_values:
+                match["values"] = self._dense[row].tolist()
+            matches.append(match)
+        return {"matches": matches, "namespace": ""}
+
+    def flush(self):
+        """
+        Persists the records added and deleted since the last flush or save.
+
+        They are written as one segment file, with the dense rows, the sparse values per
+        record, and the IDs, metadata and deleted IDs as JSON. The whole index is saved
+        instead when nothing was saved yet, or when the segments would outgrow the saved
+        index or reach max_segments, so replaying them on load stays cheap.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            if not (self._unflushed or self._deleted or self._cleared):
+                return
+            os.makedirs(self.path, exist_ok=True)
+            with file_lock(self.path):
+                self._refresh_locked()
+                self._flush()
+
+    def _flush(self):
+        rows = np.array(sorted(row for row in self._unflushed if self._alive[row]), dtype=np.int64)
+        changes = len(rows) + len(self._deleted)
+        if not (changes or self._cleared):
+            self._mark_flushed()
+            return
+        if (
+            self._state is None
+            or self._cleared
+            or self._segment_rows + changes > self._base_rows
+            or self._segments >= self.max_segments
+        ):
+            self._save()
+            return
+        sparse = [self._unflushed.get(int(row)) or {"indices": [], "values": []} for row in rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(values["indices"]) for values in sparse], out=offsets[1:])
+        header = json.dumps(
+            {
+                "ids": [self._ids[row] for row in rows],
+                "metadata": [self._metadata[row] for row in rows],
+                "deleted": sorted(self._deleted),
+            }
+        ).encode("utf-8")
+        count = int(offsets[-1])
+        arrays = {
+            "dense": np.ascontiguousarray(self._dense[rows], dtype=np.float32),
+            "offsets": offsets,
+            "indices": np.fromiter(chain.from_iterable(v["indices"] for v in sparse), np.uint32, count),
+            "values": np.fromiter(chain.from_iterable(v["values"] for v in sparse), np.float32, count),
+            "header": np.frombuffer(header, dtype=np.uint8),
+        }
+        self._write(self._segment_name(self._segments), lambda f: np.savez(f, **arrays))
+        self._segments += 1
+        self._segment_rows += changes
+        self._mark_flushed()
+        logging.info(f"Flushed {len(rows)} records and {changes - len(rows)} deletions to {self.path}")
+
+    def _segment_name(self, number: int) -> str:
+        return f"segment-{self._generation}-{number:06d}.npz"
+
+    def _mark_flushed(self):
+        self._unflushed.clear()
+        self._deleted.clear()
+        self._cleared = False
+
+    def save(self):
+        """
+        Compacts away deleted rows and persists the whole index to self.path.
+
+        The dense matrix is written as an .npy file that is memory-mapped on load, the
+        postings as CSR-style arrays, and the IDs and metadata as JSON. Each file is
+        written to a temporary name and renamed into place. The segments written by flush
+        since the last save are then deleted.
+        """
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with file_lock(self.path):
+                self._refresh_locked()
+                self._save()
+
+    def _save(self):
+        with self._lock:
+            self._compact()
+            size = self._size
+            tokens = np.fromiter(sorted(self._postings), dtype=np.uint32, count=len(self._postings))
+            lengths = [len(self._postings[int(token)][0]) for token in tokens]
+            offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            rows = np.empty(offsets[-1], dtype=np.int64)
+            values = np.empty(offsets[-1], dtype=np.float32)
+            for i, token in enumerate(tokens):
+                posting = self._postings[int(token)]
+                rows[offsets[i] : offsets[i + 1]] = posting[0]
+                values[offsets[i] : offsets[i + 1]] = posting[1]
+
+            self._write(
+                "dense.npy", lambda f: np.save(f, np.ascontiguousarray(self._dense[:size]))
+            )
+            self._write(
+                "sparse.npz", lambda f: np.savez(f, tokens=tokens, offsets=offsets, rows=rows, values=values)
+            )
+            if self.ann is not None and self.ann.is_trained:
+                self.ann.save(os.path.join(self.path, "ann.npz"))
+            # index.json is written last and names the new generation, so the segments of
+            # the previous one are never replayed on top of the saved index
+            generation = self._generation + 1
+            state = {"dimension": self.dimension, "generation": generation, "ids": self._ids, "metadata": self._metadata}
+            self._write("index.json", lambda f: f.write(json.dumps(state).encode("utf-8")))
+            self._state = file_state(os.path.join(self.path, "index.json"))
+            self._generation, self._base_rows = generation, size
+            self._segments, self._segment_rows = 0, 0
+            self._mark_flushed()
+            for path in glob.glob(os.path.join(self.path, "segment-*.npz")):
+                if not os.path.basename(path).startswith(f"segment-{generation}-"):
+                    os.remove(path)
+        logging.info(f"Saved local hybrid index with {size} records to {self.path}")
+
+    def _write(self, name: str, writer):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file_obj:
+            writer(file_obj)
+        os.replace(tmp_path, os.path.join(self.path, name))
+
+    def _compact(self):
+        """Drop tombstoned rows and renumber the postings."""
+        alive = self._alive[: self._size]
+        if alive.all():
+            return
+        keep = np.flatnonzero(alive)
+        remap = np.full(self._size, -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+        self._dense = np.ascontiguousarray(self._dense[keep])
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._ids = [self._ids[row] for row in keep]
+        self._metadata = [self._metadata[row] for row in keep]
+        self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        self._size = len(keep)
+        if self.ann is not None and self.ann.is_trained:
+            self.ann.remap(remap)
+
+        postings = {}
+        for token, (rows, values) in self._postings.items():
+            new_rows = remap[np.frombuffer(rows, dtype=np.int64)]
+            mask = new_rows >= 0
+            if mask.any():
+                postings[token] = (
+                    array("q", new_rows[mask].tolist()),
+                    array("f", np.frombuffer(values, dtype=np.float32)[mask].tolist()),
+                )
+        self._postings = postings
+
+    def _load(self):
+        with open(os.path.join(self.path, "index.json"), encoding="utf-8") as file_obj:
+            state = json.load(file_obj)
+        self.dimension = state["dimension"]
+        self._ids = state["ids"]
+        self._metadata = state["metadata"]
+        self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        # An empty file cannot be memory-mapped
+        mmap_mode = "r" if self._ids else None
+        self._dense = np.load(os.path.join(self.path, "dense.npy"), mmap_mode=mmap_mode)
+        self._size = self._dense.shape[0]
+        self._alive = np.ones(self._size, dtype=bool)
+
+        sparse = np.load(os.path.join(self.path, "sparse.npz"))
+        offsets = sparse["offsets"]
+        rows, values = sparse["rows"], sparse["values"]
+        for i, token in enumerate(sparse["tokens"].tolist()):
+            start, end = offsets[i], offsets[i + 1]
+            self._postings[token] = (array("q", rows[start:end].tolist()), array("f", values[start:end].tolist()))
+
+        ann_path = os.path.join(self.path, "ann.npz")
+        if self.ann is not None and os.path.exists(ann_path):
+            self.ann.load(ann_path)
+
+        self._generation = state.get("generation", 0)
+        self._state = file_state(os.path.join(self.path, "index.json"))
+        self._base_rows = self._size
+        self._apply_segments()
+        logging.info(
+            f"Loaded local hybrid index with {len(self._rows)} records and {self._segments} segments from {self.path}"
+        )
+
+    def _refresh(self):
+        """Applies what other processes flushed or saved, once the files on disk show a change."""
+        if not self.path:
+            return
+        if file_state(os.path.join(self.path, "index.json")) == self._state and not os.path.exists(
+            os.path.join(self.path, self._segment_name(self._segments))
+        ):
+            return
+        with self._lock, file_lock(self.path):
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        """Like _refresh, for callers holding the file lock."""
+        state = file_state(os.path.join(self.path, "index.json"))
+        if state is None:
+            return
+        if state == self._state:
+            self._apply_segments()
+            return
+        # Another process saved the whole index, so it is loaded again and the changes of
+        # this process not flushed yet are applied on top
+        pending = [
+            {
+                "id": self._ids[row],
+                "values": np.array(self._dense[row]),
+                "sparse_values": sparse,
+                "metadata": self._metadata[row],
+            }
+            for row, sparse in self._unflushed.items()
+            if self._alive[row]
+        ]
+        deleted, cleared = list(self._deleted), self._cleared
+        self._reset()
+        if self.ann is not None:
+            self.ann.reset()
+        self._load()
+        if cleared:
+            self.delete(delete_all=True)
+        self.delete(ids=deleted)
+        self.upsert(pending)
+
+    def _apply_segments(self):
+        """Replays the segments of the current generation this process has not applied yet."""
+        while os.path.exists(os.path.join(self.path, self._segment_name(self._segments))):
+            self._segment_rows += self._apply_segment(os.path.join(self.path, self._segment_name(self._segments)))
+            self._segments += 1
+
+    def _apply_segment(self, path: str) -> int:
+        """Replays the deletions and records of a segment written by flush, returning their number."""
+        with np.load(path) as segment:
+            header = json.loads(segment["header"].tobytes().decode("utf-8"))
+            dense, offsets = segment["dense"], segment["offsets"]
+            indices, values = segment["indices"], segment["values"]
+        # The replayed changes are already persisted, so they are not tracked as changes of this process
+        deleted, first_row = set(self._deleted), self._size
+        self.delete(ids=header["deleted"])
+        self.upsert(
+            [
+                {
+                    "id": vector_id,
+                    "values": dense[i],
+                    "sparse_values": {
+                        "indices": indices[offsets[i] : offsets[i + 1]],
+                        "values": values[offsets[i] : offsets[i + 1]],
+                    },
+                    "metadata": metadata,
+                }
+                for i, (vector_id, metadata) in enumerate(zip(header["ids"], header["metadata"]))
+            ]
+        )
+        self._deleted = deleted
+        for row in range(first_row, self._size):
+            self._unflushed.pop(row, None)
+        return len(header["ids"]) + len(header["deleted"])
@@ -0,0 +1,195 @@
+import datetime
+import os
+import threading
+from io import BytesIO
+from typing import Dict, Iterator, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.logger import logging
+
+
+def _column_names(header: tuple) -> List[str]:
+    """Header cells as column names, with pandas' naming of blank and repeated headers."""
+    names, seen = [], {}
+    for position, cell in enumerate(header):
+        name = f"Unnamed: {position}" if cell is None or str(cell).strip() == "" else str(cell)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _infer_type(values: list) -> pa.DataType:
+    """The Arrow type of a column from its first chunk: numbers become float64, so later chunks can hold decimals."""
+    kinds = {type(value) for value in values if value is not None}
+    if not kinds:
+        return pa.string()
+    if kinds == {bool}:
+        return pa.bool_()
+    if all(issubclass(kind, (int, float)) and kind is not bool for kind in kinds):
+        return pa.float64()
+    if all(issubclass(kind, (datetime.datetime, datetime.date)) for kind in kinds):
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def _convert(values: list, data_type: pa.DataType) -> (pa.Array, int):
+    """Converts a column of cell values to its Arrow type. Returns the array and the count of cells that did not fit."""
+    if pa.types.is_string(data_type):
+        return pa.array([None if value is None else str(value) for value in values], type=data_type), 0
+    if pa.types.is_floating(data_type):
+        converted = [value if isinstance(value, (int, float)) and not isinstance(value, bool) else None for value in values]
+    elif pa.types.is_timestamp(data_type):
+        converted = [value if isinstance(value, (datetime.datetime, datetime.date)) else None for value in values]
+    else:
+        converted = [value if isinstance(value, bool) else None for value in values]
+    dropped = sum(1 for value, kept in zip(values, converted) if value is not None and kept is None)
+    return pa.array(converted, type=data_type), dropped
+
+
+def excel_sheet_to_parquet(source: Union[str, bytes], sheet_name: str, path: str, chunk_rows: int = 10_000) -> int:
+    """
+    Streams one worksheet into a Parquet file without loading the sheet into memory.
+
+    Rows are read with openpyxl in read-only mode and written in row groups of chunk_rows,
+    so memory is bounded by the chunk size. Column types are inferred from the first
+    chunk. Cells in later chunks that do not fit their column type (such as text in a
+    numeric column) are written as missing and counted in the log.
+
+    Parameters:
+    source (Union[str, bytes]): The workbook file path or content.
+    sheet_name (str): The worksheet.
+    path (str): The Parquet file to write.
+    chunk_rows (int): Rows held in memory at a time.
+
+    Returns:
+    int: The number of data rows written.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(BytesIO(source) if isinstance(source, bytes) else source, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        names = _column_names(next(rows, ()))
+        width = len(names)
+        schema, writer, written, dropped = None, None, 0, 0
+        # Unique per thread as well, since sessions of one process may convert the same sheet at once
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+        try:
+            # Cells are collected per column rather than per row, so a chunk is held in memory only once
+            columns, count = [[] for _ in names], 0
+            for row in rows:
+                row = row[:width] + (None,) * (width - len(row))
+                for column, value in zip(columns, row):
+                    column.append(value)
+                count += 1
+                if count == chunk_rows:
+                    schema, writer, chunk_dropped = _write_chunk(columns, names, schema, writer, partial)
+                    written, dropped, columns, count = written + count, dropped + chunk_dropped, [[] for _ in names], 0
+            if count or writer is None:
+                schema, writer, chunk_dropped = _write_chunk(columns, names, schema, writer, partial)
+                written, dropped = written + count, dropped + chunk_dropped
+        finally:
+            if writer is not None:
+                writer.close()
+        os.replace(partial, path)
+    finally:
+        workbook.close()
+    if dropped:
+        logging.warning(f"{dropped} cells of sheet '{sheet_name}' did not match their column type and were left empty")
+    logging.info(f"Streamed {written} rows of sheet '{sheet_name}' to {path}")
+    return written
+
+
+def _write_chunk(columns: List[list], names: List[str], schema: Optional[pa.Schema], writer, path: str):
+    if schema is None:
+        schema = pa.schema([(name, _infer_type(values)) for name, values in zip(names, columns)])
+        writer = pq.ParquetWriter(path, schema)
+    arrays, dropped = [], 0
+    for position, column in enumerate(schema):
+        array, column_dropped = _convert(columns[position], column.type)
+        columns[position] = None  # Release the cell values once converted
+        arrays.append(array)
+        dropped += column_dropped
+    writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+    return schema, writer, dropped
+
+
+def csv_to_parquet(source: Union[str, bytes], path: str, block_bytes: int = 16 << 20) -> int:
+    """
+    Streams a CSV file into a Parquet file block by block with pyarrow's CSV reader.
+
+    Column types are inferred from the first block. Returns the number of rows written.
+    """
+    from pyarrow import csv
+
+    reader = csv.open_csv(
+        pa.BufferReader(source) if isinstance(source, bytes) else source,
+        read_options=csv.ReadOptions(block_size=block_bytes),
+    )
+    partial = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+    written = 0
+    with pq.ParquetWriter(partial, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+            written += batch.num_rows
+    os.replace(partial, path)
+    logging.info(f"Streamed {written} CSV rows to {path}")
+    return written
+
+
+def excel_row_counts(source: Union[str, bytes]) -> Dict[str, Optional[int]]:
+    """
+    Data rows per worksheet as recorded in the sheet dimensions, without reading the rows.
+    None where the file does not record them.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(BytesIO(source) if isinstance(source, bytes) else source, read_only=True)
+    try:
+        return {
+            str(sheet.title): (sheet.max_row - 1 if sheet.max_row else None) for sheet in workbook.worksheets
+        }
+    finally:
+        workbook.close()
+
+
+class ParquetSheet:
+    """
+    A sheet stored as Parquet and read in chunks, for sheets too large to hold in memory.
+
+    The file is memory-mapped, and each chunk is converted to pandas only when it is used,
+    so memory stays bounded by batch_rows whatever the sheet size.
+
+    Parameters:
+    path (str): The Parquet file, see excel_sheet_to_parquet and csv_to_parquet.
+    batch_rows (int): Rows per chunk.
+    """
+
+    def __init__(self, path: str, batch_rows: int = 100_000):
+        self.path = path
+        self.batch_rows = batch_rows
+        metadata = pq.ParquetFile(path, memory_map=True).metadata
+        self.rows = metadata.num_rows
+        self.columns = metadata.schema.to_arrow_schema().names
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        """The first rows, read from the first row group only."""
+        batches = pq.ParquetFile(self.path, memory_map=True).iter_batches(batch_size=n)
+        batch = next(batches, None)
+        return batch.to_pandas() if batch is not None else pd.DataFrame(columns=self.columns)
+
+    def chunks(self, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """The sheet as consecutive DataFrames of at most batch_rows rows, optionally only some columns."""
+        parquet_file = pq.ParquetFile(self.path, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=self.batch_rows, columns=columns):
+            yield batch.to_pandas()
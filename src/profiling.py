@@ -0,0 +1,525 @@
+import html
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.logger import logging
+from src.parquet_sheets import ParquetSheet
+
+PROFILE_MODES = ("auto", "full", "minimal")
+
+
+@dataclass
+class ProfileConfig:
+    """
+    How a sheet is profiled.
+
+    Parameters:
+    mode (str): "full" for the complete ydata-profiling report, "minimal" for the chunked
+        summary of column statistics, correlations and histograms, or "auto" to choose by size.
+    sample_rows (Optional[int]): Profile a sample of this many rows in full mode.
+    stratify_by (Optional[str]): Column whose groups keep their share of rows in the sample.
+    chunk_rows (int): Rows processed at a time by the minimal engine.
+    workers (int): Threads running the chunk passes.
+    bins (int): Histogram bins per numeric column.
+    full_max_cells (int): The largest rows x columns that auto mode profiles in full.
+    max_distinct (int): Distinct values counted per text column. Beyond it counting stops,
+        and the most frequent values shown are those of the rows counted until then.
+    seed (int): Seed of the sample.
+    """
+
+    mode: str = "auto"
+    sample_rows: Optional[int] = None
+    stratify_by: Optional[str] = None
+    chunk_rows: int = 100_000
+    workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    bins: int = 20
+    full_max_cells: int = 2_000_000
+    max_distinct: int = 10_000
+    seed: int = 0
+
+    def key(self) -> str:
+        """The settings that change the report, e.g. to key a cache of reports."""
+        return (
+            f"{self.mode}|{self.sample_rows}|{self.stratify_by}|{self.bins}|"
+            f"{self.full_max_cells}|{self.max_distinct}|{self.seed}"
+        )
+
+
+@dataclass
+class SamplingSummary:
+    """
+    A sample and the precision of the column means estimated from it.
+
+    Parameters:
+    population_rows (int): Rows in the sheet.
+    sample_rows (int): Rows in the sample.
+    stratify_by (Optional[str]): The stratification column.
+    strata (int): The number of strata.
+    errors (pd.DataFrame): Per numeric column the estimated mean, its standard error and
+        the 95% margin of error, absolute and relative to the estimate.
+    """
+
+    population_rows: int
+    sample_rows: int
+    stratify_by: Optional[str]
+    strata: int
+    errors: pd.DataFrame
+
+
+@dataclass
+class ProfileResult:
+    """
+    The summary computed by the minimal engine.
+
+    Parameters:
+    rows (int): Rows profiled.
+    columns (pd.DataFrame): One row of statistics per column.
+    correlations (pd.DataFrame): Pairwise Pearson correlations of the numeric columns.
+    histograms (Dict[str, Tuple[np.ndarray, np.ndarray]]): Counts and bin edges per numeric column.
+    top_values (Dict[str, List[Tuple[str, int]]]): The most frequent values per text column.
+    seconds (float): Time taken.
+    """
+
+    rows: int
+    columns: pd.DataFrame
+    correlations: pd.DataFrame
+    histograms: Dict[str, Tuple[np.ndarray, np.ndarray]]
+    top_values: Dict[str, List[Tuple[str, int]]]
+    seconds: float = 0.0
+
+
+def resolve_mode(rows: int, columns: int, config: ProfileConfig) -> str:
+    """Pick full or minimal mode. Auto profiles in full when the sheet, or its sample, is small enough."""
+    if config.mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode '{config.mode}', expected one of {PROFILE_MODES}")
+    if config.mode != "auto":
+        return config.mode
+    profiled_rows = min(rows, config.sample_rows) if config.sample_rows else rows
+    return "full" if profiled_rows * columns <= config.full_max_cells else "minimal"
+
+
+def frame_chunks(df: pd.DataFrame, chunk_rows: int) -> Callable[[], Iterator[pd.DataFrame]]:
+    """Chunks of an in-memory DataFrame for profile_chunks. The slices are views, not copies."""
+
+    def chunks():
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start : start + chunk_rows]
+
+    return chunks
+
+
+def stratified_sample(
+    df: pd.DataFrame, sample_rows: int, stratify_by: Optional[str] = None, seed: int = 0
+) -> Tuple[pd.DataFrame, SamplingSummary]:
+    """
+    Draws a sample with proportional allocation across the groups of a column.
+
+    Every stratum gets its share of the sample rows (at least one), so small groups such
+    as rare account types still appear. The standard error of each numeric column mean is
+    estimated with the stratified estimator, including the finite population correction.
+
+    Parameters:
+    df (pd.DataFrame): The sheet.
+    sample_rows (int): The target sample size.
+    stratify_by (Optional[str]): The stratification column, a simple random sample if None.
+    seed (int): Seed of the random generator.
+
+    Returns:
+    Tuple[pd.DataFrame, SamplingSummary]: The sample, in sheet order, and its precision.
+    """
+    rng = np.random.default_rng(seed)
+    population = len(df)
+    if stratify_by is None:
+        groups = [np.arange(population)]
+    else:
+        # Missing values form a stratum of their own
+        codes, _ = pd.factorize(df[stratify_by], use_na_sentinel=False)
+        order = np.argsort(codes, kind="stable")
+        groups = np.split(order, np.flatnonzero(np.diff(codes[order])) + 1)
+
+    positions, strata = [], []
+    for stratum, members in enumerate(groups):
+        take = min(len(members), max(1, round(sample_rows * len(members) / population)))
+        positions.append(rng.choice(members, size=take, replace=False))
+        strata.append(np.full(take, stratum))
+    positions, strata = np.concatenate(positions), np.concatenate(strata)
+    order = np.argsort(positions)
+    sample = df.iloc[positions[order]]
+    strata = strata[order]
+
+    weights = np.array([len(members) for members in groups], dtype=float)
+    numeric = sample.select_dtypes(include="number")
+    grouped = numeric.groupby(strata)
+    means, variances, counts = grouped.mean(), grouped.var(ddof=1).fillna(0.0), grouped.count()
+    share = pd.Series(weights / population)
+    taken = pd.Series(np.bincount(strata, minlength=len(weights)).astype(float))
+    fpc = (1 - taken / pd.Series(weights)).clip(lower=0.0)
+
+    estimate = means.mul(share, axis=0).sum()
+    variance = variances.div(counts.where(counts > 0)).mul(share**2 * fpc, axis=0).sum()
+    standard_error = np.sqrt(variance)
+    margin = 1.96 * standard_error
+    errors = pd.DataFrame(
+        {
+            "estimated_mean": estimate,
+            "standard_error": standard_error,
+            "margin_95": margin,
+            "relative_margin": margin / estimate.abs().replace(0, np.nan),
+        }
+    )
+    summary = SamplingSummary(population, len(sample), stratify_by, len(groups), errors)
+    return sample, summary
+
+
+class _ColumnAccumulator:
+    """Mergeable statistics of one column, so chunks can be summarised independently and combined."""
+
+    def __init__(self, kind: str, max_distinct: int):
+        self.kind = kind
+        self.max_distinct = max_distinct
+        self.count = 0
+        self.missing = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.zeros = 0
+        self.negatives = 0
+        self.values: Counter = Counter()
+        self.distinct_capped = False
+
+    def update(self, series: pd.Series):
+        missing = int(series.isna().sum())
+        self.missing += missing
+        values = series.dropna()
+        if values.empty:
+            return
+        if self.kind == "numeric":
+            array = values.to_numpy(dtype=float)
+            other = _ColumnAccumulator(self.kind, self.max_distinct)
+            other.count, other.mean = len(array), float(array.mean())
+            other.m2 = float(((array - other.mean) ** 2).sum())
+            other.minimum, other.maximum = float(array.min()), float(array.max())
+            other.zeros, other.negatives = int((array == 0).sum()), int((array < 0).sum())
+            self.merge(other, missing=False)
+            return
+        self.count += len(values)
+        if self.kind == "datetime":
+            low, high = values.min(), values.max()
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+        if not self.distinct_capped:
+            self.values.update(values.value_counts().to_dict())
+            if len(self.values) > self.max_distinct:
+                # Keep the most frequent values and stop counting, so memory stays bounded
+                self.values = Counter(dict(self.values.most_common(self.max_distinct)))
+                self.distinct_capped = True
+
+    def merge(self, other: "_ColumnAccumulator", missing: bool = True):
+        if missing:
+            self.missing += other.missing
+        if self.kind == "numeric" and other.count:
+            # Chan et al. parallel update of the mean and the sum of squared deviations
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / total
+            self.m2 += other.m2 + delta**2 * self.count * other.count / total
+            self.count = total
+            self.zeros += other.zeros
+            self.negatives += other.negatives
+        elif self.kind != "numeric":
+            self.count += other.count
+            if not self.distinct_capped and other.values:
+                self.values.update(other.values)
+                self.distinct_capped = other.distinct_capped or len(self.values) > self.max_distinct
+                if self.distinct_capped:
+                    self.values = Counter(dict(self.values.most_common(self.max_distinct)))
+        for name, pick in (("minimum", min), ("maximum", max)):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            if theirs is not None:
+                setattr(self, name, theirs if mine is None else pick(mine, theirs))
+
+    def summary(self) -> Dict:
+        total = self.count + self.missing
+        row = {
+            "type": self.kind,
+            "count": self.count,
+            "missing": self.missing,
+            "missing_pct": round(100 * self.missing / total, 2) if total else 0.0,
+        }
+        if self.kind == "numeric":
+            std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+            row.update(
+                mean=self.mean if self.count else np.nan,
+                std=std,
+                min=self.minimum,
+                max=self.maximum,
+                zeros=self.zeros,
+                negatives=self.negatives,
+            )
+        else:
+            distinct = len(self.values)
+            row["distinct"] = f">{self.max_distinct}" if self.distinct_capped else distinct
+            if self.values:
+                row["top"], row["top_count"] = self.values.most_common(1)[0]
+            if self.kind == "datetime":
+                row.update(min=self.minimum, max=self.maximum)
+        return row
+
+
+def _column_kind(series: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(series):
+        return "text"
+    if pd.api.types.is_numeric_dtype(series):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "datetime"
+    return "text"
+
+
+def _bounded_map(func: Callable, items: Iterable, workers: int) -> Iterator:
+    """Like executor.map, but with at most two tasks per worker in flight, so chunks are read as they are needed."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def _stats_chunk(
+    chunk: pd.DataFrame, kinds: Dict[str, str], max_distinct: int, capped: set
+) -> Dict[str, _ColumnAccumulator]:
+    accumulators = {}
+    for column, kind in kinds.items():
+        accumulators[column] = _ColumnAccumulator(kind, max_distinct)
+        # Columns already known to have too many distinct values are no longer counted
+        accumulators[column].distinct_capped = column in capped
+        accumulators[column].update(chunk[column])
+    return accumulators
+
+
+def _moments_chunk(chunk: pd.DataFrame, numeric: List[str], centers: np.ndarray, edges: List[np.ndarray]):
+    """Pairwise-complete correlation sums and histogram counts of one chunk. Mostly BLAS and ufuncs, which release the GIL."""
+    values = chunk[numeric].to_numpy(dtype=float) - centers
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+    mask = present.astype(float)
+    sums = {
+        "n": mask.T @ mask,
+        "x": filled.T @ mask,  # [i, j]: sum of column i over rows where j is present
+        "xx": (filled**2).T @ mask,
+        "xy": filled.T @ filled,
+    }
+    counts = []
+    for position, column_edges in enumerate(edges):
+        column = values[present[:, position], position] + centers[position]
+        counts.append(np.histogram(column, bins=column_edges)[0])
+    return sums, counts
+
+
+def profile_chunks(
+    make_chunks: Callable[[], Iterable[pd.DataFrame]], config: Optional[ProfileConfig] = None
+) -> ProfileResult:
+    """
+    Column statistics, correlations and histograms computed chunk by chunk.
+
+    Two passes are made over the chunks: the first collects per-column counts, moments,
+    extremes and value frequencies, the second uses the ranges and means from the first
+    for histogram bins and numerically stable correlation sums. Chunks are summarised on
+    a thread pool and merged, with a bounded number in flight, so memory depends on the
+    chunk size rather than the sheet size.
+
+    Parameters:
+    make_chunks (Callable): Returns a fresh iterable of DataFrame chunks with the same
+        columns each time it is called, see frame_chunks.
+    config (Optional[ProfileConfig]): Chunk size, workers, bins and the distinct value cap.
+
+    Returns:
+    ProfileResult: The summary.
+    """
+    config = config or ProfileConfig()
+    started = time.perf_counter()
+    workers = max(1, config.workers)
+
+    kinds, totals, rows, capped = None, {}, 0, set()
+    iterator = iter(make_chunks())
+    first = next(iterator, None)
+    if first is not None:
+        kinds = {column: _column_kind(first[column]) for column in first.columns}
+
+        def chunks_with_first():
+            yield first
+            yield from iterator
+
+        for partial in _bounded_map(
+            lambda chunk: (len(chunk), _stats_chunk(chunk, kinds, config.max_distinct, capped)),
+            chunks_with_first(),
+            workers,
+        ):
+            rows += partial[0]
+            for column, accumulator in partial[1].items():
+                if column in totals:
+                    totals[column].merge(accumulator)
+                else:
+                    totals[column] = accumulator
+                if totals[column].distinct_capped:
+                    capped.add(column)
+
+    columns = pd.DataFrame({column: accumulator.summary() for column, accumulator in totals.items()}).T
+    numeric = [column for column, kind in (kinds or {}).items() if kind == "numeric" and totals[column].count]
+    centers = np.array([totals[column].mean for column in numeric])
+    edges = [
+        np.linspace(totals[column].minimum, totals[column].maximum, config.bins + 1)
+        if totals[column].maximum > totals[column].minimum
+        else np.array([totals[column].minimum - 0.5, totals[column].maximum + 0.5])
+        for column in numeric
+    ]
+
+    sums, counts = None, [np.zeros(len(column_edges) - 1, dtype=np.int64) for column_edges in edges]
+    if numeric:
+        for chunk_sums, chunk_counts in _bounded_map(
+            lambda chunk: _moments_chunk(chunk, numeric, centers, edges), make_chunks(), workers
+        ):
+            sums = chunk_sums if sums is None else {key: sums[key] + value for key, value in chunk_sums.items()}
+            counts = [total + chunk for total, chunk in zip(counts, chunk_counts)]
+
+    correlations = pd.DataFrame(index=numeric, columns=numeric, dtype=float)
+    if sums is not None:
+        n, sx, sxx, sxy = sums["n"], sums["x"], sums["xx"], sums["xy"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            covariance = n * sxy - sx * sx.T
+            spread = np.sqrt((n * sxx - sx**2) * (n * sxx.T - sx.T**2))
+            matrix = np.where((n > 1) & (spread > 0), covariance / spread, np.nan)
+        correlations = pd.DataFrame(np.clip(matrix, -1.0, 1.0), index=numeric, columns=numeric)
+
+    top_values = {
+        column: accumulator.values.most_common(10)
+        for column, accumulator in totals.items()
+        if accumulator.kind != "numeric"
+    }
+    seconds = time.perf_counter() - started
+    logging.info(f"Profiled {rows} rows x {len(totals)} columns in {seconds:.2f}s")
+    return ProfileResult(
+        rows=rows,
+        columns=columns,
+        correlations=correlations,
+        histograms={column: (counts[i], edges[i]) for i, column in enumerate(numeric)},
+        top_values=top_values,
+        seconds=seconds,
+    )
+
+
+def _histogram_html(counts: np.ndarray, edges: np.ndarray) -> str:
+    peak = counts.max() if len(counts) and counts.max() else 1
+    bars = "".join(
+        f'<div class="bar" style="height:{max(1, int(60 * count / peak))}px" '
+        f'title="{edges[i]:,.2f} to {edges[i + 1]:,.2f}: {count:,}"></div>'
+        for i, count in enumerate(counts)
+    )
+    return f'<div class="histogram">{bars}</div><div class="range">{edges[0]:,.2f} &ndash; {edges[-1]:,.2f}</div>'
+
+
+def render_html(result: ProfileResult, title: str) -> str:
+    """A self-contained HTML page of a minimal profile, in the layout of the downloadable report."""
+    sections = [
+        f"<h1>{html.escape(title)}</h1>",
+        f"<p>{result.rows:,} rows, {len(result.columns)} columns, profiled in {result.seconds:.1f}s "
+        f"(minimal mode: exact statistics over all rows, no per-value details).</p>",
+    ]
+    sections += ["<h2>Columns</h2>", result.columns.to_html(na_rep="", float_format=lambda value: f"{value:,.4g}")]
+    if result.histograms:
+        cards = "".join(
+            f'<div class="card"><h3>{html.escape(str(column))}</h3>{_histogram_html(*histogram)}</div>'
+            for column, histogram in result.histograms.items()
+        )
+        sections += ["<h2>Histograms</h2>", f'<div class="cards">{cards}</div>']
+    if result.top_values:
+        cards = "".join(
+            f'<div class="card"><h3>{html.escape(str(column))}</h3>'
+            + pd.DataFrame(values, columns=["value", "count"]).to_html(index=False)
+            + "</div>"
+            for column, values in result.top_values.items()
+            if values
+        )
+        sections += ["<h2>Most frequent values</h2>", f'<div class="cards">{cards}</div>']
+    if len(result.correlations) > 1:
+        sections += [
+            "<h2>Correlations (Pearson)</h2>",
+            result.correlations.to_html(float_format=lambda value: f"{value:.2f}", na_rep=""),
+        ]
+    style = (
+        "body{font-family:sans-serif;margin:2rem;color:#222}table{border-collapse:collapse;font-size:13px}"
+        "td,th{border:1px solid #ddd;padding:4px 8px;text-align:right}.cards{display:flex;flex-wrap:wrap;gap:1rem}"
+        ".card{border:1px solid #ddd;padding:.5rem 1rem}.histogram{display:flex;align-items:flex-end;height:64px;gap:1px}"
+        ".bar{width:8px;background:#4c9a5a}.range{font-size:11px;color:#666}"
+    )
+    return f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title><style>{style}</style></head><body>{''.join(sections)}</body></html>"
+
+
+def write_profile_report(
+    df: Union[pd.DataFrame, ParquetSheet],
+    report_path: str,
+    config: Optional[ProfileConfig] = None,
+    title: str = "Pandas Profiling Report",
+) -> str:
+    """
+    Profiles a sheet and writes the HTML report.
+
+    Full mode runs ydata-profiling, on a (stratified) sample when sample_rows is smaller
+    than the sheet, with the sampling error of the column means in the report description.
+    Minimal mode runs profile_chunks over the whole sheet. Sheets too large for memory,
+    passed as ParquetSheet, are always profiled in minimal mode, reading one chunk at a time.
+
+    Parameters:
+    df (Union[pd.DataFrame, ParquetSheet]): The sheet.
+    report_path (str): The HTML file to write.
+    config (Optional[ProfileConfig]): The profiling settings.
+    title (str): The report title.
+
+    Returns:
+    str: The mode used, "full" or "minimal".
+    """
+    config = config or ProfileConfig()
+    started = time.perf_counter()
+    if isinstance(df, ParquetSheet):
+        result = profile_chunks(ParquetSheet(df.path, config.chunk_rows).chunks, config)
+        with open(report_path, "w", encoding="utf-8") as file_obj:
+            file_obj.write(render_html(result, title))
+        logging.info(f"Wrote minimal profile of {len(df)} rows from {df.path} to {report_path} in {time.perf_counter() - started:.2f}s")
+        return "minimal"
+    mode = resolve_mode(len(df), len(df.columns), config)
+    frame = df
+    if mode == "full":
+        from ydata_profiling import ProfileReport
+
+        sampling = None
+        if config.sample_rows and config.sample_rows < len(df):
+            frame, sampling = stratified_sample(df, config.sample_rows, config.stratify_by, config.seed)
+
+        description = None
+        if sampling is not None:
+            errors = sampling.errors.round(4).to_string()
+            description = (
+                f"Sample of {sampling.sample_rows} of {sampling.population_rows} rows"
+                + (f", stratified by {sampling.stratify_by}" if sampling.stratify_by else "")
+                + f". Sampling error of the column means (95% margin):\n{errors}"
+            )
+        profile = ProfileReport(frame, title=title, dataset={"description": description} if description else None)
+        profile.to_file(report_path)
+    else:
+        # The chunked statistics are exact, so the minimal report always covers every row
+        result = profile_chunks(frame_chunks(df, config.chunk_rows), config)
+        with open(report_path, "w", encoding="utf-8") as file_obj:
+            file_obj.write(render_html(result, title))
+    logging.info(f"Wrote {mode} profile of {len(frame)} rows to {report_path} in {time.perf_counter() - started:.2f}s")
+    return mode
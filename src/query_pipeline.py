@@ -0,0 +1,207 @@
+import asyncio
+import re
+import time
+from dataclasses import dataclass, field
+from itertools import zip_longest
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+QUESTION_WORDS = {
+    "what", "which", "who", "whom", "whose", "when", "where", "why", "how",
+    "is", "are", "was", "were", "do", "does", "did", "can", "could", "should",
+    "list", "show", "give", "compare", "summarize", "summarise", "explain", "describe",
+}
+# Frequent Hindi function words in romanized (Hinglish) queries, which still benefit from a rewrite
+HINGLISH_WORDS = {
+    "kya", "hai", "hain", "ka", "ki", "ke", "ko", "mein", "me", "kaise", "kitna", "kitne",
+    "kab", "kahan", "kyun", "kyu", "batao", "bataiye", "aur", "nahi", "tha", "thi", "wala", "wali",
+}
+WORD_PATTERN = re.compile(r"[A-Za-z0-9']+")
+
+
+def is_well_formed(query: str) -> bool:
+    """
+    Cheap check for queries that are already clear enough to retrieve with as they are.
+
+    A query counts as well formed when it is a complete English question or instruction of
+    reasonable length, and not Hinglish or a bare keyword fragment.
+
+    Parameters:
+    query (str): The raw user query.
+
+    Returns:
+    bool: True when the LLM rewrite can be skipped.
+    """
+    words = [word.lower() for word in WORD_PATTERN.findall(query)]
+    if not 5 <= len(words) <= 40:
+        return False
+    if sum(1 for word in words if word in HINGLISH_WORDS) >= 2:
+        return False
+    return words[0] in QUESTION_WORDS or query.rstrip().endswith("?")
+
+
+def document_key(document: Document) -> str:
+    """Identifies a chunk by its chunk_id metadata, or by its text when it is missing."""
+    return document.metadata.get("chunk_id") or document.page_content
+
+
+def merge_documents(*candidate_sets: List[Document], limit: Optional[int] = None) -> List[Document]:
+    """
+    Merges retrieval results, taking the best remaining chunk of each set in turn and
+    keeping the first occurrence of each chunk as identified by document_key.
+
+    Parameters:
+    candidate_sets (List[Document]): Result lists, each ranked best first.
+    limit (Optional[int]): The maximum number of chunks to return.
+
+    Returns:
+    List[Document]: The de-duplicated union, or its first limit chunks.
+    """
+    merged, seen = [], set()
+    for documents in zip_longest(*candidate_sets):
+        for document in documents:
+            if document is None:
+                continue
+            key = document_key(document)
+            if key not in seen:
+                seen.add(key)
+                merged.append(document)
+                if limit is not None and len(merged) == limit:
+                    return merged
+    return merged
+
+
+@dataclass
+class PipelineResult:
+    """
+    Outcome of one pass through the query pipeline.
+
+    Parameters:
+    query (str): The query the documents were reranked against.
+    rewritten (bool): Whether the LLM rewrite was used.
+    documents (List[Document]): The reranked documents.
+    timings (Dict[str, float]): Seconds spent per stage, plus the end-to-end total.
+    """
+
+    query: str
+    rewritten: bool
+    documents: List[Document]
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+class QueryPipeline:
+    """
+    Overlaps the LLM query rewrite with first-pass retrieval and reranking.
+
+    Retrieval on the raw query starts while the rewrite is in flight. Once the rewritten
+    query arrives, it is retrieved while the cross-encoder already scores the raw
+    candidates against it. The candidate sets are merged by taking the best chunks of both
+    in turn, up to max_candidates, so no more candidates are reranked than a single
+    retrieval would return, and only the merged chunks that came from the rewritten query
+    alone are scored after its retrieval. The critical path is thus the rewrite, the
+    rewritten retrieval and the scoring of the new chunks, rather than the rewrite followed
+    by the retrieval and the reranking of every candidate. Queries that is_well_formed
+    accepts skip the rewrite altogether. The stages are blocking callables, run on worker
+    threads.
+
+    Parameters:
+    rewrite (Callable[[str], str]): Rewrites a raw query, e.g. DataProcessing.improve_query.
+    retrieve (Callable[[str], List[Document]]): First-pass hybrid retrieval.
+    score (Callable[[List[Document], str], List[float]]): Cross-encoder relevance scores of
+    documents for a query, in document order.
+    skip_rewrite (Callable[[str], bool]): Decides which queries need no rewrite.
+    max_candidates (Optional[int]): The most merged candidates reranked, usually the
+    retriever's top_k. None keeps them all.
+    top_n (int): The reranked documents kept.
+    """
+
+    def __init__(
+        self,
+        rewrite: Callable[[str], str],
+        retrieve: Callable[[str], List[Document]],
+        score: Callable[[List[Document], str], List[float]],
+        skip_rewrite: Callable[[str], bool] = is_well_formed,
+        max_candidates: Optional[int] = None,
+        top_n: int = 4,
+    ):
+        self.rewrite = rewrite
+        self.retrieve = retrieve
+        self.score = score
+        self.skip_rewrite = skip_rewrite
+        self.max_candidates = max_candidates
+        self.top_n = top_n
+
+    @staticmethod
+    async def _timed(timings: Dict[str, float], stage: str, func: Callable, *args):
+        started = time.perf_counter()
+        result = await asyncio.to_thread(func, *args)
+        timings[stage] = time.perf_counter() - started
+        return result
+
+    def _scores(self, documents: List[Document], query: str) -> Dict[str, float]:
+        if not documents:
+            return {}
+        return dict(zip(map(document_key, documents), self.score(documents, query)))
+
+    def _top(self, candidates: List[Document], scores: Dict[str, float]) -> List[Document]:
+        # A stable sort, so ties keep the retrieval order as CrossEncoderReranker does
+        ranked = sorted(candidates, key=lambda document: scores[document_key(document)], reverse=True)
+        return ranked[: self.top_n]
+
+    async def arun(self, query: str) -> PipelineResult:
+        """
+        Runs the pipeline for one query.
+
+        Parameters:
+        query (str): The raw user query.
+
+        Returns:
+        PipelineResult: The final query, the reranked documents and per-stage timings.
+        """
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        if self.skip_rewrite(query):
+            final_query, rewritten = query, False
+            candidates = await self._timed(timings, "retrieve", self.retrieve, query)
+            scores = await self._timed(timings, "rerank", self._scores, candidates, query)
+        else:
+            raw_retrieval = asyncio.create_task(self._timed(timings, "retrieve_raw", self.retrieve, query))
+            final_query = (await self._timed(timings, "rewrite", self.rewrite, query)).strip()
+            rewritten = True
+            rewritten_retrieval = asyncio.create_task(
+                self._timed(timings, "retrieve_rewritten", self.retrieve, final_query)
+            )
+            raw_docs = await raw_retrieval
+            raw_scoring = asyncio.create_task(self._timed(timings, "rerank_raw", self._scores, raw_docs, final_query))
+            candidates = merge_documents(await rewritten_retrieval, raw_docs, limit=self.max_candidates)
+            raw_keys = set(map(document_key, raw_docs))
+            fresh = [document for document in candidates if document_key(document) not in raw_keys]
+            fresh_scores = await self._timed(timings, "rerank_rewritten", self._scores, fresh, final_query)
+            scores = {**await raw_scoring, **fresh_scores}
+
+        documents = self._top(candidates, scores)
+        timings["total"] = time.perf_counter() - started
+        return PipelineResult(final_query, rewritten, documents, timings)
+
+    def replay(self, query: str, final_query: str) -> List[Document]:
+        """
+        Repeats the retrieval and reranking of an earlier run without the rewrite, e.g. to
+        check whether the context of a cached answer is still what the index returns.
+
+        Parameters:
+        query (str): The raw user query of the earlier run.
+        final_query (str): The query the earlier run reranked against.
+
+        Returns:
+        List[Document]: The reranked documents.
+        """
+        candidates = self.retrieve(final_query)
+        if final_query != query:
+            candidates = merge_documents(candidates, self.retrieve(query), limit=self.max_candidates)
+        return self._top(candidates, self._scores(candidates, final_query))
+
+    def run(self, query: str) -> PipelineResult:
+        """Synchronous wrapper around arun for callers without an event loop, such as Streamlit scripts."""
+        return asyncio.run(self.arun(query))
@@ -0,0 +1,189 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+import pandas as pd
+
+from src.logger import logging
+from src.parquet_sheets import ParquetSheet
+from src.profiling import ProfileConfig, write_profile_report
+
+
+def dataframe_digest(df: pd.DataFrame) -> str:
+    """SHA-256 of the values, index, column names and dtypes of a DataFrame."""
+    digest = hashlib.sha256()
+    digest.update(repr([(str(column), str(dtype)) for column, dtype in df.dtypes.items()]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def report_key(df_digest: str, config: ProfileConfig, title: str) -> str:
+    """The cache key of a report: the sheet content together with everything that shapes the report."""
+    return hashlib.sha256(f"{df_digest}\x00{config.key()}\x00{title}".encode("utf-8")).hexdigest()
+
+
+def _generate_report(df: pd.DataFrame, path: str, config: ProfileConfig, title: str) -> str:
+    """Runs in a worker process. Writes next to the final path and renames, so readers never see a partial report."""
+    partial_path = f"{path}.{os.getpid()}.partial"
+    try:
+        mode = write_profile_report(df, partial_path, config, title)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return mode
+
+
+@dataclass
+class ReportJob:
+    """
+    Status of one profiling report.
+
+    Parameters:
+    key (str): The report key, see report_key.
+    state (str): "queued", "running", "done" or "failed".
+    path (Optional[str]): The HTML report, once done.
+    error (Optional[str]): Why the report failed.
+    submitted (float): When the job was submitted, 0 for a report already on disk.
+    seconds (Optional[float]): Time from submission to completion.
+    cached (bool): Whether the report was served from the cache.
+    """
+
+    key: str
+    state: str
+    path: Optional[str] = None
+    error: Optional[str] = None
+    submitted: float = 0.0
+    seconds: Optional[float] = None
+    cached: bool = False
+
+
+class ReportJobs:
+    """
+    Profiling reports generated on a background process pool and cached on disk.
+
+    Reports are stored per sheet content and profile settings, so a repeated request is
+    served from disk, identical requests from several sessions share one job, and no two
+    sheets ever write to the same file. Only the most recently used max_reports files, and
+    the status of the most recent max_reports finished jobs, are kept. A report requested
+    again after its file was pruned is generated again. The pool is created on the first
+    job and its processes are started with spawn, which is safe from the threads of a
+    Streamlit server.
+
+    Parameters:
+    directory (str): Where the reports are stored.
+    max_workers (int): Reports generated at once.
+    max_reports (int): Reports kept on disk, and finished jobs remembered.
+    """
+
+    def __init__(self, directory: str, max_workers: int = 2, max_reports: int = 50):
+        self.directory = directory
+        self.max_workers = max_workers
+        self.max_reports = max_reports
+        os.makedirs(directory, exist_ok=True)
+        self._executor = None
+        self._jobs: Dict[str, Future] = {}
+        self._submitted: Dict[str, float] = {}
+        self._finished: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.html")
+
+    def submit(
+        self,
+        df: Union[pd.DataFrame, ParquetSheet],
+        config: Optional[ProfileConfig] = None,
+        title: str = "Pandas Profiling Report",
+    ) -> str:
+        """
+        Starts generating the report of a sheet unless it is cached or already being generated.
+
+        Parameters:
+        df (Union[pd.DataFrame, ParquetSheet]): The sheet. A ParquetSheet is passed to the
+            worker by path, so only the worker reads it.
+        config (Optional[ProfileConfig]): The profile settings.
+        title (str): The report title.
+
+        Returns:
+        str: The report key to poll with status.
+        """
+        config = config or ProfileConfig()
+        if isinstance(df, ParquetSheet):
+            # The path holds the workbook digest and sheet index, so it identifies the content without reading it
+            digest = hashlib.sha256(os.path.abspath(df.path).encode("utf-8")).hexdigest()
+        else:
+            digest = dataframe_digest(df)
+        key = report_key(digest, config, title)
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is not None and not future.done():
+                return key
+            if os.path.exists(self.path(key)):
+                return key
+            # A failed job, or one whose report has since been pruned, is generated again
+            self._jobs.pop(key, None)  # and moves to the end of the submission order
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            self._submitted[key] = time.time()
+            future = self._executor.submit(_generate_report, df, self.path(key), config, title)
+            future.add_done_callback(lambda _: self._on_done(key))
+            self._jobs[key] = future
+        logging.info(f"Queued profiling report {key[:12]} for {len(df)} rows")
+        return key
+
+    def _on_done(self, key: str):
+        with self._lock:
+            self._finished[key] = time.time()
+        self._prune()
+
+    def status(self, key: str) -> ReportJob:
+        """The state of a report, served from the cache when the file exists."""
+        with self._lock:
+            future = self._jobs.get(key)
+            submitted = self._submitted.get(key, 0.0)
+            finished = self._finished.get(key)
+        seconds = finished - submitted if finished is not None and submitted else None
+        if future is not None and not future.done():
+            return ReportJob(key, "running" if future.running() else "queued", submitted=submitted)
+        if future is not None and future.exception() is not None:
+            return ReportJob(key, "failed", error=str(future.exception()), submitted=submitted, seconds=seconds)
+        path = self.path(key)
+        if os.path.exists(path):
+            # Touch the report so pruning keeps the ones in use
+            os.utime(path)
+            return ReportJob(key, "done", path=path, submitted=submitted, seconds=seconds, cached=future is None)
+        return ReportJob(key, "failed", error="The report is no longer available", submitted=submitted)
+
+    def _prune(self):
+        with self._lock:
+            finished = [key for key, future in self._jobs.items() if future.done()]
+            # Jobs are kept in submission order, so the oldest finished ones go first
+            for key in finished[: max(len(finished) - self.max_reports, 0)]:
+                del self._jobs[key]
+                self._submitted.pop(key, None)
+                self._finished.pop(key, None)
+        reports = [
+            os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".html")
+        ]
+        if len(reports) <= self.max_reports:
+            return
+        reports.sort(key=os.path.getmtime)
+        for path in reports[: len(reports) - self.max_reports]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
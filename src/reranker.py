@@ -0,0 +1,215 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Tuple
+
+import numpy as np
+from langchain_community.cross_encoders import BaseCrossEncoder
+
+from src.logger import logging
+
+
+class RerankingService(BaseCrossEncoder):
+    """
+    Process-wide cross-encoder scorer for CrossEncoderReranker.
+
+    The model is loaded once, on first use. Pairs are scored in padded batches after being
+    sorted by length, so each batch pads to similar lengths. Scores are kept in an LRU
+    cache keyed by the (query, passage) pair. Besides the sentence-transformers (PyTorch)
+    backend, an ONNX Runtime backend with a dynamically int8-quantized copy of the model
+    is available for CPU-only hosts. It needs the optional optimum[onnxruntime] package.
+
+    Parameters:
+    model_name (str): The Hugging Face model to load.
+    batch_size (int): The number of pairs scored per forward pass.
+    num_threads (int): The number of CPU threads for inference, or None for the default.
+    cache_size (int): The maximum number of cached pair scores.
+    backend (str): "torch" or "onnx".
+    max_length (int): The maximum number of tokens per pair.
+    onnx_dir (str): Where the exported and quantized ONNX model is kept.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "BAAI/bge-reranker-base",
+        batch_size: int = 32,
+        num_threads: int = None,
+        cache_size: int = 10_000,
+        backend: str = "torch",
+        max_length: int = 512,
+        onnx_dir: str = os.path.join("artifacts", "cache", "onnx"),
+    ):
+        if backend not in ("torch", "onnx"):
+            raise ValueError(f"Unknown reranker backend '{backend}', expected 'torch' or 'onnx'")
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.cache_size = cache_size
+        self.backend = backend
+        self.max_length = max_length
+        self.onnx_dir = onnx_dir
+
+        self._predict = None
+        self._load_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._cache: "OrderedDict[str, float]" = OrderedDict()
+        self.load_seconds = None
+        self.cache_hits = 0
+        self.pairs_scored = 0
+        self._latencies = deque(maxlen=1000)
+
+    def _load(self):
+        with self._load_lock:
+            if self._predict is not None:
+                return
+            started = time.perf_counter()
+            if self.backend == "onnx":
+                self._predict = self._load_onnx()
+            else:
+                self._predict = self._load_torch()
+            self.load_seconds = time.perf_counter() - started
+            logging.info(f"Loaded reranker {self.model_name} ({self.backend}) in {self.load_seconds:.1f}s")
+
+    def _load_torch(self):
+        import torch
+        from sentence_transformers import CrossEncoder
+
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        model = CrossEncoder(self.model_name, max_length=self.max_length)
+
+        def predict(pairs):
+            scores = np.asarray(model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False))
+            # Some models return (not relevant, relevant) logits per pair
+            return scores[:, 1] if scores.ndim > 1 else scores
+
+        return predict
+
+    def _load_onnx(self):
+        try:
+            from onnxruntime import SessionOptions
+            from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            from transformers import AutoTokenizer
+        except ImportError as exc:
+            raise ImportError(
+                "The ONNX reranker backend needs optimum with onnxruntime. "
+                "Please install it with `pip install optimum[onnxruntime]`."
+            ) from exc
+
+        model_dir = os.path.join(self.onnx_dir, self.model_name.replace("/", "--"))
+        if not os.path.exists(os.path.join(model_dir, "model_quantized.onnx")):
+            ORTModelForSequenceClassification.from_pretrained(self.model_name, export=True).save_pretrained(model_dir)
+            AutoTokenizer.from_pretrained(self.model_name).save_pretrained(model_dir)
+            quantizer = ORTQuantizer.from_pretrained(model_dir)
+            quantizer.quantize(
+                save_dir=model_dir,
+                quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False),
+            )
+
+        session_options = SessionOptions()
+        if self.num_threads:
+            session_options.intra_op_num_threads = self.num_threads
+        model = ORTModelForSequenceClassification.from_pretrained(
+            model_dir, file_name="model_quantized.onnx", session_options=session_options
+        )
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        def predict(pairs):
+            scores = []
+            for start in range(0, len(pairs), self.batch_size):
+                batch = pairs[start : start + self.batch_size]
+                inputs = tokenizer(
+                    [query for query, _ in batch],
+                    [passage for _, passage in batch],
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_length,
+                    return_tensors="np",
+                )
+                logits = np.asarray(model(**inputs).logits)
+                logits = logits[:, 1] if logits.shape[1] > 1 else logits[:, 0]
+                # Match the sigmoid activation sentence-transformers applies to single-label models
+                scores.append(1 / (1 + np.exp(-logits)))
+            return np.concatenate(scores)
+
+        return predict
+
+    @staticmethod
+    def _key(query: str, passage: str) -> str:
+        return hashlib.sha1(f"{query}\x00{passage}".encode("utf-8")).hexdigest()
+
+    def score(self, text_pairs: List[Tuple[str, str]]) -> List[float]:
+        """
+        Scores (query, passage) pairs, reusing cached scores where possible.
+
+        Parameters:
+        text_pairs (List[Tuple[str, str]]): The pairs to score.
+
+        Returns:
+        List[float]: One relevance score per pair, in input order.
+        """
+        started = time.perf_counter()
+        keys = [self._key(query, passage) for query, passage in text_pairs]
+        scores = {}
+        with self._cache_lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+        self.cache_hits += len(scores)
+
+        missing = {}
+        for key, pair in zip(keys, text_pairs):
+            if key not in scores:
+                missing.setdefault(key, pair)
+        if missing:
+            self._load()
+            # Sorting by length keeps the padding within each batch small
+            ordered = sorted(missing.items(), key=lambda item: len(item[1][0]) + len(item[1][1]))
+            fresh = self._predict([pair for _, pair in ordered])
+            with self._cache_lock:
+                for (key, _), value in zip(ordered, fresh):
+                    scores[key] = float(value)
+                    self._cache[key] = float(value)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            self.pairs_scored += len(missing)
+
+        self._latencies.append(time.perf_counter() - started)
+        return [scores[key] for key in keys]
+
+    def metrics(self) -> Dict[str, float]:
+        """Return the model load time, rerank latency percentiles and cache counters."""
+        latencies = np.array(self._latencies) * 1000 if self._latencies else np.zeros(1)
+        return {
+            "load_seconds": self.load_seconds,
+            "rerank_p50_ms": float(np.percentile(latencies, 50)),
+            "rerank_p95_ms": float(np.percentile(latencies, 95)),
+            "calls": len(self._latencies),
+            "pairs_scored": self.pairs_scored,
+            "cache_hits": self.cache_hits,
+        }
+
+
+_services: Dict[tuple, RerankingService] = {}
+_services_lock = threading.Lock()
+
+
+def get_reranking_service(**kwargs) -> RerankingService:
+    """
+    Returns the process-wide RerankingService for the given settings, creating it once.
+
+    Parameters:
+    kwargs: Arguments for RerankingService.
+
+    Returns:
+    RerankingService: The shared instance.
+    """
+    key = tuple(sorted(kwargs.items()))
+    with _services_lock:
+        if key not in _services:
+            _services[key] = RerankingService(**kwargs)
+        return _services[key]
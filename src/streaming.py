@@ -0,0 +1,78 @@
+import time
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+
+@dataclass
+class StreamStats:
+    """
+    Timing of one streamed completion.
+
+    Parameters:
+    started (float): The perf_counter time the request was sent.
+    first_token_at (Optional[float]): The perf_counter time the first text arrived.
+    finished_at (Optional[float]): The perf_counter time the stream ended.
+    chunks (int): The number of text deltas received.
+    completion_tokens (Optional[int]): The token count reported by the server, if any.
+    """
+
+    started: float = field(default_factory=time.perf_counter)
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    chunks: int = 0
+    completion_tokens: Optional[int] = None
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    @property
+    def tokens_per_second(self) -> float:
+        """Generation speed after the first token, using the server's token count when reported."""
+        if self.first_token_at is None or self.finished_at is None:
+            return 0.0
+        tokens = self.completion_tokens or self.chunks
+        elapsed = self.finished_at - self.first_token_at
+        return tokens / elapsed if elapsed > 0 else 0.0
+
+
+class CompletionStream:
+    """
+    Iterates over the text deltas of a streamed chat completion and records their timing.
+
+    The request is only sent when iteration starts, so the object can be handed straight
+    to st.write_stream. The deltas are yielded as they arrive; after iteration, text holds
+    the full response, stripped like the non-streamed answers, and stats the time to
+    first token and the tokens per second.
+
+    Parameters:
+    client: An OpenAI (or OpenAI-compatible) client.
+    request: Arguments for client.chat.completions.create, without stream.
+    """
+
+    def __init__(self, client, **request):
+        self.client = client
+        self.request = request
+        self.text = ""
+        self.stats = StreamStats()
+
+    def __iter__(self) -> Iterator[str]:
+        self.stats = StreamStats()
+        parts = []
+        stream = self.client.chat.completions.create(
+            stream=True, stream_options={"include_usage": True}, **self.request
+        )
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                self.stats.completion_tokens = chunk.usage.completion_tokens
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if self.stats.first_token_at is None:
+                    self.stats.first_token_at = time.perf_counter()
+                self.stats.chunks += 1
+                parts.append(delta)
+                yield delta
+        self.stats.finished_at = time.perf_counter()
+        self.text = "".join(parts).strip()
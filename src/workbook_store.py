@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+
+from src.logger import logging
+from src.parquet_sheets import ParquetSheet, csv_to_parquet, excel_row_counts, excel_sheet_to_parquet
+
+
+def compact_frame(df: pd.DataFrame, category_ratio: float = 0.5) -> pd.DataFrame:
+    """
+    Shrinks a parsed sheet for caching and reuse.
+
+    Integer columns are downcast to the smallest integer type that holds them, text
+    columns that repeat a few values (accounts, regions, products) become categoricals,
+    and columns mixing text with numbers or dates are stored as text, which Parquet
+    requires. Floats are left at float64, since amounts must not lose precision.
+
+    Parameters:
+    df (pd.DataFrame): The sheet as read by pandas.
+    category_ratio (float): Text columns with at most this share of distinct values become categoricals.
+
+    Returns:
+    pd.DataFrame: The compacted sheet.
+    """
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series):
+            pass
+        elif pd.api.types.is_integer_dtype(series):
+            series = pd.to_numeric(series, downcast="integer")
+        elif not pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_datetime64_any_dtype(series):
+            if series.dtype == object:
+                series = series.where(series.isna(), series.astype(str)).astype("str")
+            values = series.dropna()
+            if len(values) and values.nunique() <= category_ratio * len(values):
+                series = series.astype("category")
+        columns[str(column)] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+class Workbook:
+    """
+    One uploaded workbook, or CSV file as a workbook with a single sheet. Sheets are parsed
+    from the upload on first use and then read from the cache.
+
+    Parameters:
+    store (WorkbookStore): The cache the sheets are kept in.
+    digest (str): The SHA-256 of the file.
+    data (bytes): The file content.
+    sheet_names (List[str]): The sheets, in workbook order.
+    rows (Dict[str, Optional[int]]): Data rows per sheet where known before parsing.
+    csv (bool): Whether the file is a CSV file.
+    """
+
+    def __init__(
+        self,
+        store: "WorkbookStore",
+        digest: str,
+        data: bytes,
+        sheet_names: List[str],
+        rows: Optional[Dict[str, Optional[int]]] = None,
+        csv: bool = False,
+    ):
+        self.store = store
+        self.digest = digest
+        self.data = data
+        self.sheet_names = sheet_names
+        self.rows = rows or {}
+        self.csv = csv
+
+    def is_large(self, name: str) -> bool:
+        """Whether a sheet is processed from disk in chunks rather than loaded into memory."""
+        if name not in self.rows:
+            return False  # Row counts are unknown for .xls files, which are small by format
+        rows = self.rows[name]
+        return rows is None or rows > self.store.max_rows_in_memory
+
+    def sheet(self, name: str) -> pd.DataFrame:
+        """The compacted sheet. The frame is shared between sessions, so treat it as read-only."""
+        return self.store.sheet(self, name)
+
+    def table(self, name: str) -> ParquetSheet:
+        """The sheet streamed to Parquet and read in chunks, for sheets of any size."""
+        return self.store.table(self, name)
+
+    def load(self, name: str) -> Union[pd.DataFrame, ParquetSheet]:
+        """The sheet in memory, or as a chunked ParquetSheet when it is too large."""
+        return self.table(name) if self.is_large(name) else self.sheet(name)
+
+
+class WorkbookStore:
+    """
+    Parsed workbook sheets keyed by file content, so each sheet of an upload is parsed once.
+
+    A parsed sheet is compacted (see compact_frame) and written to Parquet under
+    directory/<digest>/, where later reruns, sessions and server restarts read it in a
+    fraction of the parse time. The most recently used sheets are also kept in memory.
+
+    Sheets with more than max_rows_in_memory rows, according to the dimensions recorded
+    in the file, are never loaded whole: they are streamed row by row into Parquet and
+    processed in chunks (see ParquetSheet). CSV files are always streamed.
+
+    Parameters:
+    directory (str): Where the Parquet files are written.
+    max_frames (int): Sheets kept in memory.
+    max_rows_in_memory (int): The largest sheet loaded into memory.
+    """
+
+    def __init__(self, directory: str, max_frames: int = 8, max_rows_in_memory: int = 1_000_000):
+        self.directory = directory
+        self.max_frames = max_frames
+        self.max_rows_in_memory = max_rows_in_memory
+        self._frames: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._parsing = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def open(self, data: bytes, digest: Optional[str] = None, file_name: str = "") -> Workbook:
+        """
+        Opens an uploaded workbook, reading its sheet names from the cache when it was seen before.
+
+        Parameters:
+        data (bytes): The file content.
+        digest (Optional[str]): The SHA-256 of data, if the caller already knows it.
+        file_name (str): The upload name. Files ending in .csv are read as CSV.
+        """
+        digest = digest or hashlib.sha256(data).hexdigest()
+        csv = file_name.lower().endswith(".csv")
+        manifest_path = os.path.join(self.directory, digest, "sheets.json")
+        if not os.path.exists(manifest_path):
+            # Sessions opening the same new upload wait for the first one to convert it
+            with self._lock:
+                lock = self._parsing.setdefault((digest, "open"), threading.Lock())
+            with lock:
+                if not os.path.exists(manifest_path):
+                    self._write_manifest(data, digest, file_name, csv, manifest_path)
+                with self._lock:
+                    self._parsing.pop((digest, "open"), None)
+        with open(manifest_path, encoding="utf-8") as file_obj:
+            manifest = json.load(file_obj)
+        if isinstance(manifest, list):  # Written before row counts were recorded
+            manifest = {"sheets": manifest, "rows": {}}
+        return Workbook(self, digest, data, manifest["sheets"], manifest["rows"], csv=csv)
+
+    def _write_manifest(self, data: bytes, digest: str, file_name: str, csv: bool, manifest_path: str):
+        """Records the sheet names and row counts of a new upload, converting a CSV file to Parquet first."""
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        if csv:
+            name = os.path.splitext(os.path.basename(file_name))[0] or "Sheet1"
+            rows = csv_to_parquet(data, self._table_path(digest, 0))
+            manifest = {"sheets": [name], "rows": {name: rows}}
+        else:
+            with pd.ExcelFile(BytesIO(data)) as excel_file:
+                sheet_names = [str(name) for name in excel_file.sheet_names]
+                rows = excel_row_counts(data) if excel_file.engine == "openpyxl" else {}
+            manifest = {"sheets": sheet_names, "rows": rows}
+        self._write_atomic(manifest_path, lambda path: self._write_json(path, manifest))
+
+    def sheet(self, workbook: Workbook, name: str) -> pd.DataFrame:
+        key = (workbook.digest, name)
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                return self._frames[key]
+            # Sessions asking for a sheet that is being parsed wait for it instead of parsing it again
+            lock = self._parsing.setdefault(key, threading.Lock())
+        with lock:
+            with self._lock:
+                if key in self._frames:
+                    return self._frames[key]
+            df = self._load(workbook, name)
+            with self._lock:
+                self._frames[key] = df
+                while len(self._frames) > self.max_frames:
+                    self._frames.popitem(last=False)
+                self._parsing.pop(key, None)
+        return df
+
+    def table(self, workbook: Workbook, name: str) -> ParquetSheet:
+        path = self._table_path(workbook.digest, workbook.sheet_names.index(name))
+        with self._lock:
+            lock = self._parsing.setdefault((workbook.digest, name, "table"), threading.Lock())
+        with lock:
+            if not os.path.exists(path):
+                started = time.perf_counter()
+                rows = excel_sheet_to_parquet(workbook.data, name, path)
+                logging.info(f"Streamed sheet '{name}' ({rows} rows) in {time.perf_counter() - started:.2f}s")
+        return ParquetSheet(path)
+
+    def _table_path(self, digest: str, index: int) -> str:
+        return os.path.join(self.directory, digest, f"{index}.stream.parquet")
+
+    def _load(self, workbook: Workbook, name: str) -> pd.DataFrame:
+        path = os.path.join(self.directory, workbook.digest, f"{workbook.sheet_names.index(name)}.parquet")
+        started = time.perf_counter()
+        if os.path.exists(path):
+            df = pd.read_parquet(path)
+            logging.info(f"Read sheet '{name}' from {path} in {time.perf_counter() - started:.2f}s")
+            return df
+        if workbook.csv:
+            source = pd.read_parquet(self._table_path(workbook.digest, 0))
+        else:
+            source = pd.read_excel(BytesIO(workbook.data), sheet_name=name)
+        df = compact_frame(source)
+        self._write_atomic(path, lambda partial: df.to_parquet(partial))
+        logging.info(f"Parsed sheet '{name}' ({len(df)} rows) in {time.perf_counter() - started:.2f}s")
+        return df
+
+    @staticmethod
+    def _write_json(path: str, value):
+        with open(path, "w", encoding="utf-8") as file_obj:
+            json.dump(value, file_obj)
+
+    @staticmethod
+    def _write_atomic(path: str, write):
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+        write(partial)
+        os.replace(partial, path)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from src.ann_index import IVFIndex
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(7)
+    centers = rng.normal(size=(40, 32))
+    vectors = centers[rng.integers(0, 40, 4000)] + 0.3 * rng.normal(size=(4000, 32))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.choice(4000, 50, replace=False)] + 0.05 * rng.normal(size=(50, 32))
+    return vectors.astype(np.float32), queries.astype(np.float32)
+
+
+def build(vectors, **kwargs):
+    index = IVFIndex(32, nlist=64, **kwargs)
+    index.train(vectors)
+    index.add(np.arange(len(vectors)), vectors)
+    return index
+
+
+def recall(index, vectors, queries, k=10):
+    hits = 0
+    for query in queries:
+        exact = np.argsort(-(vectors @ query))[:k]
+        candidates = index.search(query, k)
+        found = candidates[np.argsort(-(vectors[candidates] @ query))[:k]]
+        hits += len(set(exact) & set(found))
+    return hits / (k * len(queries))
+
+
+def test_ivf_flat_recall_against_brute_force(data):
+    vectors, queries = data
+    index = build(vectors, nprobe=8)
+    assert sorted(np.concatenate(index._lists)) == list(range(len(vectors)))
+    assert recall(index, vectors, queries) >= 0.95
+    # Probing every list is exhaustive
+    for query in queries[:5]:
+        assert len(index.search(query, 10, nprobe=64)) == len(vectors)
+
+
+def test_ivf_pq_recall_against_brute_force(data):
+    vectors, queries = data
+    index = build(vectors, nprobe=8, pq_m=8, rerank_factor=10)
+    assert len(index.search(queries[0], 10)) == 100
+    assert recall(index, vectors, queries) >= 0.85
+
+
+def test_save_load_and_remap_keep_the_lists(data, tmp_path):
+    vectors, queries = data
+    index = build(vectors, nprobe=8, pq_m=8)
+    path = str(tmp_path / "ivf.npz")
+    index.save(path)
+    loaded = IVFIndex(32, nprobe=8).load(path)
+    for query in queries[:5]:
+        assert np.array_equal(loaded.search(query, 10), index.search(query, 10))
+
+    # Drop the even rows and renumber the rest
+    mapping = np.where(np.arange(len(vectors)) % 2 == 0, -1, np.arange(len(vectors)) // 2)
+    loaded.remap(mapping)
+    assert sorted(np.concatenate(loaded._lists)) == list(range(len(vectors) // 2))
+    assert all(len(rows) == len(codes) for rows, codes in zip(loaded._lists, loaded._codes))
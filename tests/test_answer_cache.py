@@ -0,0 +1,31 @@
+from src.answer_cache import SemanticAnswerCache, context_fingerprint, numeric_tokens
+
+
+def test_numeric_tokens():
+    assert numeric_tokens("Revenue in Q3 2023, up 4.5%?") == {"q3", "2023", "4.5"}
+
+
+def test_lookup_matches_similar_queries_with_the_same_numbers():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store([1.0, 0.0], "revenue in 2023", "What was revenue in 2023?", "10 crore", ["a", "b"], "rev-1")
+    entry = cache.lookup([0.99, 0.05], "revenue for 2023")
+    assert entry.answer == "10 crore" and entry.index_version == "rev-1"
+    assert entry.fingerprint == context_fingerprint(["b", "a"])
+    assert cache.lookup([0.99, 0.05], "revenue for 2024") is None
+    assert cache.lookup([0.0, 1.0], "revenue for 2023") is None
+
+    cache.record_hit(entry, "rev-2")
+    assert entry.hits == 1 and entry.index_version == "rev-2"
+    cache.discard(entry)
+    assert cache.lookup([1.0, 0.0], "revenue in 2023") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = SemanticAnswerCache(threshold=0.99, max_entries=2)
+    cache.store([1.0, 0.0, 0.0], "a", "a", "A", ["1"], "rev")
+    cache.store([0.0, 1.0, 0.0], "b", "b", "B", ["2"], "rev")
+    assert cache.lookup([1.0, 0.0, 0.0], "a").answer == "A"
+    cache.store([0.0, 0.0, 1.0], "c", "c", "C", ["3"], "rev")
+    assert cache.lookup([0.0, 1.0, 0.0], "b") is None
+    assert [cache.lookup(vector, query).answer for vector, query in (([1.0, 0.0, 0.0], "a"), ([0.0, 0.0, 1.0], "c"))] == ["A", "C"]
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from src.batch_engine import BatchEngine, StatusBoard, TokenBucket, is_transient
+from src.exception import CustomException
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def flaky(failures, error):
+    """A request that raises error on its first failures calls, then returns the call count."""
+    calls = []
+
+    def request():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return len(calls)
+
+    return request, calls
+
+
+def test_is_transient():
+    assert is_transient(TimeoutError())
+    assert is_transient(ConnectionResetError())
+    assert is_transient(HTTPError(429)) and is_transient(HTTPError(503))
+    assert not is_transient(HTTPError(400)) and not is_transient(HTTPError(401))
+    assert not is_transient(ValueError("bad input"))
+
+
+def test_token_bucket_limits_the_sustained_rate():
+    bucket = TokenBucket(rate=50, capacity=5)
+    started = time.monotonic()
+    for _ in range(15):
+        bucket.acquire()
+    # The first 5 are the burst, the other 10 come at 50 per second
+    assert 0.18 <= time.monotonic() - started < 1.0
+
+
+def test_call_retries_transient_failures():
+    engine = BatchEngine(max_retries=3, backoff_base=0.001)
+    request, calls = flaky(2, HTTPError(503))
+    assert engine.call("openai", request) == 3
+    assert engine.retries == 2
+
+
+def test_call_raises_other_failures_at_once():
+    engine = BatchEngine(max_retries=3, backoff_base=0.001)
+    request, calls = flaky(1, HTTPError(400))
+    with pytest.raises(CustomException):
+        engine.call("openai", request)
+    assert len(calls) == 1 and engine.retries == 0
+
+
+def test_call_gives_up_after_max_retries():
+    engine = BatchEngine(max_retries=2, backoff_base=0.001)
+    request, calls = flaky(10, TimeoutError("timed out"))
+    with pytest.raises(CustomException):
+        engine.call("openai", request)
+    assert len(calls) == 3
+
+
+def test_map_bounds_concurrency_and_keeps_input_order():
+    engine = BatchEngine(max_workers=3)
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def task(item):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01 * (item % 4))
+        with lock:
+            running[0] -= 1
+        if item == 5:
+            raise ValueError("bad item")
+        return item * 10
+
+    progress = []
+    results = engine.map(task, list(range(12)), on_progress=lambda p, r: progress.append(p))
+
+    assert 1 < peak[0] <= 3
+    assert [r.index for r in results] == list(range(12))
+    assert [r.value for r in results if r.ok] == [i * 10 for i in range(12) if i != 5]
+    assert isinstance(results[5].error, ValueError)
+    assert [p.done for p in progress] == list(range(1, 13))
+    assert progress[-1].failed == 1 and progress[-1].total == 12
+
+
+def test_status_board_times_items_until_a_final_status():
+    board = StatusBoard(["a.pdf", "b.pdf"])
+    board.update(0, "extracting")
+    board.update(0, "done", TAN="X")
+    board.update(1, "failed", Error="boom")
+    assert board.counts() == {"done": 1, "failed": 1}
+    done = board.rows(("done",))
+    assert [(row["File"], row["TAN"]) for row in done] == [("a.pdf", "X")]
+    assert done[0]["Seconds"] >= 0 and board.version == 3
@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("pinecone_text")
+nltk = pytest.importorskip("nltk")
+
+from src.bm25_store import NLTK_RESOURCES, IncrementalBM25Encoder
+
+try:
+    for resource in NLTK_RESOURCES.values():
+        nltk.data.find(resource)
+except LookupError:
+    pytest.skip("NLTK tokenizer data is not installed", allow_module_level=True)
+
+CORPUS = [
+    "Revenue from operations grew by twelve percent in the March quarter",
+    "GST filing is due on the twentieth, please share the purchase register",
+    "The vendor has revised the quote for the warehouse lease",
+]
+
+
+def statistics(encoder):
+    return encoder.n_docs, round(encoder.avgdl, 9), {idx: value for idx, value in encoder.doc_freq.items() if value}
+
+
+def test_partial_fit_matches_fit(tmp_path):
+    incremental = IncrementalBM25Encoder(str(tmp_path / "incremental.json"))
+    incremental.partial_fit(CORPUS[:1]).partial_fit(CORPUS[1:])
+    fitted = IncrementalBM25Encoder(str(tmp_path / "fitted.json")).fit(CORPUS)
+    assert statistics(incremental) == statistics(fitted)
+
+
+def test_remove_reverts_partial_fit(tmp_path):
+    encoder = IncrementalBM25Encoder(str(tmp_path / "bm25.json")).partial_fit(CORPUS[:2])
+    before = statistics(encoder)
+    encoder.partial_fit(CORPUS[2:]).remove(CORPUS[2:])
+    assert statistics(encoder) == before
+
+
+def test_save_and_reload(tmp_path):
+    path = str(tmp_path / "bm25.json")
+    encoder = IncrementalBM25Encoder(path).partial_fit(CORPUS)
+    encoder.save()
+    assert statistics(IncrementalBM25Encoder.load_or_seed(path)) == statistics(encoder)
+
+
+def test_rollback_on_error(tmp_path):
+    encoder = IncrementalBM25Encoder(str(tmp_path / "bm25.json")).partial_fit(CORPUS[:1])
+    before = statistics(encoder)
+    with pytest.raises(RuntimeError):
+        with encoder.rollback_on_error():
+            encoder.partial_fit(CORPUS[1:])
+            raise RuntimeError("upsert failed")
+    assert statistics(encoder) == before
@@ -0,0 +1,80 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.batch_engine import BatchEngine
+from src.challan_batching import BatchedChallanExtractor, BatchExtractionStats
+from src.challan_extractor import CHALLAN_FIELDS
+
+
+class FakeClient:
+    """Answers every chat completion with the next queued reply, raising it if it is an exception."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        self.prompts.append(messages[0]["content"])
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        message = SimpleNamespace(content=reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(prompt_tokens=100))
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+def fields(tan):
+    return {field: tan if field == "TAN" else "Not found" for field in CHALLAN_FIELDS}
+
+
+def extractor(client, single):
+    return BatchedChallanExtractor(client, single, count_tokens=lambda text: len(text.split()))
+
+
+BATCH = [("0", "TAN : A"), ("1", "TAN : B"), ("2", "TAN : C")]
+
+
+def test_only_documents_missing_from_the_response_are_retried():
+    client = FakeClient(json.dumps({"0": {"TAN": "A"}, "2": {"TAN": "C"}, "1": "garbled"}))
+    singles = []
+    stats = BatchExtractionStats()
+
+    results, errors = extractor(client, lambda text: singles.append(text) or fields("B")).extract_batch(BATCH, stats)
+
+    assert errors == {}
+    assert results == {"0": fields("A"), "1": fields("B"), "2": fields("C")}
+    assert singles == ["TAN : B"]
+    assert (stats.documents, stats.requests, stats.retried, stats.prompt_tokens) == (3, 2, 1, 100)
+
+
+def test_a_failed_request_fails_the_whole_batch():
+    singles = []
+    batched = extractor(FakeClient(BadRequest("invalid api key")), lambda text: singles.append(text) or fields("x"))
+
+    with pytest.raises(BadRequest):
+        batched.extract_batch(BATCH)
+    assert singles == []
+
+
+def test_transient_failures_are_retried_as_one_batch():
+    engine = BatchEngine(max_retries=2, backoff_base=0.001)
+    client = FakeClient(TimeoutError("read timed out"), json.dumps({doc_id: {"TAN": text[-1]} for doc_id, text in BATCH}))
+    singles = []
+    batched = BatchedChallanExtractor(
+        client,
+        lambda text: singles.append(text) or fields("x"),
+        call=lambda func, *args, **kwargs: engine.call("openai", func, *args, **kwargs),
+        count_tokens=lambda text: len(text.split()),
+    )
+
+    results, errors = batched.extract_batch(BATCH)
+
+    assert errors == {} and singles == []
+    assert results == {"0": fields("A"), "1": fields("B"), "2": fields("C")}
+    assert len(client.prompts) == 2 and engine.retries == 1
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from src.challan_cache import ChallanCache, extraction_version, file_digest
+
+SAMPLES = os.path.join(os.path.dirname(__file__), os.pardir, "artifacts", "Test Challan pdfs")
+
+
+def test_extracted_fields_are_keyed_by_file_and_version(tmp_path):
+    path = str(tmp_path / "challans.sqlite")
+    digest = file_digest(b"%PDF receipt")
+    cache = ChallanCache(path, extraction_version("prompt v1", "gpt-4o-mini"))
+    assert cache.get_extracted(digest) is None
+    cache.put_extracted(digest, {"TAN": "PNES24586C"}, "local")
+    cache.put_parsed(digest, "| TAN | PNES24586C |")
+
+    reopened = ChallanCache(path, extraction_version("prompt v1", "gpt-4o-mini"))
+    assert reopened.get_extracted(digest) == ({"TAN": "PNES24586C"}, "local")
+    assert reopened.get_extracted(file_digest(b"%PDF other")) is None
+    assert reopened.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "parsed": 1, "extracted": 1}
+
+    # A prompt change invalidates the fields but keeps the parsed markdown
+    changed = ChallanCache(path, extraction_version("prompt v2", "gpt-4o-mini"))
+    assert changed.get_extracted(digest) is None
+    assert changed.get_parsed(digest) == "| TAN | PNES24586C |"
+    assert ChallanCache(path, changed.version, parser_name="other-parser").get_parsed(digest) is None
+
+
+def test_processor_serves_known_files_from_the_cache(tmp_path):
+    pytest.importorskip("pymupdf")
+    from src.challan_pipeline import CURRENT_VERSION, ChallanProcessor
+
+    files = []
+    for file_name in sorted(os.listdir(SAMPLES))[:2]:
+        with open(os.path.join(SAMPLES, file_name), "rb") as file_obj:
+            files.append((file_obj.read(), file_name))
+    cache = ChallanCache(str(tmp_path / "challans.sqlite"), CURRENT_VERSION)
+    processor = ChallanProcessor(openai_api_key="unused", llama_cloud_api_key="unused", cache=cache)
+
+    board, errors, requests = processor.process(files)
+    assert errors == {} and requests == 0
+    assert board.counts() == {"done": 2}
+
+    # Same bytes under another name are still a cache hit
+    renamed = [(pdf_data, f"copy of {file_name}") for pdf_data, file_name in files]
+    cached_board, errors, requests = processor.process(renamed)
+    assert errors == {} and requests == 0
+    assert cached_board.counts() == {"cached": 2}
+    strip = lambda rows: [{k: v for k, v in row.items() if k not in ("File", "Status", "Seconds")} for row in rows]
+    assert strip(cached_board.rows()) == strip(board.rows())
+    assert cache.stats()["hits"] == 2
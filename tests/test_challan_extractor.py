@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+pytest.importorskip("pymupdf")
+
+from src.challan_extractor import extract_challan_fields, pdf_text
+
+SAMPLES = os.path.join(os.path.dirname(__file__), os.pardir, "artifacts", "Test Challan pdfs")
+COMMON = {
+    "ITNS No.": "281",
+    "TAN": "PNES24586C",
+    "Name": "SIDDHI VINAYAK AGRI PROCESSING PVT LTD",
+    "Assessment Year": "2025-26",
+    "Financial Year": "2024-25",
+    "Date of Deposit": "07-Aug-2024",
+}
+
+
+@pytest.mark.parametrize(
+    "file_name, amount, cin, challan_no",
+    [
+        ("194A JUNE 2024 _ChallanReceipt.pdf", "4,17,914", "24080701340026BKID", "11861"),
+        ("194C JUNE 2024_ChallanReceipt.pdf", "1,45,519", "24080701505487BKID", "13587"),
+        ("194I JUNE 2024_ChallanReceipt.pdf", "78,636", "24080701469295BKID", "13247"),
+    ],
+)
+def test_extract_challan_fields_on_sample_receipts(file_name, amount, cin, challan_no):
+    with open(os.path.join(SAMPLES, file_name), "rb") as file_obj:
+        fields, problems = extract_challan_fields(pdf_text(file_obj.read()))
+    assert problems == []
+    assert fields == {**COMMON, "Amount (In Rs.)": amount, "CIN": cin, "Challan No.": challan_no}
+
+
+def test_extract_challan_fields_reports_missing_fields():
+    fields, problems = extract_challan_fields("TAN : PNES24586C\nAmount (In Rs.) : 1,000")
+    assert fields["TAN"] == "PNES24586C"
+    assert fields["CIN"] == "Not found"
+    assert "CIN" in problems and "TAN" not in problems
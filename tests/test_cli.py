@@ -0,0 +1,51 @@
+import threading
+
+import pandas as pd
+
+from src.cli import Checkpoint, main
+from src.ingestion import UpsertReport
+
+
+def test_checkpoint_resumes(tmp_path):
+    path = str(tmp_path / "report.csv.checkpoint.jsonl")
+    checkpoint = Checkpoint(path)
+    checkpoint.add("digest-1", {"file": "a.pdf", "status": "done"})
+    checkpoint.add("digest-2", {"file": "b.pdf", "status": "done"})
+
+    resumed = Checkpoint(path)
+    assert "digest-1" in resumed and "digest-2" in resumed and "digest-3" not in resumed
+    assert resumed.records["digest-1"] == {"file": "a.pdf", "status": "done", "digest": "digest-1"}
+
+
+def test_checkpoint_skips_line_cut_short(tmp_path):
+    path = tmp_path / "report.csv.checkpoint.jsonl"
+    Checkpoint(str(path)).add("digest-1", {"file": "a.pdf"})
+    with open(path, "a", encoding="utf-8") as file_obj:
+        file_obj.write('{"file": "b.pdf", "dig')
+    assert set(Checkpoint(str(path)).records) == {"digest-1"}
+
+
+def test_checkpoint_restart_discards_records(tmp_path):
+    path = str(tmp_path / "report.csv.checkpoint.jsonl")
+    Checkpoint(path).add("digest-1", {"file": "a.pdf"})
+    assert "digest-1" not in Checkpoint(path, restart=True)
+
+
+def test_ingest_syncs_sources_on_the_worker_pool(tmp_path, monkeypatch):
+    sources = tmp_path / "chats"
+    sources.mkdir()
+    for n in range(2):
+        (sources / f"chat{n}.txt").write_text(f"12/03/24, 10:0{n} am - Asha: invoice {n} sent\n", encoding="utf-8")
+    both_syncing = threading.Barrier(2, timeout=10)
+
+    class Ingestor:
+        def upsert_stream(self, chunks, source_id):
+            chunks = list(chunks)
+            # Returns only once both sources are being synced at the same time
+            both_syncing.wait()
+            return UpsertReport(chunks=len(chunks), skipped=0, deleted=0, seconds=0.0)
+
+    monkeypatch.setattr("src.cli.build_ingestor", lambda backend, index_name: Ingestor())
+    output = str(tmp_path / "ingest.csv")
+    assert main(["ingest", str(sources), "--output", output, "--workers", "2"]) == 0
+    assert sorted(pd.read_csv(output)["source_id"]) == ["whatsapp:chat0.txt", "whatsapp:chat1.txt"]
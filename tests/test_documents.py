@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from src.documents import whatsapp_messages
+
+EXPORT = """\
+12/03/24, 9:15 am - Messages and calls are end-to-end encrypted.
+12/03/24, 9:16 am - Asha: Did the invoice for the March order go out?
+It should include the freight charges
+and the revised GST rate
+12/03/24, 9:20 am - Ravi: <Media omitted>
+12/03/24, 9:21 pm - Ravi: Payment received: 4,52,000
+[13/03/2024, 10:05:30] Asha: Thanks
+""".splitlines(keepends=True)
+
+
+def test_whatsapp_messages_joins_continuation_lines():
+    messages = list(whatsapp_messages(EXPORT))
+    assert [(sender, text) for _, _, sender, text in messages] == [
+        ("Asha", "Did the invoice for the March order go out?\nIt should include the freight charges\nand the revised GST rate"),
+        ("Ravi", "Payment received: 4,52,000"),
+        ("Asha", "Thanks"),
+    ]
+
+
+def test_whatsapp_messages_parses_timestamps():
+    timestamps = [timestamp for timestamp, _, _, _ in whatsapp_messages(EXPORT)]
+    assert timestamps == [datetime(2024, 3, 12, 9, 16), datetime(2024, 3, 12, 21, 21), datetime(2024, 3, 13, 10, 5, 30)]
+
+
+def test_whatsapp_messages_month_first():
+    lines = ["03/12/24, 9:16 AM - Asha: Hello\n", "03/13/24, 9:17 AM - Ravi: Hi\n"]
+    assert [timestamp.date() for timestamp, _, _, _ in whatsapp_messages(lines, dayfirst=False)] == [
+        datetime(2024, 3, 12).date(),
+        datetime(2024, 3, 13).date(),
+    ]
+
+
+def test_whatsapp_messages_ignores_text_before_first_message():
+    assert list(whatsapp_messages(["stray line\n", "\n"])) == []
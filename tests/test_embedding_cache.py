@@ -0,0 +1,43 @@
+from src.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings:
+    model = "fake-embedding"
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), float(sum(map(ord, text)))] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_repeated_texts_are_served_from_the_cache(tmp_path):
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, str(tmp_path))
+    first = cache.embed_documents(["gst challan", "bank  statement", "gst challan"])
+    assert model.embedded == ["gst challan", "bank  statement"]
+    # Whitespace is normalized in keys, and queries share the cache with documents
+    assert cache.embed_documents(["bank statement"]) == [first[1]]
+    assert cache.embed_query("gst challan") == first[0]
+    assert model.embedded == ["gst challan", "bank  statement"]
+    assert (cache.hits, cache.misses) == (2, 3)
+
+    reopened = CachedEmbeddings(model, str(tmp_path))
+    assert reopened.embed_query("gst challan") == first[0] and reopened.hits == 1
+
+
+def test_least_recently_used_vectors_are_evicted(tmp_path):
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, str(tmp_path), max_entries=2)
+    cache.embed_documents(["a", "b"])
+    cache.embed_query("a")
+    cache.embed_query("c")
+    assert cache.evictions == 1 and cache.stats()["entries"] == 2
+    model.embedded.clear()
+    # "b" was evicted, and the reused row now holds the vector of "c"
+    assert cache.embed_documents(["a", "c", "b"]) == CountingEmbeddings().embed_documents(["a", "c", "b"])
+    assert model.embedded == ["b"]
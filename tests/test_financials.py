@@ -0,0 +1,61 @@
+import math
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("openpyxl")
+
+from src.financials import aggregate_sheet, build_report, compute_financials, merge_partials
+
+WORKBOOK = os.path.join(
+    os.path.dirname(__file__), os.pardir, "artifacts", "Test Excel files", "sample_financial_analysis_data.xlsx"
+)
+
+
+@pytest.fixture(scope="module")
+def sheets():
+    return pd.read_excel(WORKBOOK, sheet_name=None)
+
+
+def test_compute_financials_on_sample_workbook(sheets):
+    metrics = compute_financials(sheets).metrics
+    assert metrics["total_revenue"] == pytest.approx(2_275_317.05)
+    assert metrics["total_cogs"] == pytest.approx(1_585_838.36)
+    assert metrics["gross_margin"] == pytest.approx(689_478.69)
+    assert metrics["total_expenses"] == pytest.approx(5_149_547.95)
+    assert metrics["operating_income"] == pytest.approx(metrics["gross_margin"] - metrics["total_expenses"])
+    # Each balance sheet line counts with its latest dated value
+    assert metrics["total_assets"] == pytest.approx(229_253.51)
+    assert metrics["total_liabilities"] == pytest.approx(378_864.54)
+    assert metrics["equity"] == pytest.approx(-149_611.03)
+    # Liabilities exceed assets, where debt to equity has no meaning
+    assert math.isnan(metrics["debt_to_equity"])
+
+
+def test_chunked_aggregation_matches_whole_sheet(sheets):
+    expected = compute_financials(sheets)
+    partials = [
+        aggregate_sheet(kind, df.iloc[start : start + 97])
+        for kind, df in [("sales", sheets["Sales Data"]), ("balance", sheets["Balance Sheet Data"])]
+        for start in range(0, len(df), 97)
+    ]
+    partials += [aggregate_sheet("cogs", sheets["COGS"]), aggregate_sheet("expenses", sheets["Expenses"])]
+    report = build_report(merge_partials(partials))
+    for name, value in expected.metrics.items():
+        assert report.metrics[name] == pytest.approx(value, nan_ok=True), name
+    pd.testing.assert_frame_equal(report.tables["by_period"], expected.tables["by_period"])
+
+
+def test_balance_type_labels_are_normalised():
+    balance = pd.DataFrame(
+        {
+            "Type": ["ASSETS", "asset", "Liabilities", "liability ", "Equity"],
+            "Description": ["Cash", "Inventory", "Loan", "Accounts Payable", "Share Capital"],
+            "Value": [100.0, 50.0, 60.0, 30.0, 60.0],
+        }
+    )
+    metrics = build_report(merge_partials([aggregate_sheet("balance", balance)])).metrics
+    assert metrics["total_assets"] == 150.0
+    assert metrics["total_liabilities"] == 90.0
+    assert metrics["debt_to_equity"] == 1.5
@@ -0,0 +1,54 @@
+from src.ingestion import IngestionManifest, estimate_vector_bytes, size_bounded_batches
+
+
+def vector(index, dimension=8, text="chunk"):
+    return {"id": f"id-{index}", "values": [0.1] * dimension, "metadata": {"text": text}}
+
+
+def test_size_bounded_batches_caps_vector_count():
+    batches = list(size_bounded_batches([vector(i) for i in range(250)], max_vectors=100))
+    assert [len(batch) for batch in batches] == [100, 100, 50]
+    assert [v["id"] for batch in batches for v in batch] == [f"id-{i}" for i in range(250)]
+
+
+def test_size_bounded_batches_caps_payload_bytes():
+    vectors = [vector(i, dimension=1536) for i in range(10)]
+    max_bytes = 3 * estimate_vector_bytes(vectors[0])
+    batches = list(size_bounded_batches(vectors, max_vectors=100, max_bytes=max_bytes))
+    assert [len(batch) for batch in batches] == [3, 3, 3, 1]
+    assert all(sum(estimate_vector_bytes(v) for v in batch) <= max_bytes for batch in batches)
+
+
+def test_size_bounded_batches_keeps_oversized_vector_alone():
+    vectors = [vector(0), vector(1, text="x" * 10_000), vector(2)]
+    batches = list(size_bounded_batches(vectors, max_bytes=1000))
+    assert [[v["id"] for v in batch] for batch in batches] == [["id-0"], ["id-1"], ["id-2"]]
+
+
+def test_size_bounded_batches_empty():
+    assert list(size_bounded_batches([])) == []
+
+
+def test_manifest_diff(tmp_path):
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    assert manifest.diff("pdf:a.pdf", ["1", "2", "2"]) == (["1", "2"], [])
+
+    manifest.record("pdf:a.pdf", ["1", "2", "3"])
+    new_ids, stale_ids = manifest.diff("pdf:a.pdf", ["2", "4", "3", "5"])
+    assert new_ids == ["4", "5"]
+    assert stale_ids == ["1"]
+    # Other sources are unaffected
+    assert manifest.diff("pdf:b.pdf", ["1"]) == (["1"], [])
+
+
+def test_manifest_persists_and_merges_other_processes(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    first, second = IngestionManifest(path), IngestionManifest(path)
+    first.record("pdf:a.pdf", ["1", "2"])
+    second.record("whatsapp:chat.txt", ["3"])
+
+    reopened = IngestionManifest(path)
+    assert reopened.indexed("pdf:a.pdf") == {"1", "2"}
+    assert reopened.indexed("whatsapp:chat.txt") == {"3"}
+    assert first.diff("whatsapp:chat.txt", ["3"]) == ([], [])
+    assert first.revision == second.revision == reopened.revision
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from src.ingestion import IngestionManifest, UpsertReport, chunk_id
+from src.ingestion_jobs import IngestionJobs, source_digest
+
+
+class FakeIngestor:
+    """Records the chunks of each source in a real manifest, optionally holding every sync until released."""
+
+    def __init__(self, path, hold=False):
+        self.manifest = IngestionManifest(path)
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+        self.syncs = []
+
+    def upsert_stream(self, chunks, source_id):
+        texts = [text for text, _ in chunks]
+        self.release.wait(5)
+        self.syncs.append((source_id, texts))
+        if not texts:
+            raise ValueError("No messages found")
+        self.manifest.record(source_id, [chunk_id(source_id, text) for text in texts])
+        return UpsertReport(chunks=len(texts), requests=1)
+
+
+def export(*messages):
+    return "".join(f"12/03/2024, 10:{minute:02d} - Asha: {text}\n" for minute, text in enumerate(messages)).encode("utf-8")
+
+
+def wait_for(jobs, key, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while jobs.status(key).state in ("queued", "running"):
+        assert time.monotonic() < deadline, f"{key} did not finish"
+        time.sleep(0.01)
+    return jobs.status(key)
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    jobs = IngestionJobs(FakeIngestor(str(tmp_path / "manifest.json"), hold=True), splitter=None, max_workers=2)
+    yield jobs
+    jobs.ingestor.release.set()
+    jobs.shutdown()
+
+
+def test_the_same_content_is_ingested_once(jobs):
+    chat = export("Invoice sent", "Paid")
+    key = jobs.submit("whatsapp", "whatsapp:chat.txt", chat)
+    assert jobs.submit("whatsapp", "whatsapp:chat.txt", chat, digest=source_digest("whatsapp", chat)) == key
+
+    jobs.ingestor.release.set()
+    job = wait_for(jobs, key)
+    assert (job.state, job.chunks, job.report.chunks, job.error) == ("done", 1, 1, None)
+    assert job.indexed == jobs.ingestor.manifest.fingerprint("whatsapp:chat.txt")
+
+    assert jobs.submit("whatsapp", "whatsapp:chat.txt", chat) == key
+    time.sleep(0.05)
+    assert len(jobs.ingestor.syncs) == 1
+
+
+def test_sources_are_ingested_concurrently(jobs):
+    first = jobs.submit("whatsapp", "whatsapp:a.txt", export("a"))
+    second = jobs.submit("whatsapp", "whatsapp:b.txt", export("b"))
+    third = jobs.submit("whatsapp", "whatsapp:c.txt", export("c"))
+    deadline = time.monotonic() + 5
+    while [jobs.status(key).state for key in (first, second)] != ["running", "running"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert jobs.status(third).state == "queued"
+
+    jobs.ingestor.release.set()
+    assert [wait_for(jobs, key).state for key in (first, second, third)] == ["done"] * 3
+
+
+def test_replaced_sources_are_ingested_again(jobs):
+    jobs.ingestor.release.set()
+    old, new = export("Draft total 100"), export("Final total 120")
+    old_key = jobs.submit("whatsapp", "whatsapp:chat.txt", old)
+    wait_for(jobs, old_key)
+    new_key = jobs.submit("whatsapp", "whatsapp:chat.txt", new)
+    assert new_key != old_key
+    wait_for(jobs, new_key)
+
+    # The old export's chunks were replaced, so its job no longer counts as indexed
+    assert jobs.submit("whatsapp", "whatsapp:chat.txt", old) == old_key
+    wait_for(jobs, old_key)
+    assert [texts for _, texts in jobs.ingestor.syncs] == [
+        ["12/03/2024 Asha: Draft total 100"],
+        ["12/03/2024 Asha: Final total 120"],
+        ["12/03/2024 Asha: Draft total 100"],
+    ]
+
+
+def test_failed_jobs_are_retried_and_old_jobs_forgotten(tmp_path):
+    jobs = IngestionJobs(FakeIngestor(str(tmp_path / "manifest.json")), splitter=None, max_workers=1, max_jobs=2)
+    try:
+        empty = jobs.submit("whatsapp", "whatsapp:empty.txt", b"no messages here\n")
+        failed = wait_for(jobs, empty)
+        assert (failed.state, failed.error) == ("failed", "No messages found")
+        assert jobs.submit("whatsapp", "whatsapp:empty.txt", b"no messages here\n") == empty
+        wait_for(jobs, empty)
+        assert len(jobs.ingestor.syncs) == 2
+
+        keys = []
+        for i in range(3):
+            keys.append(jobs.submit("whatsapp", f"whatsapp:{i}.txt", export(str(i))))
+            wait_for(jobs, keys[-1])
+        deadline = time.monotonic() + 5
+        while jobs.status(keys[0]) is not None:  # Pruned right after the last job is marked done
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert jobs.status(empty) is None and jobs.status(keys[0]) is None
+        assert jobs.status(keys[2]).state == "done"
+        with pytest.raises(ValueError):
+            jobs.submit("email", "email:1", b"")
+    finally:
+        jobs.shutdown()
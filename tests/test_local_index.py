@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+
+from src.local_index import LocalHybridIndex
+
+DIMENSION = 8
+
+
+def records(ids, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "id": f"chunk-{i}",
+            "values": rng.standard_normal(DIMENSION).astype(np.float32),
+            "sparse_values": {"indices": [i % 5, 7], "values": [0.5, 0.25]},
+            "metadata": {"text": f"chunk {i}"},
+        }
+        for i in ids
+    ]
+
+
+def query(index):
+    vector = np.linspace(-1, 1, DIMENSION, dtype=np.float32)
+    result = index.query(vector=vector, sparse_vector={"indices": [3, 7], "values": [1.0, 1.0]}, top_k=50)
+    return [(match["id"], round(match["score"], 5)) for match in result["matches"]]
+
+
+def test_query_skips_deleted_rows_and_never_returns_infinite_scores():
+    index = LocalHybridIndex(dimension=DIMENSION)
+    index.upsert(records(range(4)))
+    index.delete(["chunk-1"])
+    matches = query(index)
+    assert sorted(vector_id for vector_id, _ in matches) == ["chunk-0", "chunk-2", "chunk-3"]
+    assert all(np.isfinite(score) for _, score in matches)
+
+
+def test_flush_appends_segments_that_replay_on_load(tmp_path):
+    path = str(tmp_path / "index")
+    index = LocalHybridIndex(path, dimension=DIMENSION)
+    index.upsert(records(range(10)))
+    index.flush()
+    assert not [name for name in os.listdir(path) if name.startswith("segment-")]
+
+    index.upsert(records(range(10, 12), seed=1))
+    index.delete(["chunk-1", "chunk-11"])
+    index.upsert(records([1], seed=2))
+    index.flush()
+    index.delete(["chunk-2"])
+    index.flush()
+    assert len([name for name in os.listdir(path) if name.startswith("segment-")]) == 2
+
+    reopened = LocalHybridIndex(path, dimension=DIMENSION)
+    assert len(reopened) == len(index) == 10
+    assert query(reopened) == query(index)
+    assert reopened.fetch(["chunk-1"]) == index.fetch(["chunk-1"])
+
+
+def test_flush_saves_the_whole_index_once_segments_outgrow_it(tmp_path):
+    path = str(tmp_path / "index")
+    index = LocalHybridIndex(path, dimension=DIMENSION)
+    index.upsert(records(range(4)))
+    index.flush()
+    index.upsert(records(range(4, 8)))
+    index.flush()
+    index.upsert(records(range(8, 10)))
+    index.flush()
+    assert not [name for name in os.listdir(path) if name.startswith("segment-")]
+    assert len(LocalHybridIndex(path, dimension=DIMENSION)) == 10
+
+
+def test_writers_sharing_a_directory_keep_each_others_records(tmp_path):
+    # Two instances on one path stand in for the app and the CLI writing the same index
+    path = str(tmp_path / "index")
+    app = LocalHybridIndex(path, dimension=DIMENSION)
+    app.upsert(records(range(4)))
+    app.flush()
+    cli = LocalHybridIndex(path, dimension=DIMENSION)
+    cli.upsert(records(range(4, 6), seed=1))
+    cli.flush()
+    app.upsert(records(range(6, 8), seed=2))
+    app.delete(["chunk-0"])
+    app.flush()
+    cli.upsert(records(range(8, 10), seed=3))
+    cli.save()
+    app.upsert(records([10], seed=4))
+    app.flush()
+
+    expected = {f"chunk-{i}" for i in range(1, 11)}
+    assert set(LocalHybridIndex(path, dimension=DIMENSION)._rows) == expected
+    # A reader picks up the other writer's changes on its next query
+    assert {vector_id for vector_id, _ in query(cli)} == expected
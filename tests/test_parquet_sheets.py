@@ -0,0 +1,79 @@
+import datetime
+import os
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+openpyxl = pytest.importorskip("openpyxl")
+
+from src.parquet_sheets import ParquetSheet, csv_to_parquet, excel_row_counts, excel_sheet_to_parquet
+from src.workbook_store import WorkbookStore
+
+WORKBOOK = os.path.join(
+    os.path.dirname(__file__), os.pardir, "artifacts", "Test Excel files", "sample_financial_analysis_data.xlsx"
+)
+
+
+def workbook_bytes(rows):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Ledger"
+    for row in rows:
+        sheet.append(row)
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def test_sheet_is_streamed_in_chunks_with_types_from_the_first(tmp_path):
+    header = ("Date", "Amount", None, "Amount", "Posted")
+    rows = [(datetime.datetime(2024, 1, 1 + i), i, f"note {i}", i * 1.5, i % 2 == 0) for i in range(25)]
+    rows[20] = (datetime.datetime(2024, 1, 21), "n/a", "late", 30.0, True)  # Text in a numeric column
+    data = workbook_bytes([header] + rows)
+    path = str(tmp_path / "ledger.parquet")
+
+    assert excel_row_counts(data) == {"Ledger": 25}
+    assert excel_sheet_to_parquet(data, "Ledger", path, chunk_rows=10) == 25
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".partial")]
+
+    sheet = ParquetSheet(path, batch_rows=7)
+    assert len(sheet) == 25
+    assert sheet.columns == ["Date", "Amount", "Unnamed: 2", "Amount.1", "Posted"]
+    chunks = list(sheet.chunks())
+    assert [len(chunk) for chunk in chunks] == [7, 7, 7, 4]
+    df = pd.concat(chunks, ignore_index=True)
+    assert df["Amount"].isna().tolist() == [i == 20 for i in range(25)]
+    assert df["Amount"].dropna().tolist() == [float(i) for i in range(25) if i != 20]
+    assert df["Date"].iloc[-1] == pd.Timestamp(2024, 1, 25)
+    assert df["Posted"].tolist() == [row[4] for row in rows]
+    assert list(next(sheet.chunks(columns=["Amount.1"])).columns) == ["Amount.1"]
+    assert sheet.head(3)["Unnamed: 2"].tolist() == ["note 0", "note 1", "note 2"]
+
+
+def test_csv_is_streamed_block_by_block(tmp_path):
+    df = pd.DataFrame({"Account": [f"acct-{i % 13}" for i in range(5000)], "Value": range(5000)})
+    path = str(tmp_path / "ledger.parquet")
+    assert csv_to_parquet(df.to_csv(index=False).encode("utf-8"), path, block_bytes=4096) == 5000
+    streamed = pd.concat(ParquetSheet(path, batch_rows=1000).chunks(), ignore_index=True)
+    pd.testing.assert_frame_equal(streamed, df, check_dtype=False)
+
+
+def test_large_sheets_are_processed_from_disk_with_the_same_results(tmp_path):
+    from src.financials import compute_financials
+
+    with open(WORKBOOK, "rb") as file_obj:
+        data = file_obj.read()
+    in_memory = WorkbookStore(str(tmp_path / "memory")).open(data)
+    out_of_core = WorkbookStore(str(tmp_path / "disk"), max_rows_in_memory=50).open(data)
+
+    assert not any(in_memory.is_large(name) for name in in_memory.sheet_names)
+    assert out_of_core.is_large("Sales Data")
+    sales = out_of_core.load("Sales Data")
+    assert isinstance(sales, ParquetSheet) and len(sales) == len(in_memory.sheet("Sales Data"))
+
+    expected = compute_financials({name: in_memory.load(name) for name in in_memory.sheet_names}).metrics
+    streamed = compute_financials({name: out_of_core.load(name) for name in out_of_core.sheet_names}).metrics
+    for name, value in expected.items():
+        assert streamed[name] == pytest.approx(value, nan_ok=True), name
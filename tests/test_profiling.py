@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.profiling import ProfileConfig, frame_chunks, profile_chunks, resolve_mode, stratified_sample, write_profile_report
+
+
+@pytest.fixture(scope="module")
+def sheet():
+    rng = np.random.default_rng(3)
+    rows = 5000
+    amount = rng.normal(1000, 250, rows)
+    amount[rng.choice(rows, 300, replace=False)] = np.nan
+    return pd.DataFrame(
+        {
+            "amount": amount,
+            "fee": 0.02 * np.nan_to_num(amount) + rng.normal(0, 1, rows),
+            "units": rng.integers(-5, 50, rows),
+            "account": rng.choice(["savings", "current", "loan"], rows, p=[0.7, 0.29, 0.01]),
+            "opened": pd.date_range("2020-01-01", periods=rows, freq="h"),
+        }
+    )
+
+
+def test_resolve_mode():
+    assert resolve_mode(1000, 10, ProfileConfig(mode="auto", full_max_cells=10_000)) == "full"
+    assert resolve_mode(5000, 10, ProfileConfig(mode="auto", full_max_cells=10_000)) == "minimal"
+    # A small enough sample is profiled in full
+    assert resolve_mode(5000, 10, ProfileConfig(mode="auto", full_max_cells=10_000, sample_rows=500)) == "full"
+    assert resolve_mode(10, 1, ProfileConfig(mode="minimal")) == "minimal"
+    with pytest.raises(ValueError):
+        resolve_mode(10, 1, ProfileConfig(mode="fast"))
+
+
+@pytest.mark.parametrize("chunk_rows, workers", [(5000, 1), (333, 1), (333, 4)])
+def test_chunked_statistics_match_pandas(sheet, chunk_rows, workers):
+    result = profile_chunks(frame_chunks(sheet, chunk_rows), ProfileConfig(workers=workers, bins=10))
+
+    assert result.rows == len(sheet)
+    columns = result.columns
+    for column in ("amount", "fee", "units"):
+        assert columns.loc[column, "missing"] == sheet[column].isna().sum()
+        assert columns.loc[column, "mean"] == pytest.approx(sheet[column].mean())
+        assert columns.loc[column, "std"] == pytest.approx(sheet[column].std())
+        assert columns.loc[column, "min"] == sheet[column].min()
+        assert columns.loc[column, "max"] == sheet[column].max()
+    assert columns.loc["units", "negatives"] == (sheet["units"] < 0).sum()
+    assert columns.loc["account", "distinct"] == 3
+    assert columns.loc["opened", "max"] == sheet["opened"].max()
+    assert result.top_values["account"] == list(sheet["account"].value_counts().items())
+
+    expected = sheet[["amount", "fee", "units"]].corr()
+    np.testing.assert_allclose(result.correlations.loc[expected.index, expected.columns], expected, atol=1e-9)
+    counts, edges = result.histograms["amount"]
+    assert counts.sum() == sheet["amount"].notna().sum()
+    np.testing.assert_array_equal(counts, np.histogram(sheet["amount"].dropna(), bins=edges)[0])
+
+
+def test_distinct_values_stop_being_counted_past_the_cap(sheet):
+    result = profile_chunks(frame_chunks(sheet.astype({"units": str}), 500), ProfileConfig(max_distinct=20, workers=1))
+    assert result.columns.loc["units", "distinct"] == ">20"
+    assert len(result.top_values["units"]) == 10
+
+
+def test_stratified_sample_keeps_rare_groups(sheet):
+    sample, summary = stratified_sample(sheet, 200, stratify_by="account", seed=1)
+
+    assert summary.strata == 3 and summary.population_rows == len(sheet)
+    assert abs(len(sample) - 200) <= 3 and summary.sample_rows == len(sample)
+    assert set(sample["account"]) == {"savings", "current", "loan"}
+    assert sample.index.is_monotonic_increasing
+    errors = summary.errors.loc["amount"]
+    assert abs(errors["estimated_mean"] - sheet["amount"].mean()) < 3 * errors["standard_error"]
+    assert errors["margin_95"] == pytest.approx(1.96 * errors["standard_error"])
+
+
+def test_minimal_report_covers_every_row(sheet, tmp_path):
+    path = str(tmp_path / "report.html")
+    assert write_profile_report(sheet, path, ProfileConfig(mode="minimal", chunk_rows=1000), title="Ledger") == "minimal"
+    with open(path, encoding="utf-8") as file_obj:
+        report = file_obj.read()
+    assert "<h1>Ledger</h1>" in report and "5,000 rows, 5 columns" in report
+
+
+def test_parquet_sheets_are_always_profiled_chunk_by_chunk(sheet, tmp_path):
+    pytest.importorskip("pyarrow")
+    from src.parquet_sheets import ParquetSheet
+
+    parquet_path = str(tmp_path / "sheet.parquet")
+    sheet.to_parquet(parquet_path, row_group_size=700)
+    path = str(tmp_path / "report.html")
+    assert write_profile_report(ParquetSheet(parquet_path), path, ProfileConfig(mode="full", chunk_rows=700)) == "minimal"
+    with open(path, encoding="utf-8") as file_obj:
+        assert "5,000 rows" in file_obj.read()
@@ -0,0 +1,72 @@
+import threading
+
+from langchain_core.documents import Document
+
+from src.query_pipeline import QueryPipeline, merge_documents
+
+
+def documents(*ids):
+    return [Document(page_content=f"chunk {i}", metadata={"chunk_id": i}) for i in ids]
+
+
+def chunk_ids(docs):
+    return [doc.metadata["chunk_id"] for doc in docs]
+
+
+def test_merge_documents_takes_sets_in_turn_without_duplicates():
+    merged = merge_documents(documents("a", "b", "c"), documents("b", "d"))
+    assert chunk_ids(merged) == ["a", "b", "d", "c"]
+    assert chunk_ids(merge_documents(documents("a", "b", "c"), documents("d", "e"), limit=3)) == ["a", "d", "b"]
+
+
+def rank_score(candidates, query):
+    """Scores chunks of the query first, then by their position in the retrieval."""
+    return [(10 if doc.metadata["chunk_id"].startswith(query) else 0) - int(doc.metadata["chunk_id"][-1]) for doc in candidates]
+
+
+def test_rewrite_path_reranks_at_most_max_candidates():
+    scored = []
+
+    def score(candidates, query):
+        scored.append((chunk_ids(candidates), query))
+        return rank_score(candidates, query)
+
+    pipeline = QueryPipeline(
+        rewrite=lambda query: " improved ",
+        retrieve=lambda query: documents(*(f"{query.strip()}-{i}" for i in range(5))),
+        score=score,
+        skip_rewrite=lambda query: False,
+        max_candidates=5,
+        top_n=2,
+    )
+    result = pipeline.run("raw")
+    assert result.rewritten and result.query == "improved"
+    assert chunk_ids(result.documents) == ["improved-0", "improved-1"]
+    # The raw candidates are scored against the rewrite, then only the merged chunks of the rewritten query
+    assert sorted(scored) == [
+        (["improved-0", "improved-1", "improved-2"], "improved"),
+        (["raw-0", "raw-1", "raw-2", "raw-3", "raw-4"], "improved"),
+    ]
+    assert chunk_ids(pipeline.replay("raw", "improved")) == ["improved-0", "improved-1"]
+
+
+def test_raw_candidates_are_scored_while_the_rewritten_query_is_retrieved():
+    raw_scored = threading.Event()
+
+    def retrieve(query):
+        if query == "improved":
+            # Only returns once the raw candidates were scored, which deadlocks if that waits for it
+            assert raw_scored.wait(timeout=5)
+        return documents(f"{query}-0", "shared-1")
+
+    def score(candidates, query):
+        if "raw-0" in chunk_ids(candidates):
+            raw_scored.set()
+        return rank_score(candidates, query)
+
+    pipeline = QueryPipeline(
+        rewrite=lambda query: "improved", retrieve=retrieve, score=score, skip_rewrite=lambda query: False
+    )
+    result = pipeline.run("raw")
+    assert chunk_ids(result.documents) == ["improved-0", "raw-0", "shared-1"]
+    assert "rerank_raw" in result.timings and "rerank_rewritten" in result.timings
@@ -0,0 +1,42 @@
+import time
+
+import pandas as pd
+
+from src.profiling import ProfileConfig
+from src.report_jobs import ReportJobs
+
+CONFIG = ProfileConfig(mode="minimal", workers=1)
+
+
+def wait(condition):
+    for _ in range(600):
+        result = condition()
+        if result:
+            return result
+        time.sleep(0.1)
+    raise TimeoutError
+
+
+def finished(jobs, key):
+    """The status once the job is done and its completion was recorded."""
+    job = jobs.status(key)
+    return job if job.state == "failed" or job.seconds is not None else None
+
+
+def test_pruned_report_is_generated_again(tmp_path):
+    jobs = ReportJobs(str(tmp_path), max_workers=1, max_reports=1)
+    try:
+        sheets = [pd.DataFrame({"amount": [float(i), 2.0, 3.0]}) for i in range(3)]
+        keys = []
+        for sheet in sheets:
+            keys.append(jobs.submit(sheet, CONFIG))
+            assert wait(lambda: finished(jobs, keys[-1])).state == "done"
+        # Only the last report and job are kept
+        wait(lambda: len(jobs._jobs) == len(jobs._submitted) == len(jobs._finished) == 1)
+        assert jobs.status(keys[0]).state == "failed"
+
+        assert jobs.submit(sheets[0], CONFIG) == keys[0]
+        job = wait(lambda: finished(jobs, keys[0]))
+        assert job.state == "done" and not job.cached
+    finally:
+        jobs.shutdown()
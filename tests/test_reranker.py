@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from src.reranker import RerankingService, get_reranking_service
+
+
+def fake_service(loads, calls, **kwargs):
+    """A RerankingService whose model scores a pair by the passage length and records every batch."""
+    service = RerankingService(**kwargs)
+
+    def load():
+        loads.append(1)
+        return lambda pairs: calls.append(list(pairs)) or [float(len(passage)) for _, passage in pairs]
+
+    service._load_torch = load
+    return service
+
+
+def test_scores_are_cached_per_pair_and_misses_sorted_by_length():
+    loads, calls = [], []
+    service = fake_service(loads, calls)
+
+    assert service.score([("q", "ccc"), ("q", "a"), ("q", "bb"), ("q", "a")]) == [3.0, 1.0, 2.0, 1.0]
+    assert calls == [[("q", "a"), ("q", "bb"), ("q", "ccc")]]
+
+    assert service.score([("q", "bb"), ("other", "bb")]) == [2.0, 2.0]
+    assert calls[1] == [("other", "bb")]
+    assert len(loads) == 1
+    metrics = service.metrics()
+    assert (metrics["calls"], metrics["pairs_scored"], metrics["cache_hits"]) == (2, 4, 1)
+
+
+def test_cache_evicts_the_least_recently_used_pairs():
+    loads, calls = [], []
+    service = fake_service(loads, calls, cache_size=2)
+    service.score([("q", "a"), ("q", "bb")])
+    service.score([("q", "a"), ("q", "ccc")])
+
+    calls.clear()
+    service.score([("q", "a"), ("q", "bb"), ("q", "ccc")])
+    assert calls == [[("q", "bb")]]
+
+
+def test_model_is_loaded_once_across_threads():
+    loads, calls = [], []
+    service = fake_service(loads, calls)
+    threads = [threading.Thread(target=service.score, args=([("q", str(i))],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert sum(len(batch) for batch in calls) == 8
+
+
+def test_services_are_shared_per_settings():
+    assert get_reranking_service(batch_size=7) is get_reranking_service(batch_size=7)
+    assert get_reranking_service(batch_size=7) is not get_reranking_service(batch_size=8)
+    with pytest.raises(ValueError):
+        RerankingService(backend="tensorrt")
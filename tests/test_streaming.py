@@ -0,0 +1,33 @@
+import threading
+
+import pytest
+
+openai = pytest.importorskip("openai")
+
+from benchmarks.streaming_benchmark import FakeOpenAIServer
+from src.streaming import CompletionStream
+
+
+@pytest.fixture
+def server():
+    tokens = ["\n", "The", " total", " is", " 42.", "\n\n"]
+    server = FakeOpenAIServer(tokens, first_token_delay=0.05, token_interval=0.01)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_stream_yields_raw_deltas_and_keeps_the_stripped_text(server):
+    client = openai.OpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+    stream = CompletionStream(client, model="fake", messages=[{"role": "user", "content": "total?"}])
+
+    assert stream.stats.first_token_at is None
+    received = list(stream)
+
+    assert received == server.tokens
+    assert stream.text == "The total is 42."
+    assert stream.stats.chunks == len(server.tokens)
+    assert stream.stats.completion_tokens == len(server.tokens)
+    assert 0.05 <= stream.stats.time_to_first_token < stream.stats.finished_at - stream.stats.started
+    assert stream.stats.tokens_per_second > 0
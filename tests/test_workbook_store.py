@@ -0,0 +1,102 @@
+import threading
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("openpyxl")
+
+import src.workbook_store as workbook_store
+from src.workbook_store import WorkbookStore, compact_frame
+
+
+def workbook_bytes(sheets):
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return buffer.getvalue()
+
+
+LEDGER = pd.DataFrame(
+    {
+        "Account": ["Cash", "Bank", "Cash", "Sales", "Cash", "Bank"] * 5,
+        "Amount": [100.5, -20.25, 3.0, 1000.0, 0.1, 7.75] * 5,
+        "Units": [1, 2, 3, 4, 5, 6] * 5,
+    }
+)
+DATA = workbook_bytes({"Ledger": LEDGER, "Notes": pd.DataFrame({"Note": ["a", "b"]})})
+
+
+@pytest.fixture
+def count_parses(monkeypatch):
+    calls = []
+    read_excel = pd.read_excel
+
+    def counting(*args, **kwargs):
+        calls.append(kwargs.get("sheet_name"))
+        return read_excel(*args, **kwargs)
+
+    monkeypatch.setattr(workbook_store.pd, "read_excel", counting)
+    return calls
+
+
+def test_compact_frame_shrinks_without_losing_values():
+    compact = compact_frame(LEDGER)
+    assert compact["Account"].dtype == "category"
+    assert compact["Units"].dtype == "int8"
+    assert compact["Amount"].dtype == "float64"
+    pd.testing.assert_frame_equal(compact.astype({"Account": LEDGER["Account"].dtype, "Units": "int64"}), LEDGER)
+
+
+def test_sheets_are_parsed_once_and_then_read_from_parquet(tmp_path, count_parses):
+    store = WorkbookStore(str(tmp_path))
+    workbook = store.open(DATA, file_name="ledger.xlsx")
+    assert workbook.sheet_names == ["Ledger", "Notes"]
+    assert workbook.rows == {"Ledger": 30, "Notes": 2}
+
+    ledger = workbook.sheet("Ledger")
+    assert workbook.sheet("Ledger") is ledger
+    assert list(ledger["Amount"]) == list(LEDGER["Amount"])
+    assert count_parses == ["Ledger"]
+
+    # A new process finds the sheet in the Parquet cache
+    restarted = WorkbookStore(str(tmp_path)).open(DATA)
+    pd.testing.assert_frame_equal(restarted.sheet("Ledger"), ledger)
+    assert count_parses == ["Ledger"]
+
+
+def test_sessions_opening_the_same_upload_share_one_parse(tmp_path, count_parses):
+    store = WorkbookStore(str(tmp_path))
+    barrier = threading.Barrier(6)
+    frames = []
+
+    def session():
+        workbook = store.open(DATA, file_name="ledger.xlsx")
+        barrier.wait()
+        frames.append(workbook.sheet("Ledger"))
+
+    threads = [threading.Thread(target=session) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert count_parses == ["Ledger"]
+    assert len(frames) == 6 and all(frame is frames[0] for frame in frames)
+
+
+def test_memory_holds_the_most_recent_sheets(tmp_path):
+    store = WorkbookStore(str(tmp_path), max_frames=1)
+    workbook = store.open(DATA)
+    ledger = workbook.sheet("Ledger")
+    workbook.sheet("Notes")
+    assert workbook.sheet("Ledger") is not ledger
+    pd.testing.assert_frame_equal(workbook.sheet("Ledger"), ledger)
+
+
+def test_csv_uploads_become_a_single_sheet(tmp_path):
+    data = LEDGER.to_csv(index=False).encode("utf-8")
+    workbook = WorkbookStore(str(tmp_path)).open(data, file_name="uploads/ledger.CSV")
+    assert workbook.csv and workbook.sheet_names == ["ledger"] and workbook.rows == {"ledger": 30}
+    assert list(workbook.sheet("ledger")["Units"]) == list(LEDGER["Units"])